@@ -0,0 +1,44 @@
+"""Benchmark the tiled dense GP prediction in ``functions.gp`` against the per-point one.
+
+Times ``gp`` on random data at fixed model parameters together with a per-point
+reference that forms ``Rinv @ r`` for every testing position, and reports the
+tile size, the speed-up and the maximum absolute differences of the predictive
+means and variances.
+
+Usage::
+
+    python benchmarks/bench_gp.py [n_pred ...]
+"""
+import sys
+import numpy as np
+from numba import njit, prange, get_num_threads
+from dgpsi.functions import gp, gp_tile, k_one_vec, K_vec_nb
+from common import timeit
+
+@njit(cache=True, parallel=True)
+def gp_point(x, w1, Rinv, Rinv_y, scale, length, nugget, name):
+    m, v = np.zeros(len(x)), np.zeros(len(x))
+    for i in prange(len(x)):
+        ri = K_vec_nb(w1, x[i], length, name)
+        m[i] = np.dot(Rinv_y, ri)
+        v[i] = np.abs(scale[0]*(1+nugget[0]-np.dot(ri, np.dot(Rinv, ri))))
+    return m, v
+
+def main(n_preds=(1000,), n=5000, d=2, name='sexp'):
+    print('threads=%i, n=%i, d=%i, tile=%i' % (get_num_threads(), n, d, gp_tile(n)))
+    print('%-9s %11s %11s %8s %10s %10s' % ('n_pred', 'point (s)', 'tiled (s)', 'speedup', 'mean diff', 'var diff'))
+    np.random.seed(0)
+    w1 = np.random.rand(n, d)
+    length, scale, nugget = np.full(d, 0.3), np.array([1.]), np.array([1e-6])
+    R = k_one_vec(w1, w1, length, name) + nugget[0]*np.eye(n)
+    Rinv = np.linalg.inv(R)
+    Rinv_y = np.dot(Rinv, np.sin(4*w1).sum(axis=1))
+    for n_pred in n_preds:
+        x = np.random.rand(n_pred, d)
+        tp, (mp, vp) = timeit(gp_point, x, w1, Rinv, Rinv_y, scale, length, nugget, name, repeat=1)
+        tt, (mt, vt) = timeit(gp, x, None, w1, None, Rinv, Rinv_y.reshape(-1,1), scale, length, nugget, name, repeat=1)
+        mt = mt[:,0]
+        print('%-9i %11.4f %11.4f %8.2f %10.2e %10.2e' % (n_pred, tp, tt, tp/tt, np.max(np.abs(mp-mt)), np.max(np.abs(vp-vt))))
+
+if __name__ == '__main__':
+    main(*([[int(a) for a in sys.argv[1:]]] if len(sys.argv)>1 else []))
@@ -0,0 +1,58 @@
+"""Benchmark the batched layer predictions of ``emulator.predict_layers`` against per-imputation ones.
+
+Trains a two-layer DGP on synthetic data and, for an emulator with N imputations,
+times ``predict_layers`` (one parallel call per GP and layer across all imputations)
+together with a reference that predicts each imputation's copies one at a time
+through ``gp_prediction`` and ``linkgp_prediction``. Reports the speed-up and the
+maximum absolute differences of the predictive means and variances.
+
+Usage::
+
+    python benchmarks/bench_imputations.py [N ...]
+"""
+import sys
+import numpy as np
+from numba import get_num_threads
+from dgpsi import dgp, emulator
+from common import timeit
+
+def per_imputation(emu, x, m):
+    mean_pred, variance_pred=[], []
+    for one_imputed_all_layer in emu.all_layer_set:
+        mean, variance=[], []
+        for l, layer in enumerate(one_imputed_all_layer):
+            mean_l, variance_l=np.empty((len(x),len(layer))), np.empty((len(x),len(layer)))
+            for k, kernel in enumerate(layer):
+                kernel.pred_m = m
+                z=None if kernel.connect is None else x[:,kernel.connect]
+                if l==0:
+                    mean_l[:,k], variance_l[:,k]=kernel.gp_prediction(x[:,kernel.input_dim],z)
+                else:
+                    mean_l[:,k], variance_l[:,k]=kernel.linkgp_prediction(mean[-1][:,kernel.input_dim],variance[-1][:,kernel.input_dim],z)
+            mean.append(mean_l)
+            variance.append(variance_l)
+        mean_pred.append(mean)
+        variance_pred.append(variance)
+    return mean_pred, variance_pred
+
+def main(Ns=(10, 50), n=200, n_pred=500, m=30):
+    print('threads=%i, n=%i, n_pred=%i' % (get_num_threads(), n, n_pred))
+    print('%-10s %-5s %13s %12s %8s %10s %10s' % ('method', 'N', 'per-imp (s)', 'batched (s)', 'speedup', 'mean diff', 'var diff'))
+    np.random.seed(0)
+    X = np.random.rand(n, 2)
+    Y = np.sin(5*X.sum(axis=1, keepdims=True))
+    x = np.random.rand(n_pred, 2)
+    for method, kw in [('dense', {}), ('vecchia', {'vecchia':True, 'm':20})]:
+        model = dgp(X, Y, **kw)
+        model.train(N=10, disable=True)
+        struc = model.estimate()
+        for N in Ns:
+            emu = emulator(struc, N=N)
+            tl, (ml, vl) = timeit(per_imputation, emu, x, m, repeat=1)
+            tb, (mb, vb) = timeit(emu.predict_layers, x, m, repeat=1)
+            dm = max(np.max(np.abs(ml[s][l]-mb[l][s])) for s in range(N) for l in range(emu.n_layer))
+            dv = max(np.max(np.abs(vl[s][l]-vb[l][s])) for s in range(N) for l in range(emu.n_layer))
+            print('%-10s %-5i %13.4f %12.4f %8.2f %10.2e %10.2e' % (method, N, tl, tb, tl/tb, dm, dv))
+
+if __name__ == '__main__':
+    main(*([[int(a) for a in sys.argv[1:]]] if len(sys.argv)>1 else []))
@@ -0,0 +1,44 @@
+"""Benchmark the memory used by ``emulator`` construction for a dense DGP with squared exponential kernels.
+
+Trains a two-layer DGP briefly, builds an ``emulator`` from it and reports the peak
+memory traced during the construction, the memory held by the prediction statistics
+(``Rinv``, ``Rinv_y`` and ``R2sexp``) of all kernels in all imputations, counting the
+arrays shared across imputations once, and the memory that the former D x n x n
+``Psexp`` tensors would have added.
+
+Usage::
+
+    python benchmarks/bench_memory.py [n] [d] [N]
+"""
+import sys
+import time
+import tracemalloc
+from dgpsi import emulator
+from common import train_dgp
+
+def stats_bytes(all_layer_set):
+    held, psexp = {}, 0
+    for one_imputed_layer in all_layer_set:
+        for layer in one_imputed_layer:
+            for kernel in layer:
+                if kernel.type == 'gp':
+                    held.update({id(a): a.nbytes for a in (kernel.Rinv, kernel.Rinv_y, kernel.R2sexp) if a is not None})
+                    if kernel.R2sexp is not None:
+                        psexp += kernel.input.shape[1]*kernel.R2sexp.nbytes
+    return sum(held.values()), psexp
+
+def main(n=500, d=5, N=5):
+    all_layer = train_dgp(n, d)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    emu = emulator(all_layer, N=N)
+    t = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    held, psexp = stats_bytes(emu.all_layer_set)
+    print('n=%i, d=%i, N=%i' % (n, d, N))
+    print('%-10s %14s %16s %18s' % ('time (s)', 'peak (MB)', 'stats held (MB)', 'former Psexp (MB)'))
+    print('%-10.2f %14.1f %16.1f %18.1f' % (t, peak/2**20, held/2**20, psexp/2**20))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
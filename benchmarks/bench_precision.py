@@ -0,0 +1,38 @@
+"""Benchmark the single-precision Vecchia blocks against the double-precision ones.
+
+Times ``vecchia_llik`` and ``gp_vecch`` with float64 and float32 input data at fixed
+model parameters and reports the speed-up together with the relative error of the
+log-likelihood and of the predictive means and variances.
+
+Usage::
+
+    python benchmarks/bench_precision.py [n] [d] [m]
+"""
+import sys
+import numpy as np
+from dgpsi.vecchia import vecchia_llik, gp_vecch, nn, get_pred_nn
+from common import timeit
+
+def main(n=50000, d=5, m=25, n_pred=20000):
+    np.random.seed(0)
+    X = np.random.rand(n, d)
+    y = np.sin(3*np.sum(X, axis=1, keepdims=True))
+    x = np.random.rand(n_pred, d)
+    length = np.full(d, 0.5)
+    NNarray = nn(X/length, m)
+    pred_NNarray = get_pred_nn(x/length, X/length, m)
+    print('n=%i, d=%i, m=%i, n_pred=%i' % (n, d, m, n_pred))
+    print('%-10s %-8s %-12s %9s %9s %8s %10s' % ('kernel', 'nugget', 'function', 'f64 (s)', 'f32 (s)', 'speedup', 'rel error'))
+    for name in ['sexp', 'matern2.5']:
+        for nugget in [1e-6, 1e-4]:
+            t64, l64 = timeit(vecchia_llik, X, y, NNarray, 1., length, nugget, name)
+            t32, l32 = timeit(vecchia_llik, X.astype(np.float32), y, NNarray, 1., length, nugget, name)
+            err = np.abs(l32-l64)/np.abs(l64)
+            print('%-10s %-8.0e %-12s %9.3f %9.3f %8.2f %10.2e' % (name, nugget, 'vecchia_llik', t64, t32, t64/t32, err[0]))
+            t64, (m64, v64) = timeit(gp_vecch, x, X, pred_NNarray, y, 1., length, nugget, name)
+            t32, (m32, v32) = timeit(gp_vecch, x.astype(np.float32), X.astype(np.float32), pred_NNarray, y, 1., length, nugget, name)
+            err = max(np.max(np.abs(m32-m64))/np.max(np.abs(m64)), np.max(np.abs(v32-v64)/v64))
+            print('%-10s %-8.0e %-12s %9.3f %9.3f %8.2f %10.2e' % (name, nugget, 'gp_vecch', t64, t32, t64/t32, err))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""Benchmark the level-scheduled sparse triangular solves against the serial ones.
+
+Times the forward solve in ``fmvn_sp`` and the three triangular solves in
+``Hetero.posterior_vecch`` with the serial row loops and with the level-scheduled
+parallel versions at fixed model parameters, and reports the number of dependency
+levels, the speed-up and the maximum absolute difference of the solutions. The
+level-scheduled solves are only used by dgpsi when ``vecchia.level_solves`` is set
+(see ``vecchia.use_levels``), which should follow a speed-up here with more than
+one thread.
+
+Usage::
+
+    python benchmarks/bench_solves.py [threads] [n ...]
+"""
+import sys
+import numpy as np
+from numba import get_num_threads, set_num_threads
+from dgpsi.vecchia import (nn, get_pred_nn, L_matrix, U_matrix_sp, imp_pattern, nn_levels, forward_solve_sp,
+                           forward_solve_sp_lv, forward_substitute, backward_substitute, forward_substitute_lv,
+                           backward_substitute_lv)
+from common import timeit
+
+def post_serial(U_sp, invGamma, y_mask):
+    U, L = U_sp
+    sd = np.random.rand(len(y_mask))
+    samp = forward_substitute(*L[:3], sd)
+    intermediate = backward_substitute(*U[:3], invGamma*y_mask)
+    mu = forward_substitute(*L[:3], intermediate)
+    return mu+samp
+
+def post_level(U_sp, invGamma, y_mask):
+    U, L = U_sp
+    sd = np.random.rand(len(y_mask))
+    samp = forward_substitute_lv(*L, sd)
+    intermediate = backward_substitute_lv(*U, invGamma*y_mask)
+    mu = forward_substitute_lv(*L, intermediate)
+    return mu+samp
+
+def main(threads=None, ns=(100000, 1000000), d=2, m=25, name='matern2.5'):
+    if threads is not None:
+        set_num_threads(threads)
+    print('threads=%i, d=%i, m=%i' % (get_num_threads(), d, m))
+    print('%-9s %-16s %8s %11s %11s %8s %10s' % ('n', 'solve', 'levels', 'serial (s)', 'level (s)', 'speedup', 'max diff'))
+    for n in ns:
+        np.random.seed(0)
+        X = np.random.rand(n, d)
+        length = np.full(d, 0.3)
+        method = 'exact' if n<=100000 else 'approx'
+        NNarray = nn(X/length, m, method=method)
+        lvl_ptr, lvl_rows = nn_levels(NNarray)
+        L = L_matrix(X, NNarray, length, 1e-6, name)
+        b = np.random.randn(n)
+        ts, xs = timeit(forward_solve_sp, L, NNarray, b)
+        tl, xl = timeit(forward_solve_sp_lv, L, NNarray, b.reshape(-1,1), lvl_ptr, lvl_rows)
+        xl = xl[:,0]
+        print('%-9i %-16s %8i %11.4f %11.4f %8.2f %10.2e' % (n, 'fmvn_sp', len(lvl_ptr)-1, ts, tl, ts/tl, np.max(np.abs(xs-xl))))
+        NNs = get_pred_nn(X/length, X/length, m, method=method)[:,1::]
+        prev = NNs < np.tile(np.arange(n), (m-1, 1)).T
+        NNs[prev] = NNs[prev] + n
+        imp_NNarray = np.hstack((np.arange(n).reshape(-1,1) + n, np.arange(n).reshape(-1,1), NNs))
+        pattern = imp_pattern(imp_NNarray)
+        gamma = np.exp(np.random.randn(n)-2)
+        U_sp = U_matrix_sp(X, imp_NNarray, 1., length, 1e-6, name, np.concatenate((gamma, gamma)), pattern)
+        y = np.random.randn(n)
+        np.random.seed(1)
+        ts, xs = timeit(post_serial, U_sp, 1/gamma, y)
+        np.random.seed(1)
+        tl, xl = timeit(post_level, U_sp, 1/gamma, y)
+        n_level = max(len(U_sp[0][3]), len(U_sp[1][3]))-1
+        print('%-9i %-16s %8i %11.4f %11.4f %8.2f %10.2e' % (n, 'posterior_vecch', n_level, ts, tl, ts/tl, np.max(np.abs(xs-xl))))
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args[:1], *([args[1:]] if len(args)>1 else []))
@@ -0,0 +1,38 @@
+"""Benchmark the transfer of a dense DGP emulator to the worker processes of ``ppredict``.
+
+Trains a two-layer DGP briefly, builds an ``emulator`` from it and reports the size and
+the time of the dill pickle that a worker receives, with the model arrays copied into
+the pickle and with the large arrays moved to shared memory by ``utils.shared_arrays``
+(the pickle then carries handles, and unpickling attaches to the shared blocks).
+
+Usage::
+
+    python benchmarks/bench_transfer.py [n] [d] [N]
+"""
+import sys
+import time
+import dill
+from dgpsi import emulator
+from dgpsi.utils import shared_arrays
+from common import train_dgp
+
+def transfer(emu):
+    t0 = time.perf_counter()
+    s = dill.dumps(emu)
+    t1 = time.perf_counter()
+    dill.loads(s)
+    t2 = time.perf_counter()
+    return len(s), t1-t0, t2-t1
+
+def main(n=1000, d=5, N=10):
+    emu = emulator(train_dgp(n, d), N=N)
+    print('n=%i, d=%i, N=%i' % (n, d, N))
+    print('%-8s %12s %10s %12s' % ('arrays', 'pickle (MB)', 'dump (s)', 'load (s)'))
+    size, t_dump, t_load = transfer(emu)
+    print('%-8s %12.2f %10.3f %12.3f' % ('copied', size/2**20, t_dump, t_load))
+    with shared_arrays(emu):
+        size, t_dump, t_load = transfer(emu)
+    print('%-8s %12.2f %10.3f %12.3f' % ('shared', size/2**20, t_dump, t_load))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,28 @@
+"""Helpers shared by the benchmark scripts in this directory.
+"""
+import time
+import numpy as np
+from dgpsi import dgp
+
+def timeit(f, *args, repeat=3):
+    """Call ``f(*args)`` once to compile and warm up, then return the best wall time over **repeat** further calls 
+    together with the output of the last call.
+    """
+    f(*args)
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = f(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def train_dgp(n, d):
+    """Train a two-layer DGP briefly on **n** random **d**-dimensional inputs with a sine response and return its 
+    estimated structure for ``emulator``.
+    """
+    np.random.seed(0)
+    X = np.random.rand(n, d)
+    Y = np.sin(3*np.sum(X, axis=1, keepdims=True))
+    m = dgp(X, Y)
+    m.train(N=5, disable=True)
+    return m.estimate()
@@ -14,6 +14,7 @@ import multiprocess.context as ctx
 import platform
 from pathos.multiprocessing import ProcessingPool as Pool
 import psutil  
+import os
 from numba import set_num_threads
 
 class dgp:
@@ -38,8 +39,18 @@ class dgp:
         block (bool, optional): whether to use the blocked (layer-wise) ESS for the imputations during the training. Defaults to `True`.
         vecchia (bool): a bool indicating if Vecchia approximation will be used. Defaults to `False`. 
         m (int): an integer that gives the size of the conditioning set for the Vecchia approximation in the training. Defaults to `25`. 
-        ord_fun (function, optional): a function that decides the ordering of the input of the GP nodes in the DGP structure for the Vecchia approximation.
-            If set to `None`, then the default random ordering is used. Defaults to `None`.
+        ord_fun (function or str, optional): a function that decides the ordering of the input of the GP nodes in the DGP structure for the Vecchia approximation.
+            Set to `maxmin` or `approx_maxmin` to use the built-in exact or approximate max-min distance ordering of the lengthscale-scaled input. If set to `None`, then the default random ordering is used. Defaults to `None`.
+        precision (str, optional): either `double` or `single`. If `single`, the conditioning blocks of the Vecchia approximation are built in float32 
+            while the Cholesky factorisations and likelihood accumulations stay in float64. Only used when **vecchia** = `True`. Defaults to `double`.
+        inducing (bool): a bool indicating if the inducing-point (FITC) approximation will be used for all GP nodes. Cannot be used together with 
+            **vecchia**. Defaults to `False`.
+        r (int): an integer that gives the number of inducing points of each GP node for the FITC approximation. Defaults to `100`.
+        grid (bool, optional): whether the input **X** forms a full grid, in which case the GP nodes in the first layer are trained and make 
+            predictions exactly through the Kronecker structure of their correlation matrices. If set to `None`, the grid structure is detected 
+            automatically for each GP node in the first layer. If set to `True`, an error is raised if no GP node in the first layer has its input 
+            forming a grid. If set to `False`, the Kronecker structure is not used. The Kronecker structure is not used when **vecchia** or 
+            **inducing** is `True`. Defaults to `None`.
     Remark:
         This class is used for DGP structures, in which internal I/O are unobservable. When some internal layers
         are fully observable, the DGP model reduces to linked (D)GP model. In such a case, use :class:`.lgp` class for 
@@ -61,7 +72,7 @@ class dgp:
 
     """
 
-    def __init__(self, X, Y, all_layer=None, check_rep=True, block=True, vecchia=False, m=25, ord_fun=None):
+    def __init__(self, X, Y, all_layer=None, check_rep=True, block=True, vecchia=False, m=25, ord_fun=None, precision='double', inducing=False, r=100, grid=None):
         self.Y=Y
         if isinstance(self.Y, list):
             if len(self.Y)==1:
@@ -86,13 +97,19 @@ class dgp:
         else:
             self.X=X
         self.vecch=vecchia
+        self.inducing=inducing
+        if self.vecch and self.inducing:
+            raise Exception('The Vecchia and inducing-point approximations cannot be used together.')
         self.n_data=self.X.shape[0]
         #if self.n_data>=1e4:
         #    self.nn_method = 'approx'
         #else:
         self.nn_method = 'exact'
         self.m=min(m, self.n_data-1)
+        self.r=min(r, self.n_data)
         self.ord_fun=ord_fun
+        self.precision=precision
+        self.grid=grid
         if all_layer is None:
             D, Y_D=np.shape(self.X)[1], np.shape(self.Y)[1]
             layer1 = [ker(length=np.array([1.])) for _ in range(D)]
@@ -121,6 +138,14 @@ class dgp:
             state['m'] = 25
         if 'ord_fun' not in state:
             state['ord_fun'] = None
+        if 'precision' not in state:
+            state['precision'] = 'double'
+        if 'inducing' not in state:
+            state['inducing'] = False
+        if 'r' not in state:
+            state['r'] = 100
+        if 'grid' not in state:
+            state['grid'] = None
         if 'rff' in state:
             del state['rff']
         if 'M' in state:
@@ -192,11 +217,15 @@ class dgp:
                                 raise Exception('The local input and global input should not have any overlap. Change input_dim or connect so they do not have any common indices.')
                             kernel.global_input=global_in[:,kernel.connect]
                     kernel.vecch, kernel.m, kernel.nn_method = self.vecch, self.m, self.nn_method
+                    kernel.precision = self.precision
+                    kernel.inducing, kernel.r = self.inducing, self.r
                     if self.ord_fun is not None:
                         kernel.ord_fun = self.ord_fun
                     kernel.D=np.shape(kernel.input)[1]
                     if kernel.connect is not None:
                         kernel.D+=len(kernel.connect)
+                    if kernel.inducing:
+                        kernel.inducing_set()
                     if kernel.vecch:
                         compute_pointer = False
                         if l==self.n_layer-2:
@@ -244,13 +273,14 @@ class dgp:
                     kernel.para_path=np.atleast_2d(np.concatenate((kernel.scale,kernel.length,kernel.nugget)))
             if l!=self.n_layer-1:
                 In=copy.copy(Out)
+        self.grid_set()
 
     def to_vecchia(self, m=25, ord_fun=None):
         """Convert the DGP structure to the Vecchia mode.
 
         Args:
             m (int): an integer that gives the size of the conditioning set for the Vecchia approximation in the training. Defaults to `25`. 
-            ord_fun (function, optional): a function that decides the ordering of the input of the GP nodes in the DGP structure for the Vecchia approximation. If set to `None`, then the default random ordering is used. Defaults to `None`.
+            ord_fun (function or str, optional): a function that decides the ordering of the input of the GP nodes in the DGP structure for the Vecchia approximation. Set to `maxmin` or `approx_maxmin` to use the built-in exact or approximate max-min distance ordering of the lengthscale-scaled input. If set to `None`, then the default random ordering is used. Defaults to `None`.
         """
         if self.vecch:
             raise Exception('The DGP structure is already in Vecchia mode.')
@@ -307,6 +337,59 @@ class dgp:
         else:
             raise Exception('The DGP structure is already in non-Vecchia mode.')
 
+    def to_inducing(self, r=100):
+        """Convert the DGP structure to the inducing-point (FITC) mode.
+
+        Args:
+            r (int): an integer that gives the number of inducing points of each GP node. Defaults to `100`. 
+        """
+        if self.inducing:
+            raise Exception('The DGP structure is already in inducing-point mode.')
+        elif self.vecch:
+            raise Exception('The DGP structure is in Vecchia mode. Remove the Vecchia mode first.')
+        else:
+            self.inducing = True
+            self.r = min(r, self.n_data)
+            for layer in self.all_layer:
+                for kernel in layer:
+                    if kernel.type == 'gp':
+                        kernel.inducing, kernel.r = self.inducing, self.r
+            self.inducing_set()
+
+    def remove_inducing(self):
+        """Remove the inducing-point (FITC) mode from the DGP structure.
+        """
+        if self.inducing:
+            self.inducing = False
+            for layer in self.all_layer:
+                for kernel in layer:
+                    if kernel.type == 'gp':
+                        kernel.inducing = self.inducing
+        else:
+            raise Exception('The DGP structure is already in non-inducing-point mode.')
+
+    def inducing_set(self):
+        """Reselect the inducing points of all GP nodes in the DGP structure.
+        """
+        for layer in self.all_layer:
+            for kernel in layer:
+                if kernel.type == 'gp':
+                    kernel.inducing_set()
+
+    def grid_set(self):
+        """Detect whether the inputs of the GP nodes in the first layer of the DGP structure form full grids so that the Kronecker structure 
+        of their correlation matrices is used (see :meth:`.kernel.grid_set`).
+        """
+        detected=False
+        for kernel in self.all_layer[0]:
+            if kernel.type == 'gp':
+                if self.grid is False:
+                    kernel.grid, kernel.grid_ord, kernel.kron_cache = None, None, None
+                elif kernel.grid_set():
+                    detected=True
+        if self.grid and not detected:
+            raise Exception('The input X does not form a grid.')
+
     def update_all_layer(self, all_layer):
         """Update the class with a new dgp structure with given hyperparameter and latent layer values.
         """
@@ -403,8 +486,16 @@ class dgp:
         #else:
         #self.nn_method = 'exact'
         self.m=min(self.m, self.n_data-1)
+        self.r=min(self.r, self.n_data)
+        for layer in self.all_layer:
+            for kernel in layer:
+                if kernel.type == 'gp':
+                    kernel.r = self.r
         if reset:
             self.reinit_all_layer(reset_lengthscale=True)
+            if self.inducing:
+                self.inducing_set()
+            self.grid_set()
             self.imp=imputer(self.all_layer, self.block)
             (self.imp).sample(burnin=10)
             self.compute_r2()
@@ -412,15 +503,24 @@ class dgp:
             if (self.X[:, None] == origin_X).all(-1).any(-1).all():
                 sub_idx=np.where((origin_X==self.X[:,None]).all(-1))[1]
                 self.update_all_layer_smaller(sub_idx)
+                if self.inducing:
+                    self.inducing_set()
+                self.grid_set()
                 self.imp=imputer(self.all_layer, self.block)
                 (self.imp).sample(burnin=50)
             elif (origin_X[:, None] == self.X).all(-1).any(-1).all():
                 sub_idx=np.where((self.X==origin_X[:,None]).all(-1))[1]
                 self.update_all_layer_larger(sub_idx)
+                if self.inducing:
+                    self.inducing_set()
+                self.grid_set()
                 self.imp=imputer(self.all_layer, self.block)
                 (self.imp).sample(burnin=50)
             else:
                 self.reinit_all_layer(reset_lengthscale=False)
+                if self.inducing:
+                    self.inducing_set()
+                self.grid_set()
                 self.imp=imputer(self.all_layer, self.block)
                 (self.imp).sample(burnin=200)
             self.compute_r2()
@@ -448,8 +548,7 @@ class dgp:
                         else:
                             mu=cond_mean_vecch(In[~mask,:][:,kernel.input_dim], None, kernel.input, kernel.global_input, kernel.output, kernel.scale, kernel.length, kernel.nugget, kernel.name, 50, kernel.nn_method)
                     else: 
-                        R=kernel.k_matrix()
-                        L=np.linalg.cholesky(R)
+                        L=kernel.chol()
                         Rinv_y=cho_solve((L, True), kernel.output, check_finite=False).flatten()
                         if kernel.connect is not None:
                             mu=cond_mean(In[~mask,:][:,kernel.input_dim],global_in[~mask,:][:,kernel.connect],kernel.input,kernel.global_input,Rinv_y,kernel.length,kernel.name)
@@ -700,7 +799,7 @@ class dgp:
             if l!=self.n_layer-1:
                 In=copy.copy(Out)
        
-    def train(self, N=500, ess_burn=10, disable=False):
+    def train(self, N=500, ess_burn=10, disable=False, warm_start=False):
         """Train the DGP model.
 
         Args:
@@ -709,6 +808,9 @@ class dgp:
                 at each I-step of the SEM. Defaults to `10`.
             disable (bool, optional): whether to disable the training progress bar. 
                 Defaults to `False`.
+            warm_start (bool, optional): whether to keep the optimiser state (inverse Hessian approximation and an adaptive 
+                evaluation budget) of each GP node across SEM iterations in the M-step. The numbers of likelihood evaluations 
+                used by the warm-started M-step can be obtained from :meth:`.opt_count`. Defaults to `False`.
         """
         pgb=trange(1,N+1,disable=disable)
         for i in pgb:
@@ -724,11 +826,27 @@ class dgp:
                             kernel.compute_cl()
                         if l!=0:
                             kernel.r2()
-                        kernel.maximise()
+                        kernel.maximise(warm_start=warm_start)
                 pgb.set_description('Iteration %i: Layer %i' % (i,l+1))
         self.N += N
 
-    def ptrain(self, N=500, ess_burn=10, disable=False, core_num=None):
+    def opt_count(self):
+        """Count the likelihood evaluations of the warm-started M-step over all GP nodes since their optimiser states were created.
+
+        Returns:
+            tuple: a tuple of two integers. The first gives the number of likelihood evaluations used. The second gives the 
+            unused evaluation budget, i.e., the evaluations left under the ``maxfun`` cap of ``max(30,20+5D)`` per M-step that 
+            bounds the default optimiser. It is not a saving against the default optimiser, which usually stops well below the cap.
+        """
+        n_eval, n_budget = 0, 0
+        for layer in self.all_layer:
+            for kernel in layer:
+                if kernel.type=='gp' and kernel.opt_state is not None:
+                    n_eval += kernel.opt_state['n_eval']
+                    n_budget += kernel.opt_state['n_budget']
+        return n_eval, n_budget-n_eval
+
+    def ptrain(self, N=500, ess_burn=10, disable=False, core_num=None, warm_start=False):
         """Train the DGP model with parallel GP optimizations in each layer.
 
         Args:
@@ -739,6 +857,8 @@ class dgp:
                 Defaults to `False`.
             core_num (int, optional): the number of cores/workers to be used. Defaults to `None`. If not specified, 
                 the number of cores is set to ``(max physical cores available - 1)``.
+            warm_start (bool, optional): whether to keep the optimiser state of each GP node across SEM iterations. 
+                See :meth:`.train`. Defaults to `False`.
         """
         os_type = platform.system()
         if os_type in ['Darwin', 'Linux']:
@@ -757,7 +877,7 @@ class dgp:
                     kernel.compute_cl()
                 if kernel.vecch:
                     set_num_threads(num_thread)
-                kernel.maximise()
+                kernel.maximise(warm_start=warm_start)
             return kernel
         def pmax_r2(kernel):
             if kernel.type=='gp':
@@ -766,7 +886,7 @@ class dgp:
                 if kernel.vecch:
                     set_num_threads(num_thread)
                 kernel.r2()
-                kernel.maximise()
+                kernel.maximise(warm_start=warm_start)
             return kernel
         
         pool = Pool(core_num)
@@ -788,6 +908,22 @@ class dgp:
         pool.join()
         pool.clear()
 
+    def spill_trace(self, path):
+        """Move the traces of model parameters and R2 of all GP nodes to memory-mapped files, so that they are 
+        not held in memory during long training runs.
+
+        Args:
+            path (str): the directory in which the files are created. The files are named 
+                ``layer<l>_node<k>_para.dat`` and ``layer<l>_node<k>_r2.dat``.
+        """
+        os.makedirs(path, exist_ok=True)
+        for l in range(self.n_layer):
+            for k, kernel in enumerate(self.all_layer[l]):
+                if kernel.type=='gp':
+                    kernel.para_trace.to_memmap(os.path.join(path, 'layer%i_node%i_para.dat' % (l+1, k+1)))
+                    if kernel.R2_trace is not None:
+                        kernel.R2_trace.to_memmap(os.path.join(path, 'layer%i_node%i_r2.dat' % (l+1, k+1)))
+
     def compute_r2(self):
         for l in range(1,self.n_layer):
             layer=self.all_layer[l]
@@ -816,14 +952,14 @@ class dgp:
             layer_r2_list = []
             for kernel in layer:
                 if kernel.type == 'gp':
-                    if kernel.R2 is None:
+                    if kernel.R2_trace is None:
                         layer_r2_list.append(None)
                     else:
-                        burnin_N=int(len(kernel.R2)*burnin)
+                        burnin_N=int(len(kernel.R2_trace)*burnin)
                         if agg == 'mean':
-                            layer_r2_list.append(np.mean(kernel.R2[burnin_N:,:],axis=0))
+                            layer_r2_list.append(kernel.R2_trace.mean(burnin_N))
                         elif agg == 'median':
-                            layer_r2_list.append(np.median(kernel.R2[burnin_N:,:],axis=0))
+                            layer_r2_list.append(kernel.R2_trace.median(burnin_N))
                         else:
                             raise Exception("agg must be either 'median' or 'mean'.")
                 else:
@@ -851,7 +987,7 @@ class dgp:
         for l in range(len(final_struct)):
             for kernel in final_struct[l]:
                 if kernel.type=='gp':
-                    point_est=np.mean(kernel.para_path[self.burnin:,:],axis=0)
+                    point_est=kernel.para_trace.mean(self.burnin)
                     kernel.scale=np.atleast_1d(point_est[0])
                     kernel.length=np.atleast_1d(point_est[1:-1])
                     kernel.nugget=np.atleast_1d(point_est[-1])
@@ -8,6 +8,7 @@ import copy
 from scipy.spatial.distance import cdist
 from .functions import ghdiag, mice_var, esloo_calculation
 from .vecchia import get_pred_nn
+from .utils import shared_memo, batch_input, shared_arrays
 from contextlib import contextmanager
 from numba import set_num_threads
 
@@ -28,6 +29,10 @@ class emulator:
             self.vecch=True
         else:
             self.vecch=False
+        if self.all_layer[0][0].inducing:
+            self.inducing=True
+        else:
+            self.inducing=False
         self.imp=imputer(self.all_layer, block)
         if self.vecch:
             (self.imp).update_ord_nn()
@@ -41,7 +46,7 @@ class emulator:
             (self.imp).sample()
             if not self.vecch:
                 (self.imp).key_stats()
-            (self.all_layer_set).append(copy.deepcopy(self.all_layer))
+            (self.all_layer_set).append(copy.deepcopy(self.all_layer, shared_memo(self.all_layer)))
         #self.nb_parallel=nb_parallel
         #if len(self.all_layer[0][0].input)>=500 and self.nb_parallel==False:
         #    print('Your training data size is greater than %i, you might want to set "nb_parallel=True" to accelerate the prediction.' % (500))
@@ -56,6 +61,8 @@ class emulator:
             del state['all_layer_set_copy']
         if 'vecch' not in state:
             state['vecch'] = False
+        if 'inducing' not in state:
+            state['inducing'] = False
         if 'nb_parallel' in state:
             del state['nb_parallel']
         self.__dict__.update(state)
@@ -86,6 +93,48 @@ class emulator:
                             kernel.compute_stats()
         else:
             raise Exception('The DGP emulator is already in non-Vecchia mode.')
+
+    def to_inducing(self, r=100):
+        """Convert the DGP emulator to the inducing-point (FITC) mode.
+
+        Args:
+            r (int): an integer that gives the number of inducing points of each GP node. Defaults to `100`. 
+        """
+        if self.inducing:
+            raise Exception('The DGP emulator is already in inducing-point mode.')
+        elif self.vecch:
+            raise Exception('The DGP emulator is in Vecchia mode. Remove the Vecchia mode first.')
+        else:
+            self.inducing=True
+            for layer in self.all_layer:
+                for kernel in layer:
+                    if kernel.type == 'gp':
+                        kernel.inducing, kernel.r = self.inducing, r
+            for one_imputed_layer in self.all_layer_set:
+                for layer in one_imputed_layer:
+                    for kernel in layer:
+                        if kernel.type == 'gp':
+                            kernel.inducing, kernel.r = self.inducing, r
+                            kernel.inducing_set()
+                            kernel.compute_stats()
+
+    def remove_inducing(self):
+        """Remove the inducing-point (FITC) mode from the DGP emulator.
+        """
+        if self.inducing:
+            self.inducing = False
+            for layer in self.all_layer:
+                for kernel in layer:
+                    if kernel.type == 'gp':
+                        kernel.inducing = self.inducing
+            for one_imputed_layer in self.all_layer_set:
+                for layer in one_imputed_layer:
+                    for kernel in layer:
+                        if kernel.type == 'gp':
+                            kernel.inducing = self.inducing
+                            kernel.compute_stats()
+        else:
+            raise Exception('The DGP emulator is already in non-inducing-point mode.')
         
     def esloo(self, X, Y, m=30):
         """Compute the (normalised) expected squared LOO from a DGP emulator.
@@ -257,7 +306,7 @@ class emulator:
                     set_num_threads(num_thread)
                     return self.predict_mice_2layer_likelihood(x_cand,m)
                 z=np.array_split(x_cand,chunk_num)
-                with Pool(core_num) as pool:
+                with shared_arrays(self), Pool(core_num) as pool:
                     res = pool.map(f, [[x, m] for x in z])
                     pool.close()
                     pool.join()
@@ -277,7 +326,7 @@ class emulator:
                     set_num_threads(num_thread)
                     return self.predict_mice(x, islikelihood, m)
                 z=np.array_split(x_cand,chunk_num)
-                with Pool(core_num) as pool:
+                with shared_arrays(self), Pool(core_num) as pool:
                     res = pool.map(f, [[x, islikelihood, m] for x in z])
                     pool.close()
                     pool.join()
@@ -333,7 +382,7 @@ class emulator:
                     return self.predict_vigf_2layer_likelihood(x, index, m)
                 z=np.array_split(x_cand,chunk_num)
                 sub_indx=np.array_split(index,chunk_num)
-                with Pool(core_num) as pool:
+                with shared_arrays(self), Pool(core_num) as pool:
                     res = pool.map(f, [[x, index, m] for x,index in zip(z,sub_indx)])
                     pool.close()
                     pool.join()
@@ -345,7 +394,7 @@ class emulator:
                     return self.predict_vigf(x, index, islikelihood, m)
                 z=np.array_split(x_cand,chunk_num)
                 sub_indx=np.array_split(index,chunk_num)
-                with Pool(core_num) as pool:
+                with shared_arrays(self), Pool(core_num) as pool:
                     res = pool.map(f, [[x, index, islikelihood, m] for x,index in zip(z,sub_indx)])
                     pool.close()
                     pool.join()
@@ -459,6 +508,55 @@ class emulator:
                 idx = np.argmax(vigf, axis=0)
                 return idx, vigf[idx,np.arange(vigf.shape[1])]
 
+    def predict_layers(self,x,m,n_layer=None):
+        """Make the predictions of the first **n_layer** layers for all imputations, one layer at a time. The copies of a GP in
+        the first layer across imputations only differ in their imputed outputs, so their cross-correlations (or Vecchia conditioning 
+        blocks) and variances are computed once (see :meth:`.kernel.gp_prediction`). The copies of a GP in a later layer are 
+        predicted together by one parallel loop over all (imputation, testing position) pairs (see :meth:`.kernel.linkgp_prediction`).
+
+        Args:
+            x (ndarray): a numpy 2d-array where each row is an input testing data point and each column is an input dimension.
+            m (int): the size of the conditioning set for predictions if the DGP was built under the Vecchia approximation.
+            n_layer (int, optional): the number of layers to predict. Defaults to `None`, in which case all layers are predicted.
+
+        Returns:
+            tuple: a tuple of two lists, one for the predictive means and another for the predictive variances. Each list contains 
+            **n_layer** sub-lists, each of which contains *N* (i.e., the number of imputations) numpy 2d-arrays with rows corresponding 
+            to testing positions and columns corresponding to the GP/likelihood nodes in the associated layer.
+        """
+        S=len(self.all_layer_set)
+        M=len(x)
+        n_layer=self.n_layer if n_layer is None else n_layer
+        mean_pred, variance_pred=[], []
+        for l in range(n_layer):
+            n_kernel=len(self.all_layer_set[0][l])
+            mean_l=[np.empty((M,n_kernel)) for _ in range(S)]
+            variance_l=[np.empty((M,n_kernel)) for _ in range(S)]
+            for k in range(n_kernel):
+                kernels=[one_imputed_all_layer[l][k] for one_imputed_all_layer in self.all_layer_set]
+                kernel=kernels[0]
+                if kernel.type=='gp':
+                    for one_kernel in kernels:
+                        one_kernel.pred_m = m
+                    if kernel.connect is not None:
+                        z_k_in=x[:,kernel.connect]
+                    else:
+                        z_k_in=None
+                    if l==0:
+                        m_k,v_k=kernel.gp_prediction(x=x[:,kernel.input_dim],z=z_k_in,kernels=kernels)
+                    else:
+                        m_k_in=np.stack([mean_pred[l-1][i][:,kernel.input_dim] for i in range(S)])
+                        v_k_in=np.stack([variance_pred[l-1][i][:,kernel.input_dim] for i in range(S)])
+                        m_k,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in,kernels=kernels)
+                    for i in range(S):
+                        mean_l[i][:,k],variance_l[i][:,k]=m_k[:,i],v_k[:,i]
+                elif kernel.type=='likelihood':
+                    for i in range(S):
+                        mean_l[i][:,k],variance_l[i][:,k]=kernels[i].prediction(m=mean_pred[l-1][i][:,kernel.input_dim],v=variance_pred[l-1][i][:,kernel.input_dim])
+            mean_pred.append(mean_l)
+            variance_pred.append(variance_l)
+        return mean_pred, variance_pred
+
     def predict_mice_2layer_likelihood(self,x_cand,m):
         """Implement predictions from the trained DGP model with 2 layers (including a likelihood layer) that are required to calculate the MICE criterion.
         """
@@ -481,139 +579,25 @@ class emulator:
     def predict_mice(self,x_cand,islikelihood,m):
         """Implement predictions from the trained DGP model that are required to calculate the MICE criterion.
         """
-        S=len(self.all_layer_set)
-        M=len(x_cand)
-        D=len(self.all_layer[-2]) if islikelihood else len(self.all_layer[-1])
         N_layer=self.n_layer-1 if islikelihood else self.n_layer
-        variance_pred_set=[]
-        pred_input_set=[]
-        #start calculation
-        for i in range(S):
-            one_imputed_all_layer=self.all_layer_set[i]
-            variance_pred=np.empty((M,D))
-            overall_global_test_input=x_cand
-            for l in range(N_layer):
-                layer=one_imputed_all_layer[l]
-                n_kerenl=len(layer)
-                overall_test_output_mean=np.empty((M,n_kerenl))
-                overall_test_output_var=np.empty((M,n_kerenl))
-                if l==0:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.gp_prediction(x=overall_global_test_input[:,kernel.input_dim],z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-                elif l==N_layer-1:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        m_k_in,v_k_in=overall_test_input_mean[:,kernel.input_dim],overall_test_input_var[:,kernel.input_dim]
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        _,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in)
-                        variance_pred[:,k]=v_k
-                else:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        m_k_in,v_k_in=overall_test_input_mean[:,kernel.input_dim],overall_test_input_var[:,kernel.input_dim]
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-            variance_pred_set.append(variance_pred)
-            pred_input_set.append(overall_test_input_mean)
-        return pred_input_set, variance_pred_set
+        mean_pred,variance_pred=self.predict_layers(x_cand,m,N_layer)
+        return mean_pred[N_layer-2], variance_pred[N_layer-1]
 
     def predict_vigf_2layer_likelihood(self,x_cand,index,m):
         """Implement predictions from the trained DGP model with 2 layers (including a likelihood layer) that are required to calculate the VIGF criterion.
         """
-        S=len(self.all_layer_set)
-        M=len(x_cand)
-        #start calculation
-        bias_pred_set=[]
-        variance_pred_set=[]
-        for i in range(S):
-            one_imputed_all_layer=self.all_layer_set[i]
-            layer=one_imputed_all_layer[0]
-            D=len(layer)
-            bias_pred=np.empty((M,D))
-            variance_pred=np.empty((M,D))
-            for k in range(D):
-                kernel=layer[k]
-                kernel.pred_m = m
-                if kernel.connect is not None:
-                    z_k_in=x_cand[:,kernel.connect]
-                else:
-                    z_k_in=None
-                m_k,v_k=kernel.gp_prediction(x=x_cand[:,kernel.input_dim],z=z_k_in)
-                bias_pred[:,k]=(m_k-kernel.output[index,:].flatten())**2
-                variance_pred[:,k]=v_k
-            bias_pred_set.append(bias_pred)
-            variance_pred_set.append(variance_pred)
-        return bias_pred_set, variance_pred_set
+        return self.predict_vigf(x_cand,index,True,m)
 
     def predict_vigf(self,x_cand,index,islikelihood,m):
         """Implement predictions from the trained DGP model that are required to calculate the VIGF criterion.
         """
-        S=len(self.all_layer_set)
-        M=len(x_cand)
         N_layer=self.n_layer-1 if islikelihood else self.n_layer
+        mean_pred,variance_pred=self.predict_layers(x_cand,m,N_layer)
         bias_pred_set=[]
-        variance_pred_set=[]
-        #input_mean_pred_set=[]
-        #input_variance_pred_set=[]
-        #start calculation
-        for i in range(S):
-            one_imputed_all_layer=self.all_layer_set[i]
-            overall_global_test_input=x_cand
-            for l in range(N_layer):
-                layer=one_imputed_all_layer[l]
-                n_kerenl=len(layer)
-                overall_test_output_mean=np.empty((M,n_kerenl))
-                overall_test_output_var=np.empty((M,n_kerenl))
-                if l==0:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.gp_prediction(x=overall_global_test_input[:,kernel.input_dim],z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-                else:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        m_k_in,v_k_in=overall_test_input_mean[:,kernel.input_dim],overall_test_input_var[:,kernel.input_dim]
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in)
-                        if l!=N_layer-1:
-                            overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                        else:
-                            overall_test_output_mean[:,k],overall_test_output_var[:,k]=(m_k-kernel.output[index,:].flatten())**2,v_k
-                    if l!=N_layer-1:
-                        overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-            bias_pred_set.append(overall_test_output_mean)
-            variance_pred_set.append(overall_test_output_var)
-            #input_mean_pred_set.append(overall_test_input_mean)
-            #input_variance_pred_set.append(overall_test_input_var)
-        return bias_pred_set,variance_pred_set
+        for i, one_imputed_all_layer in enumerate(self.all_layer_set):
+            output=np.hstack([kernel.output[index,:] for kernel in one_imputed_all_layer[N_layer-1]])
+            bias_pred_set.append((mean_pred[N_layer-1][i]-output)**2)
+        return bias_pred_set,variance_pred[N_layer-1]
 
     def ppredict(self,x,method='mean_var',full_layer=False,sample_size=50,m=50,chunk_num=None,core_num=None):
         """Implement parallel predictions from the trained DGP model.
@@ -645,7 +629,7 @@ class emulator:
             set_num_threads(num_thread)
             return self.predict(x_chunk, method, full_layer, sample_size, m, aggregation)
         z=np.array_split(x,chunk_num)
-        with Pool(core_num) as pool:
+        with shared_arrays(self), Pool(core_num) as pool:
             #pool.restart()
             res = pool.map(f, [[x, method, full_layer, sample_size, m, True] for x in z])
             pool.close()
@@ -668,6 +652,32 @@ class emulator:
             else:
                 return list(np.concatenate(worker) for worker in zip(*res))
 
+    def predict_iter(self,x,batch_size=10000,method='mean_var',full_layer=False,sample_size=50,m=50,aggregation=True):
+        """Implement predictions from the trained DGP model batch by batch, so that only the predictions (and, if **method** = '`sampling`',
+        the samples) of one batch of testing positions are held in memory at a time.
+
+        Args:
+            x, method, full_layer, sample_size, m, aggregation: see descriptions of the method :meth:`.emulator.predict`.
+            batch_size (int, optional): the maximum number of testing positions in a batch. Defaults to `10000`.
+
+        Returns:
+            generator: a generator of tuples, each of which contains a slice that gives the rows of **x** in a batch and the output of
+            the method :meth:`.emulator.predict` for these rows. The input is checked when the method is called.
+
+        Examples:
+            To write the predictive means and variances of a large testing set to memory-mapped `.npy` files, do::
+
+                D=len(emu.all_layer[-1])
+                mu=np.lib.format.open_memmap('mu.npy',mode='w+',shape=(len(x),D))
+                sigma2=np.lib.format.open_memmap('sigma2.npy',mode='w+',shape=(len(x),D))
+                for idx, (mu_b, sigma2_b) in emu.predict_iter(x):
+                    mu[idx], sigma2[idx]=mu_b, sigma2_b
+                mu.flush(); sigma2.flush()
+        """
+        if x.ndim==1:
+            raise Exception('The testing input has to be a numpy 2d-array')
+        return ((idx, self.predict(x_batch,method,full_layer,sample_size,m,aggregation)) for idx, x_batch in batch_input(x, batch_size))
+
     def predict(self,x,method='mean_var',full_layer=False,sample_size=50,m=50,aggregation=True):
         """Implement predictions from the trained DGP model.
 
@@ -714,7 +724,6 @@ class emulator:
         """
         if x.ndim==1:
             raise Exception('The testing input has to be a numpy 2d-array')
-        M=len(x)
         if method=='mean_var':
             sample_size=1
         #start predictions
@@ -722,65 +731,13 @@ class emulator:
         variance_pred=[]
         likelihood_mean=[]
         likelihood_variance=[]
+        mean_layers,variance_layers=self.predict_layers(x,m)
         for s in range(len(self.all_layer_set)):
-            overall_global_test_input=x
-            one_imputed_all_layer=self.all_layer_set[s]
             if full_layer:
-                mean_pred_oneN=[]
-                variance_pred_oneN=[]
-            for l in range(self.n_layer):
-                layer=one_imputed_all_layer[l]
-                n_kerenl=len(layer)
-                if l==self.n_layer-1:
-                    likelihood_gp_mean=np.empty((M,n_kerenl))
-                    likelihood_gp_var=np.empty((M,n_kerenl))
-                else:
-                    overall_test_output_mean=np.empty((M,n_kerenl))
-                    overall_test_output_var=np.empty((M,n_kerenl))
-                if l==0:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.gp_prediction(x=overall_global_test_input[:,kernel.input_dim],z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-                    if full_layer:
-                        mean_pred_oneN.append(overall_test_input_mean)
-                        variance_pred_oneN.append(overall_test_input_var)
-                elif l==self.n_layer-1:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        m_k_in,v_k_in=overall_test_input_mean[:,kernel.input_dim],overall_test_input_var[:,kernel.input_dim]
-                        if kernel.type=='gp':
-                            kernel.pred_m = m
-                            if kernel.connect is not None:
-                                z_k_in=overall_global_test_input[:,kernel.connect]
-                            else:
-                                z_k_in=None
-                            m_k,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in)
-                            likelihood_gp_mean[:,k],likelihood_gp_var[:,k]=m_k,v_k
-                        elif kernel.type=='likelihood':
-                            m_k,v_k=kernel.prediction(m=m_k_in,v=v_k_in)
-                            likelihood_gp_mean[:,k],likelihood_gp_var[:,k]=m_k,v_k
-                else:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        m_k_in,v_k_in=overall_test_input_mean[:,kernel.input_dim],overall_test_input_var[:,kernel.input_dim]
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-                    if full_layer:
-                        mean_pred_oneN.append(overall_test_input_mean)
-                        variance_pred_oneN.append(overall_test_input_var)
+                mean_pred_oneN=[mean_layers[l][s] for l in range(self.n_layer-1)]
+                variance_pred_oneN=[variance_layers[l][s] for l in range(self.n_layer-1)]
+            overall_test_input_mean,overall_test_input_var=mean_layers[-2][s],variance_layers[-2][s]
+            likelihood_gp_mean,likelihood_gp_var=mean_layers[-1][s],variance_layers[-1][s]
             for _ in range(sample_size):
                 if full_layer:
                     mean_pred.append(mean_pred_oneN)
@@ -864,41 +821,11 @@ class emulator:
         else:
             if self.all_layer[-1][0].type!='likelihood':
                 raise Exception('The method is only applicable to a DGP with the final layer formed by only ONE node, which must be a likelihood node.')
-        M=len(x)
         #start predictions
         predicted_lik=[]
+        mean_layers,variance_layers=self.predict_layers(x,m,self.n_layer-1)
         for s in range(len(self.all_layer_set)):
-            overall_global_test_input=x
-            one_imputed_all_layer=self.all_layer_set[s]
-            for l in range(self.n_layer-1):
-                layer=one_imputed_all_layer[l]
-                n_kerenl=len(layer)
-                overall_test_output_mean=np.empty((M,n_kerenl))
-                overall_test_output_var=np.empty((M,n_kerenl))
-                if l==0:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.gp_prediction(x=overall_global_test_input[:,kernel.input_dim],z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-                else:
-                    for k in range(n_kerenl):
-                        kernel=layer[k]
-                        kernel.pred_m = m
-                        m_k_in,v_k_in=overall_test_input_mean[:,kernel.input_dim],overall_test_input_var[:,kernel.input_dim]
-                        if kernel.connect is not None:
-                            z_k_in=overall_global_test_input[:,kernel.connect]
-                        else:
-                            z_k_in=None
-                        m_k,v_k=kernel.linkgp_prediction(m=m_k_in,v=v_k_in,z=z_k_in)
-                        overall_test_output_mean[:,k],overall_test_output_var[:,k]=m_k,v_k
-                    overall_test_input_mean,overall_test_input_var=overall_test_output_mean,overall_test_output_var
-            predicted_lik.append(ghdiag(one_imputed_all_layer[-1][0].pllik,overall_test_input_mean,overall_test_input_var,y))
+            predicted_lik.append(ghdiag(self.all_layer_set[s][-1][0].pllik,mean_layers[-1][s],variance_layers[-1][s],y))
         nllik=-np.log(np.mean(predicted_lik,axis=0)).flatten()
         average_nllik=np.mean(nllik)
         return average_nllik, nllik
@@ -3,7 +3,7 @@ import numpy as np
 from math import erf, sqrt, pi
 from numpy.random import randn
 from scipy.linalg import pinvh
-from .vecchia import K_matrix_nb, quad, K_vec_nb, Jd, Jd0
+from .vecchia import K_matrix_nb, K_vec_nb, Jd, Jd0
 import itertools
 from psutil import cpu_count
 
@@ -90,6 +90,62 @@ def matern_multi(v,u):
         dist1[d] = coefi1
     return dist, dist1
 
+@njit(cache=True, parallel=True)
+def fod_exp_sum(X,KW):
+    """Compute the sums of elementwise products between KW and the derivative matrices (wrt log-transformed lengthscales)
+       of the squared exponential correlation matrix, one input dimension at a time, without forming the derivative matrices.
+    """
+    n, D = X.shape
+    dm = np.zeros((n,D))
+    for i in prange(n - 1):
+        for j in range(i + 1, n):
+            temp = KW[i,j]+KW[j,i]
+            for d in range(D):
+                dm[i,d] += 2*(X[i,d]-X[j,d])**2*temp
+    return np.sum(dm,axis=0)
+
+@njit(cache=True, parallel=True)
+def fod_matern_sum(X,KW):
+    """Compute the sums of elementwise products between KW and the derivative matrices (wrt log-transformed lengthscales)
+       of the Matern2.5 correlation matrix, one input dimension at a time, without forming the derivative matrices.
+    """
+    n, D = X.shape
+    dm = np.zeros((n,D))
+    for i in prange(n - 1):
+        for j in range(i + 1, n):
+            temp = KW[i,j]+KW[j,i]
+            for d in range(D):
+                disi = np.abs(X[i,d] - X[j,d])
+                dm[i,d] += (5/3)*(disi**2)*(1+np.sqrt(5)*disi)/(1+np.sqrt(5)*disi+5/3*disi**2)*temp
+    return np.sum(dm,axis=0)
+
+@njit(cache=True, parallel=True)
+def fod_exp_cross_sum(X1,X2,KG):
+    """Compute the sums of elementwise products between KG and the derivative matrices (wrt log-transformed lengthscales)
+       of the squared exponential cross-correlation matrix between X1 and X2, one input dimension at a time.
+    """
+    n, D = X1.shape
+    dm = np.zeros((n,D))
+    for i in prange(n):
+        for j in range(X2.shape[0]):
+            for d in range(D):
+                dm[i,d] += 2*(X1[i,d]-X2[j,d])**2*KG[i,j]
+    return np.sum(dm,axis=0)
+
+@njit(cache=True, parallel=True)
+def fod_matern_cross_sum(X1,X2,KG):
+    """Compute the sums of elementwise products between KG and the derivative matrices (wrt log-transformed lengthscales)
+       of the Matern2.5 cross-correlation matrix between X1 and X2, one input dimension at a time.
+    """
+    n, D = X1.shape
+    dm = np.zeros((n,D))
+    for i in prange(n):
+        for j in range(X2.shape[0]):
+            for d in range(D):
+                disi = np.abs(X1[i,d] - X2[j,d])
+                dm[i,d] += (5/3)*(disi**2)*(1+np.sqrt(5)*disi)/(1+np.sqrt(5)*disi+5/3*disi**2)*KG[i,j]
+    return np.sum(dm,axis=0)
+
 @njit(cache=True)
 def g(coef1, coef2, x, name):
     if name=='ga':
@@ -118,6 +174,15 @@ def fmvn(cov):
     samp=(L@sn).flatten()
     return samp
 
+@njit(cache=True)
+def fmvn_chol(L):
+    """Generate multivariate Gaussian random samples without means from the lower Cholesky factor of the covariance.
+    """
+    d=len(L)
+    sn=randn(d,1)
+    samp=(L@sn).flatten()
+    return samp
+
 #@jit(nopython=True,cache=True)
 #def fmvn_mu(mu,cov):
 #    """Generate multivariate Gaussian random samples with means.
@@ -194,21 +259,6 @@ def mice_var(x, x_extra, input_dim, connect, name, length, scale, nugget, nugget
     return sigma2
 
 ######functions for predictions########
-@njit(cache=True)
-def Pmatrix(X):
-    N,D=np.shape(X)
-    P=np.empty((D,N,N))
-    for d in range(D):
-        for k in range(N):
-            for l in range(k+1):
-                temp = X[k,d]+X[l,d]
-                if k==l:
-                    P[d,k,l] = temp
-                else:
-                    P[d,k,l] = temp
-                    P[d,l,k] = temp
-    return P
-
 @njit(cache=True,fastmath=True)
 def k_one_vec(X,z,length,name):
     """Compute cross-correlation matrix between the testing and training input data.
@@ -261,61 +311,202 @@ def cond_mean(x,z,w1,global_w1,Rinv_y,length,name):
  #   m=np.dot(Rinv_y, r)
 #    return m, v
 
+@njit(cache=True)
+def gp_tile(n):
+    """Return the number of testing positions in a tile of :func:`.gp`, so that a tile of cross-correlations with **n** training 
+       positions holds about 2^21 entries.
+    """
+    return max(32, min(512, 2**21//n))
+
+@njit(cache=True,fastmath=True)
+def k_row_nb(X_l, z_l, name, out):
+    """Fill the workspace **out** with the correlations between the rows of the scaled training input **X_l** and 
+       the scaled testing position **z_l**.
+    """
+    n, d = X_l.shape
+    if name == 'sexp':
+        for i in range(n):
+            dist = 0.
+            for k in range(d):
+                dist += (X_l[i,k] - z_l[k])**2
+            out[i] = np.exp(-dist)
+    elif name == 'matern2.5':
+        for i in range(n):
+            coef1, coef2 = 1., 0.
+            for k in range(d):
+                distk = np.abs(X_l[i,k] - z_l[k])
+                coef1 *= 1+sqrt(5)*distk+5/3*distk**2
+                coef2 += distk
+            out[i] = coef1 * np.exp(-sqrt(5) * coef2)
+
 @njit(cache=True, parallel=True)
 def gp(x,z,w1,global_w1,Rinv,Rinv_y,scale,length,nugget,name):
-    """Make GP predictions
+    """Make GP predictions. The testing positions are processed in tiles (see :func:`.gp_tile`): the cross-correlations of a tile 
+       are built in parallel and multiplied with **Rinv** in one matrix-matrix product, from which the variances are reduced row-wise.
+       **Rinv_y** is a 2d-array whose columns belong to GPs that share **Rinv** (e.g., a GP across imputations), so the means of all of 
+       them are given by one matrix-matrix product per tile and returned as the columns of a 2d-array.
     """
     if z is not None:
         x=np.concatenate((x, z),1)
         w1=np.concatenate((w1, global_w1),1)
-    n_pred = x.shape[0]
-    m, v = np.zeros(n_pred), np.zeros(n_pred)
-    for i in prange(n_pred):
-        ri=K_vec_nb(w1,x[i],length,name)
-        Rinv_ri=np.dot(Rinv,ri)
-        r_Rinv_r=np.dot(ri, Rinv_ri)
-        m[i] = np.dot(Rinv_y, ri)
-        v[i] = np.abs(scale*(1+nugget-r_Rinv_r))[0]
+    n_pred, n = x.shape[0], w1.shape[0]
+    m, v = np.zeros((n_pred, Rinv_y.shape[1])), np.zeros(n_pred)
+    if len(length)==1:
+        w_l, x_l = w1/length[0], x/length[0]
+    else:
+        w_l, x_l = w1/length, x/length
+    tile = max(1, min(gp_tile(n), n_pred))
+    R = np.empty((tile, n))
+    for start in range(0, n_pred, tile):
+        T = min(tile, n_pred-start)
+        for j in prange(T):
+            k_row_nb(w_l, x_l[start+j], name, R[j])
+        R_Rinv = np.dot(R[:T], Rinv)
+        m[start:start+T] = np.dot(R[:T], Rinv_y)
+        for j in prange(T):
+            r_Rinv_r = 0.
+            for k in range(n):
+                r_Rinv_r += R[j,k]*R_Rinv[j,k]
+            v[start+j] = np.abs(scale[0]*(1+nugget[0]-r_Rinv_r))
     return m, v
 
+def link_group(n):
+    """Return the number of GPs (e.g., the copies of a GP across imputations) whose H matrices (see :func:`.link_gp`) are stacked 
+       in one call of :func:`.link_gp`, so that the stack for **n** training positions holds about 2^24 entries.
+    """
+    return max(1, 2**24//n**2)
+
+@njit(cache=True, parallel=True)
+def link_H(Rinv, Rinv_y, R2sexp, scale, H):
+    """Fill the workspace **H** with Rinv_y Rinv_y^T - scale*Rinv, multiplied elementwise by **R2sexp** if it is not `None`.
+    """
+    n = len(Rinv_y)
+    for i in prange(n):
+        for j in range(n):
+            h = Rinv_y[i]*Rinv_y[j]-scale*Rinv[i,j]
+            if R2sexp is not None:
+                h *= R2sexp[i,j]
+            H[i,j] = h
+
 @njit(cache=True, parallel=True)
-def link_gp(m, v, z, w1, global_w1, Rinv, Rinv_y, R2sexp, Psexp, scale, length, nugget, name):
-    """Make linked GP predictions.
+def link_gp(m, v, z, w1, global_w1, H, Rinv_y, scale, length, nugget, name):
+    """Make linked GP predictions for a stack of G GPs that share the global input and hyperparameters (e.g., the copies of a GP 
+       across imputations): **w1**, **H** and **Rinv_y** have a leading axis of length G, and the rows of **m** and **v** are the 
+       testing positions of the first GP followed by those of the second, and so on. All (GP, testing position) pairs are 
+       processed in one parallel loop. The J matrices are never formed: with H = Rinv_y Rinv_y^T - scale*Rinv (multiplied 
+       elementwise by R2sexp for the squared exponential kernel, see :func:`.link_H`), the variance only needs the sum of the 
+       entries of J∘H, which :func:`.IJ_sexp_sum` and :func:`.IJ_matern_sum` accumulate as the entries of J are generated.
     """
+    G, n, Dw = w1.shape
     n_pred = m.shape[0]
+    M = n_pred//G
     m_new, v_new = np.zeros(n_pred), np.zeros(n_pred)
     if z is not None:
-        Dw=np.shape(w1)[1]
         Dz=np.shape(z)[1]
         if len(length)==1:
             length=np.full(Dw+Dz, length[0])
     else:
-        Dw=np.shape(w1)[1]
+        Dz=0
         if len(length)==1:
             length=np.full(Dw, length[0])
-    for i in prange(n_pred):
+    ones = np.ones(n)
+    for p in prange(n_pred):
+        g, i = p//M, p%M
         if z is not None:
-            Izi = K_vec_nb(global_w1, z[i], length[-Dz::], name)
-            Jzi = np.outer(Izi,Izi)
-            if name == 'sexp' and R2sexp is not None and Psexp is not None:
-                Ii,Ji = IJ_sexp(w1, m[i], v[i], length[:-Dz], R2sexp, Psexp)
-            else:
-                Ii,Ji = IJ_matern(w1, m[i], v[i], length[:-Dz])
-            Ii *= Izi
-            Ji *= Jzi
+            Izi = K_vec_nb(global_w1, z[i], length[Dw:], name)
         else:
-            if name == 'sexp' and R2sexp is not None and Psexp is not None:
-                Ii,Ji = IJ_sexp(w1, m[i], v[i], length, R2sexp, Psexp)
-            else:
-                Ii,Ji = IJ_matern(w1, m[i], v[i], length)
-        tr_RinvJ = trace_sum(Rinv,Ji)
-        IRinv_y = np.dot(Ii,Rinv_y)
-        m_new[i] = IRinv_y
-        v_new[i] = np.abs(quad(Ji,Rinv_y)-IRinv_y**2+scale*(1+nugget-tr_RinvJ))
+            Izi = ones
+        if name == 'sexp':
+            Ii, sum_JH = IJ_sexp_sum(w1[g], m[p], v[p], length[:Dw], H[g], Izi)
+        else:
+            Ii, sum_JH = IJ_matern_sum(w1[g], m[p], v[p], length[:Dw], H[g], Izi)
+        IRinv_y = np.dot(Ii,Rinv_y[g])
+        m_new[p] = IRinv_y
+        v_new[p] = np.abs(sum_JH-IRinv_y**2+scale*(1+nugget))
     return m_new,v_new
 
+@njit(cache=True,fastmath=True)
+def IJ_sexp_sum(X, z_m, z_v, length, H, Iz):
+    """Compute the I vector (multiplied by **Iz**) and the sum of the entries of J∘H∘(Iz Iz^T) of the squared exponential 
+       kernel without forming J. **H** must already include the factor R2sexp of J.
+    """
+    n, d = X.shape
+    I = np.empty(n)
+    A = np.empty((n,d))
+    c = np.empty(d)
+    I_coef1, J_coef1 = 1., 1.
+    for k in range(d):
+        div = 2*z_v[k]/length[k]**2
+        I_coef1 *= 1 + div
+        J_coef1 *= 1 + 2*div
+        c[k] = 1/(2+4*div)
+    I_coef1, J_coef1 = 1/sqrt(I_coef1), 1/sqrt(J_coef1)
+    for i in range(n):
+        I_coef2 = 0.
+        for k in range(d):
+            I_coef2 += (X[i,k]-z_m[k])**2/(2*z_v[k]+length[k]**2)
+            A[i,k] = (X[i,k]-z_m[k])/length[k]
+        I[i] = I_coef1 * np.exp(-I_coef2) * Iz[i]
+    s = 0.
+    for i in range(n):
+        s_i = 0.
+        for j in range(i):
+            e = 0.
+            for k in range(d):
+                e += (A[i,k]+A[j,k])**2*c[k]
+            s_i += np.exp(-e)*H[i,j]*Iz[j]
+        e = 0.
+        for k in range(d):
+            e += 4*A[i,k]**2*c[k]
+        s += Iz[i]*(2*s_i+np.exp(-e)*H[i,i]*Iz[i])
+    return I, J_coef1*s
+
 @njit(cache=True)
-def IJ_sexp(X, z_m, z_v, length, R2sexp, Psexp):
+def IJ_matern_sum(X, z_m, z_v, length, H, Iz):
+    """Compute the I vector (multiplied by **Iz**) and the sum of the entries of J∘H∘(Iz Iz^T) of the Matérn-2.5 
+       kernel without forming J.
+    """
+    n, d = X.shape
+    I = np.empty(n)
+    I0 = np.ones((n,d))
+    zX = z_m-X
+    muA, muB = zX-sqrt(5)*z_v/length, zX+sqrt(5)*z_v/length
+    for i in range(n):
+        Ii = 1.
+        for k in range(d):
+            if z_v[k]!=0:
+                Ii *= np.exp((5*z_v[k]-2*sqrt(5)*length[k]*zX[i,k])/(2*length[k]**2))* \
+                    ((1+sqrt(5)*muA[i,k]/length[k]+5*(muA[i,k]**2+z_v[k])/(3*length[k]**2))*0.5*(1+erf(muA[i,k]/sqrt(2*z_v[k])))+ \
+                    (sqrt(5)+(5*muA[i,k])/(3*length[k]))*sqrt(0.5*z_v[k]/pi)/length[k]*np.exp(-0.5*muA[i,k]**2/z_v[k]))+ \
+                    np.exp((5*z_v[k]+2*sqrt(5)*length[k]*zX[i,k])/(2*length[k]**2))* \
+                    ((1-sqrt(5)*muB[i,k]/length[k]+5*(muB[i,k]**2+z_v[k])/(3*length[k]**2))*0.5*(1+erf(-muB[i,k]/sqrt(2*z_v[k])))+ \
+                    (sqrt(5)-(5*muB[i,k])/(3*length[k]))*sqrt(0.5*z_v[k]/pi)/length[k]*np.exp(-0.5*muB[i,k]**2/z_v[k]))
+            else:
+                I0[i,k] = (1+sqrt(5)*np.abs(zX[i,k])/length[k]+5*zX[i,k]**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX[i,k])/length[k])
+                Ii *= I0[i,k]
+        I[i] = Ii * Iz[i]
+    s = 0.
+    for i in range(n):
+        s_i = 0.
+        for j in range(i):
+            Jij = 1.
+            for k in range(d):
+                if z_v[k]!=0:
+                    Jij *= Jd(X[j,k],X[i,k],z_m[k],z_v[k],length[k])
+                else:
+                    Jij *= I0[i,k]*I0[j,k]
+            s_i += Jij*H[i,j]*Iz[j]
+        Jii = 1.
+        for k in range(d):
+            if z_v[k]!=0:
+                Jii *= Jd0(X[i,k],z_m[k],z_v[k],length[k])
+            else:
+                Jii *= I0[i,k]**2
+        s += Iz[i]*(2*s_i+Jii*H[i,i]*Iz[i])
+    return I, s
+
+@njit(cache=True)
+def IJ_sexp(X, z_m, z_v, length, R2sexp):
     n, d = X.shape
     I = np.zeros(n)
     J = np.zeros((n,n))
@@ -325,7 +516,8 @@ def IJ_sexp(X, z_m, z_v, length, R2sexp, Psexp):
         div = 2*z_v[k]/length[k]**2
         I_coef1 *= 1 + div
         J_coef1 *= 1 + 2*div
-        J += (Psexp[k]-2*z_m[k]/length[k])**2/(2+4*div)
+        A = X_z[:,k]/length[k]
+        J += (A.reshape(-1,1)+A)**2/(2+4*div)
     I_coef1, J_coef1 = 1/sqrt(I_coef1), 1/sqrt(J_coef1)
     J = J_coef1 * np.exp(-J) * R2sexp
     for i in range(n):
@@ -378,17 +570,59 @@ def IJ_matern(X, z_m, z_v, length):
                 J[j,i] = J[i,j]
     return I,J
 
-@njit(cache=True,fastmath=True)
-def trace_sum(A,B):
-    n = len(A)
-    a = 0
-    for k in range(n):
-        for l in range(k+1):
-            if k==l:
-                a += A[k,l]*B[k,l]
+######functions for GPs on grids######
+def kron_mv(mats, x):
+    """Compute the product between the Kronecker product of the matrices in mats and the vector x without forming the Kronecker product.
+    """
+    X = x.reshape([A.shape[1] for A in mats])
+    for d, A in enumerate(mats):
+        X = np.moveaxis(np.tensordot(A, X, axes=(1, d)), 0, d)
+    return X.ravel()
+
+def kron_contract(x, vecs):
+    """Compute, for each row t of the matrices in vecs, the inner product between the vector x and the Kronecker product
+       of the t-th rows of the matrices in vecs.
+    """
+    shape = [v.shape[1] for v in vecs]
+    B = vecs[0] @ x.reshape(shape[0], -1)
+    for d in range(1, len(vecs)):
+        B = np.einsum('tj,tjk->tk', vecs[d], B.reshape(len(B), shape[d], -1))
+    return B[:,0]
+
+def gp_kron(x, grid, Qs, w, alpha, scale, length, nugget, name):
+    """Make GP predictions when the training input forms a grid.
+    """
+    D = len(grid)
+    if len(length)==1:
+        length=np.full(D, length[0])
+    R = [k_one_vec(x[:,[d]], grid[d][:,None], length[[d]], name) for d in range(D)]
+    m = kron_contract(alpha, R)
+    v = np.abs(scale*(1+nugget-kron_contract(w, [(R[d]@Qs[d])**2 for d in range(D)])))
+    return m, v
+
+def link_gp_kron(m, v, grid, Qs, w, alpha, scale, length, nugget, name):
+    """Make linked GP predictions when the training input forms a grid.
+    """
+    n_pred, D = m.shape
+    if len(length)==1:
+        length=np.full(D, length[0])
+    if name=='sexp':
+        R2sexp=[np.exp(-(grid[d][:,None]-grid[d][None,:])**2/(2*length[d]**2)) for d in range(D)]
+    m_new, v_new = np.zeros(n_pred), np.zeros(n_pred)
+    for i in range(n_pred):
+        I, J = [], []
+        for d in range(D):
+            if name=='sexp':
+                Id, Jd = IJ_sexp(grid[d][:,None], m[i,[d]], v[i,[d]], length[[d]], R2sexp[d])
             else:
-                a += 2*A[k,l]*B[k,l]
-    return a
+                Id, Jd = IJ_matern(grid[d][:,None], m[i,[d]], v[i,[d]], length[[d]])
+            I.append(Id[None,:])
+            J.append(Jd)
+        IRinv_y = kron_contract(alpha, I)[0]
+        tr_RinvJ = kron_contract(w, [np.sum(Qs[d]*(J[d]@Qs[d]),axis=0)[None,:] for d in range(D)])[0]
+        m_new[i] = IRinv_y
+        v_new[i] = np.abs(alpha@kron_mv(J, alpha)-IRinv_y**2+scale*(1+nugget-tr_RinvJ))
+    return m_new, v_new
 
 @njit(cache=True, parallel=True)
 def esloo_calculation(mu_i, var_i, Y, indices, start_rows):
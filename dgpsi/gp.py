@@ -2,8 +2,9 @@ import multiprocess.context as ctx
 import platform
 import numpy as np
 from scipy.spatial.distance import cdist
-from .functions import mice_var
+from .functions import mice_var, kron_mv
 from .vecchia import get_pred_nn, loo_gp_vecch
+from .utils import batch_input, shared_arrays
 from pathos.multiprocessing import ProcessingPool as Pool
 import psutil 
 import copy
@@ -20,21 +21,35 @@ class gp:
         kernel (class): a :class:`.kernel` class that specifies the features of the GP. 
         vecchia (bool): a bool indicating if Vecchia approximation will be used. Defaults to `False`. 
         m (int): an integer that gives the size of the conditioning set for the Vecchia approximation in the training. Defaults to `25`. 
-        ord_fun (function, optional): a function that decides the ordering of the input of the GP for the Vecchia approximation. If set to `None`, then the default random ordering is used. Defaults to `None`.
+        ord_fun (function or str, optional): a function that decides the ordering of the input of the GP for the Vecchia approximation. Set to `maxmin` or `approx_maxmin` to use the built-in exact or approximate max-min distance ordering of the lengthscale-scaled input. If set to `None`, then the default random ordering is used. Defaults to `None`.
+        precision (str, optional): either `double` or `single`. If `single`, the conditioning blocks of the Vecchia approximation are built in float32 
+            while the Cholesky factorisations and likelihood accumulations stay in float64. Only used when **vecchia** = `True`. Defaults to `double`.
+        inducing (bool): a bool indicating if the inducing-point (FITC) approximation will be used. Cannot be used together with **vecchia**. Defaults to `False`.
+        r (int): an integer that gives the number of inducing points for the FITC approximation. Defaults to `100`.
+        grid (bool, optional): whether the input **X** forms a full grid, in which case the GP is trained and makes predictions exactly through 
+            the Kronecker structure of its correlation matrix. If set to `None`, the grid structure is detected automatically. If set to `True`, 
+            an error is raised if **X** does not form a grid. If set to `False`, the Kronecker structure is not used. The Kronecker structure is 
+            not used when **vecchia** or **inducing** is `True`. Defaults to `None`.
     """
 
-    def __init__(self, X, Y, kernel, vecchia=False, m=25, ord_fun=None):
+    def __init__(self, X, Y, kernel, vecchia=False, m=25, ord_fun=None, precision='double', inducing=False, r=100, grid=None):
         self.X=X
         self.Y=Y
         if (self.Y).ndim==1 or X.ndim==1:
             raise Exception('The input and output data have to be numpy 2d-arrays.')
         self.kernel=kernel
         self.vecch=vecchia
+        self.inducing=inducing
+        if self.vecch and self.inducing:
+            raise Exception('The Vecchia and inducing-point approximations cannot be used together.')
         self.n_data=self.X.shape[0]
         #if self.n_data>=1e5:
         #    self.kernel.nn_method = 'approx'
         self.m=min(m, self.n_data-1)
+        self.r=min(r, self.n_data)
         self.ord_fun=ord_fun
+        self.precision=precision
+        self.grid=grid
         self.initialize()
         if self.vecch:
             self.kernel.ord_nn()
@@ -52,6 +67,14 @@ class gp:
             state['m'] = 25
         if 'ord_fun' not in state:
             state['ord_fun'] = None
+        if 'precision' not in state:
+            state['precision'] = 'double'
+        if 'inducing' not in state:
+            state['inducing'] = False
+        if 'r' not in state:
+            state['r'] = 100
+        if 'grid' not in state:
+            state['grid'] = None
         self.__dict__.update(state)
         self.kernel.target = 'gp'
 
@@ -76,6 +99,11 @@ class gp:
         self.kernel.para_path=np.atleast_2d(np.concatenate((self.kernel.scale,self.kernel.length,self.kernel.nugget)))
         self.kernel.vecch = self.vecch
         self.kernel.m = self.m
+        self.kernel.precision = self.precision
+        self.kernel.inducing, self.kernel.r = self.inducing, self.r
+        if self.inducing:
+            self.kernel.inducing_set()
+        self.grid_set()
         if self.ord_fun is not None:
             self.kernel.ord_fun = self.ord_fun
         if self.kernel.prior_name=='ref':
@@ -87,12 +115,20 @@ class gp:
             self.kernel.compute_cl()
         self.kernel.target='gp'
 
+    def grid_set(self):
+        """Detect whether the input forms a full grid so that the Kronecker structure of the correlation matrix is used (see :meth:`.kernel.grid_set`).
+        """
+        if self.grid is False:
+            self.kernel.grid, self.kernel.grid_ord, self.kernel.kron_cache = None, None, None
+        elif not self.kernel.grid_set() and self.grid:
+            raise Exception('The input X does not form a grid.')
+
     def to_vecchia(self, m=25, ord_fun=None):
         """Convert the GP emulator to the Vecchia mode.
 
         Args:
             m (int): an integer that gives the size of the conditioning set for the Vecchia approximation in the training. Defaults to `25`. 
-            ord_fun (function, optional): a function that decides the ordering of the input of the GP for the Vecchia approximation. If set to `None`, then the default random ordering is used. Defaults to `None`.
+            ord_fun (function or str, optional): a function that decides the ordering of the input of the GP for the Vecchia approximation. Set to `maxmin` or `approx_maxmin` to use the built-in exact or approximate max-min distance ordering of the lengthscale-scaled input. If set to `None`, then the default random ordering is used. Defaults to `None`.
         """
         if self.vecch:
             raise Exception('The GP emulator is already in Vecchia mode.')
@@ -115,14 +151,49 @@ class gp:
         else:
             raise Exception('The GP emulator is already in non-Vecchia mode.')
 
+    def to_inducing(self, r=100):
+        """Convert the GP emulator to the inducing-point (FITC) mode.
+
+        Args:
+            r (int): an integer that gives the number of inducing points. Defaults to `100`. 
+        """
+        if self.inducing:
+            raise Exception('The GP emulator is already in inducing-point mode.')
+        elif self.vecch:
+            raise Exception('The GP emulator is in Vecchia mode. Remove the Vecchia mode first.')
+        else:
+            self.inducing=True
+            self.r = min(r, self.n_data)
+            self.kernel.inducing, self.kernel.r = self.inducing, self.r
+            self.kernel.inducing_set()
+            self.kernel.compute_stats()
+
+    def remove_inducing(self):
+        """Remove the inducing-point (FITC) mode from the GP emulator.
+        """
+        if self.inducing:
+            self.inducing = False
+            self.kernel.inducing = self.inducing
+            self.kernel.compute_stats()
+        else:
+            raise Exception('The GP emulator is already in non-inducing-point mode.')
+
     def update_xy(self, X, Y, reset=False):
-        """Update the trained GP emulator with new input and output data.
+        """Update the trained GP emulator with new input and output data. If **X** is the current input data with rows appended 
+        and the hyperparameters are unchanged, the statistics for predictions are extended incrementally (see :meth:`.kernel.extend_stats`) 
+        instead of being recomputed.
 
         Args:
             X (ndarray): a numpy 2d-array where each row is an input data point and each column is an input dimension.
             Y (ndarray): a numpy 2d-array with only one column and each row being an input data point.
             reset (bool, optional): whether to reset hyperparameter values of the GP emulator. Defaults to `False`. 
         """
+        n_old=self.n_data
+        extend=not self.vecch and not self.inducing and self.kernel.grid is None and not reset and len(X)>n_old and np.array_equal(X[:n_old], self.X) and self.kernel.stats_version==self.kernel.version
+        if extend and self.kernel.chol_cache is not None and self.kernel.chol_cache[0]==self.kernel.version:
+            L_old=self.kernel.chol_cache[1]
+        else:
+            L_old=None
         self.X=X
         self.Y=Y
         if (self.Y).ndim==1 or X.ndim==1:
@@ -132,8 +203,15 @@ class gp:
         #    self.kernel.nn_method = 'approx'
         self.m=min(self.m, self.n_data-1)
         self.update_kernel(reset_lengthscale=reset)
+        if self.inducing:
+            self.r=min(self.r, self.n_data)
+            self.kernel.r=self.r
+            self.kernel.inducing_set()
+        self.grid_set()
         if self.vecch:
             self.kernel.ord_nn()
+        elif extend and self.kernel.grid is None:
+            self.kernel.extend_stats(n_old, L_old)
         else:
             self.kernel.compute_stats()
     
@@ -157,10 +235,18 @@ class gp:
         if self.kernel.prior_name=='ref':
             self.kernel.compute_cl()
 
-    def train(self):
+    def train(self, n_starts=1, start='prior', core_num=None):
         """Train the GP model.
+
+        Args:
+            n_starts (int, optional): the number of starting points of the hyperparameter optimisation. If greater than one, 
+                the optimisations are run in parallel and the best one is kept. Defaults to `1`.
+            start (str, optional): how the additional starting points are drawn. Either `prior` to draw them from the priors 
+                of the lengthscales and nugget or `lhs` to draw them from a Latin hypercube inside the **bds** of the kernel. Defaults to `prior`.
+            core_num (int, optional): the number of workers used for the multi-start optimisation. Defaults to `None`. If not specified, 
+                it is set to ``min(n_starts, max physical cores available)``.
         """
-        self.kernel.maximise()
+        self.kernel.maximise(n_starts=n_starts, start=start, core_num=core_num)
         if not self.vecch:
             self.kernel.compute_stats()
 
@@ -311,8 +397,21 @@ class gp:
         if self.vecch:
             X_scale = self.X/self.kernel.length
             NNarray = get_pred_nn(X_scale, X_scale, m+1, method=self.kernel.nn_method)
-            mu,sigma2 = loo_gp_vecch(self.X, NNarray, self.Y, self.kernel.scale[0], self.kernel.length, self.kernel.nugget[0], self.kernel.name)
+            mu,sigma2 = loo_gp_vecch(self.kernel.cast(self.X), NNarray, self.Y, self.kernel.scale[0], self.kernel.length, self.kernel.nugget[0], self.kernel.name)
             mu,sigma2 = mu.reshape(-1,1), sigma2.reshape(-1,1)
+        elif self.inducing:
+            _, _, _, lam = self.kernel.fitc()
+            _, M, alpha, _ = self.kernel.fitc_solve()
+            sigma2 = (1/(1/lam-np.sum(M**2,axis=0))).reshape(-1,1)
+            mu = self.Y - alpha.reshape(-1,1)*sigma2
+            sigma2 = self.kernel.scale*sigma2
+        elif self.kernel.grid is not None:
+            _, Qs, _, lam = self.kernel.kron_eig()
+            sigma2 = np.empty(self.n_data)
+            sigma2[self.kernel.grid_ord] = 1/kron_mv([Q**2 for Q in Qs], 1/(lam+self.kernel.nugget[0]))
+            sigma2 = sigma2.reshape(-1,1)
+            mu = self.Y - self.kernel.Rinv_y[:,np.newaxis]*sigma2
+            sigma2 = self.kernel.scale*sigma2
         else:
             scale = self.kernel.scale
             Rinv = self.kernel.Rinv
@@ -355,7 +454,7 @@ class gp:
             set_num_threads(num_thread)
             return self.predict(x, method, sample_size, m)
         z=np.array_split(x,chunk_num)
-        with Pool(core_num) as pool:
+        with shared_arrays(self), Pool(core_num) as pool:
             res = pool.map(f, [[x, method, sample_size, m] for x in z])
             pool.close()
             pool.join()
@@ -365,6 +464,31 @@ class gp:
         elif method == 'sampling':
             return np.concatenate(res)
 
+    def predict_iter(self,x,batch_size=10000,method='mean_var',sample_size=50,m=50):
+        """Implement predictions from the trained GP model batch by batch, so that only the predictions of one batch of
+        testing positions are held in memory at a time.
+
+        Args:
+            x, method, sample_size, m: see descriptions of the method :meth:`.gp.predict`.
+            batch_size (int, optional): the maximum number of testing positions in a batch. Defaults to `10000`.
+
+        Returns:
+            generator: a generator of tuples, each of which contains a slice that gives the rows of **x** in a batch and the output of
+            the method :meth:`.gp.predict` for these rows. The input is checked when the method is called.
+
+        Examples:
+            To write the predictive means and variances of a large testing set to memory-mapped `.npy` files, do::
+
+                mu=np.lib.format.open_memmap('mu.npy',mode='w+',shape=(len(x),1))
+                sigma2=np.lib.format.open_memmap('sigma2.npy',mode='w+',shape=(len(x),1))
+                for idx, (mu_b, sigma2_b) in model.predict_iter(x):
+                    mu[idx], sigma2[idx]=mu_b, sigma2_b
+                mu.flush(); sigma2.flush()
+        """
+        if x.ndim==1:
+            raise Exception('The testing input has to be a numpy 2d-array')
+        return ((idx, self.predict(x_batch,method,sample_size,m)) for idx, x_batch in batch_input(x, batch_size))
+
     def predict(self,x,method='mean_var',sample_size=50,m=50):
         """Implement predictions from the trained GP model.
 
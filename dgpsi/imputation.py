@@ -1,7 +1,7 @@
 from numpy.random import uniform
 import numpy as np
-from .functions import update_f, fmvn
-from .vecchia import fmvn_sp, U_matrix_sp
+from .functions import update_f, fmvn_chol
+from .vecchia import U_matrix_sp
 
 class imputer:
     """Class to implement imputation of latent variables.
@@ -27,42 +27,59 @@ class imputer:
                 to generate one realisation of latent variables. Defaults to `0`.
         """
         n_layer=len(self.all_layer)
-        for _ in range(burnin+1):
+        is_hetero_type=[]
+        for l in range(n_layer-1):
+            layer=self.all_layer[l]
+            linked_layer=self.all_layer[l+1]
+            is_hetero = np.any([True if kernel.type=='likelihood' and kernel.exact_post_idx!=None else False for kernel in linked_layer])
+            if is_hetero and layer[0].vecch and linked_layer[0].rep is not None:
+                is_hetero = False
+            is_hetero_type.append(is_hetero)
+        # the input of the first layer is fixed, so the prior draws of its Vecchia GPs share one factor across the sweeps 
+        # and are drawn in batches of sweeps (of at most 2**23 values per GP)
+        batch_draw=n_layer>1 and self.all_layer[0][0].vecch and not is_hetero_type[0]
+        nu0, t0=None, 0
+        for t in range(burnin+1):
+            if batch_draw and (nu0 is None or t-t0==nu0[0].shape[1]):
+                size=min(burnin+1-t, max(1, 2**23//len(self.all_layer[0][0].output)))
+                nu0, t0=[kernel.vecch_sample(size) for kernel in self.all_layer[0]], t
             for l in range(n_layer-1):
                 layer=self.all_layer[l]
                 linked_layer=self.all_layer[l+1]
-                is_hetero_type = np.any([True if kernel.type=='likelihood' and kernel.exact_post_idx!=None else False for kernel in linked_layer])
-                if is_hetero_type and layer[0].vecch and linked_layer[0].rep is not None:
-                    is_hetero_type = False
-                if self.block and not is_hetero_type:
-                    self.one_sample_block(layer,linked_layer)
+                nu=[draws[:,t-t0] for draws in nu0] if l==0 and batch_draw else None
+                if self.block and not is_hetero_type[l]:
+                    self.one_sample_block(layer,linked_layer,nu)
                 else:
                     n_kernel=len(layer)
                     for k in range(n_kernel):
                         target_kernel=layer[k]
                         linked_upper_kernels=[kernel for kernel in linked_layer if k in kernel.input_dim]
-                        self.one_sample(target_kernel,linked_upper_kernels,k)
+                        self.one_sample(target_kernel,linked_upper_kernels,k,None if nu is None else nu[k])
 
     @staticmethod
-    def one_sample_block(target_layer,upper_layer):
+    def one_sample_block(target_layer,upper_layer,prior_draws=None):
         """Impute a latent layer.
 
         Args:
             target_layer (list): a list of GPs that produce a latent layer that needs to be imputed.
             upper_layer (list): a list of GPs (in the next layer) that are fed by the output of GPs in **target_layer**.
+            prior_draws (list, optional): a list of the realisations from the priors of GPs in **target_layer** that define
+                the ellipse. When set to `None`, they are drawn here. Defaults to `None`.
         """
         M, N = len(target_layer), len(target_layer[0].output)
         f, nu = np.zeros((N,M)), np.zeros((N,M))
         for i, kernel in enumerate(target_layer):
             f[:,i] = kernel.output.flatten()
-            if kernel.vecch:
-                if kernel.global_input is not None:
-                    X=np.concatenate((kernel.input, kernel.global_input),1)
-                else:
-                    X=kernel.input
-                nu[:,i] = fmvn_sp(X[kernel.ord], kernel.NNarray, kernel.scale[0], kernel.length, kernel.nugget[0], kernel.name)[kernel.rev_ord]
+            if prior_draws is not None:
+                nu[:,i] = prior_draws[i]
+            elif kernel.vecch:
+                nu[:,i] = kernel.vecch_sample()[:,0]
+            elif kernel.inducing:
+                nu[:,i] = kernel.fitc_sample()
+            elif kernel.grid is not None:
+                nu[:,i] = kernel.kron_sample()
             else:
-                nu[:,i] = fmvn(kernel.scale*kernel.k_matrix())
+                nu[:,i] = np.sqrt(kernel.scale)*fmvn_chol(kernel.chol())
 
         #f = np.vstack([kernel.output.flatten() for kernel in target_layer]).T
         # Choose the ellipse for this sampling iteration.
@@ -74,6 +91,8 @@ class imputer:
             if linked_kernel.type=='gp':
                 if linked_kernel.vecch:
                     log_y += linked_kernel.log_likelihood_func_vecch()
+                elif linked_kernel.inducing:
+                    log_y += linked_kernel.log_likelihood_func_inducing()
                 else:      
                     log_y += linked_kernel.log_likelihood_func()
             elif linked_kernel.type=='likelihood': 
@@ -99,6 +118,8 @@ class imputer:
                 if linked_kernel.type=='gp':
                     if linked_kernel.vecch:
                         log_yp += linked_kernel.log_likelihood_func_vecch()
+                    elif linked_kernel.inducing:
+                        log_yp += linked_kernel.log_likelihood_func_inducing()
                     else:
                         log_yp += linked_kernel.log_likelihood_func()
                 elif linked_kernel.type=='likelihood': 
@@ -118,7 +139,7 @@ class imputer:
                 theta = uniform(theta_min, theta_max)
     
     @staticmethod
-    def one_sample(target_kernel,linked_upper_kernels,k):
+    def one_sample(target_kernel,linked_upper_kernels,k,prior_draw=None):
         """Impute one latent variable produced by a particular GP.
 
         Args:
@@ -127,15 +148,14 @@ class imputer:
                 by the GP defined by the argument **target_kernel**.
             k (int): the index indicating the position of the GP defined by the argument **target_kernel** in
                 its layer.
+            prior_draw (ndarray, optional): a realisation from the prior of the GP defined by the argument **target_kernel**
+                that defines the ellipse. When set to `None`, it is drawn here. Defaults to `None`.
         """
         if target_kernel.vecch:
             if target_kernel.global_input is not None:
                 X=np.concatenate((target_kernel.input, target_kernel.global_input),1)
             else:
                 X=target_kernel.input
-        else:
-            covariance=target_kernel.k_matrix()
-            covariance=target_kernel.scale*covariance
                   
         if len(linked_upper_kernels)==1 and linked_upper_kernels[0].type=='likelihood' and linked_upper_kernels[0].exact_post_idx!=None:
             idx=np.where(linked_upper_kernels[0].input_dim == k)[0]
@@ -148,14 +168,19 @@ class imputer:
                         #Mt_Gamma_M_diag = 1/Mt_Gamma_M.diagonal()
                         #Mt_Gamma_M_diag = np.concatenate([np.unique(linked_upper_kernels[0].input[linked_upper_kernels[0].rep==i,:],axis=0) for i in range(np.max(linked_upper_kernels[0].rep)+1)], axis=0)[:,1]
                         #Mt_Gamma_M_diag = np.exp(Mt_Gamma_M_diag)[target_kernel.ord]
-                        #U_sp = U_matrix_sp(X[target_kernel.ord], target_kernel.imp_NNarray, target_kernel.scale[0], target_kernel.length, target_kernel.nugget[0], target_kernel.name, np.concatenate((Mt_Gamma_M_diag, Mt_Gamma_M_diag)), target_kernel.imp_pointer_row, target_kernel.imp_pointer_col)
+                        #U_sp = U_matrix_sp(X[target_kernel.ord], target_kernel.imp_NNarray, target_kernel.scale[0], target_kernel.length, target_kernel.nugget[0], target_kernel.name, np.concatenate((Mt_Gamma_M_diag, Mt_Gamma_M_diag)), target_kernel.imp_pattern)
                         #L_sp = L_matrix_sp(X[target_kernel.ord], target_kernel.NNarray, target_kernel.scale[0], target_kernel.length, target_kernel.nugget[0], target_kernel.name, target_kernel.pointer_row, target_kernel.pointer_col)
                     #else:
                     Gamma = np.exp(linked_upper_kernels[0].input[:,1])[target_kernel.ord]
-                    U_sp = U_matrix_sp(X[target_kernel.ord], target_kernel.imp_NNarray, target_kernel.scale[0], target_kernel.length, target_kernel.nugget[0], target_kernel.name, np.concatenate((Gamma, Gamma)), target_kernel.imp_pointer_row, target_kernel.imp_pointer_col)
+                    U_sp = U_matrix_sp(target_kernel.cast(X[target_kernel.ord]), target_kernel.imp_NNarray, target_kernel.scale[0], target_kernel.length, target_kernel.nugget[0], target_kernel.name, np.concatenate((Gamma, Gamma)), target_kernel.imp_pattern)
                     #L_sp = None
                     f=linked_upper_kernels[0].posterior_vecch(idx=idx, U_sp=U_sp, ord=target_kernel.ord, rev_ord=target_kernel.rev_ord)
                 else:
+                    if target_kernel.inducing:
+                        _, _, V, lam=target_kernel.fitc()
+                        covariance=target_kernel.scale*(V.T@V+np.diag(lam))
+                    else:
+                        covariance=target_kernel.scale*target_kernel.k_matrix()
                     f=linked_upper_kernels[0].posterior(idx=idx,v=covariance)
                 if linked_upper_kernels[0].rep is None:
                     linked_upper_kernels[0].input[:,idx]=f.reshape(-1,1)
@@ -167,16 +192,24 @@ class imputer:
         f=(target_kernel.output).flatten()
         # Choose the ellipse for this sampling iteration.
         #nu = np.random.default_rng().multivariate_normal(mean=np.zeros(len(f)),cov=covariance,check_valid='ignore')  
-        if target_kernel.vecch:
-            nu = fmvn_sp(X[target_kernel.ord], target_kernel.NNarray, target_kernel.scale[0], target_kernel.length, target_kernel.nugget[0], target_kernel.name)[target_kernel.rev_ord]
+        if prior_draw is not None:
+            nu = prior_draw
+        elif target_kernel.vecch:
+            nu = target_kernel.vecch_sample()[:,0]
+        elif target_kernel.inducing:
+            nu = target_kernel.fitc_sample()
+        elif target_kernel.grid is not None:
+            nu = target_kernel.kron_sample()
         else:
-            nu = fmvn(covariance)                       
+            nu = np.sqrt(target_kernel.scale)*fmvn_chol(target_kernel.chol())
         # Set the candidate acceptance threshold.
         log_y=0
         for linked_kernel in linked_upper_kernels:
             if linked_kernel.type=='gp':
                 if linked_kernel.vecch:
                     log_y += linked_kernel.log_likelihood_func_vecch()
+                elif linked_kernel.inducing:
+                    log_y += linked_kernel.log_likelihood_func_inducing()
                 else:      
                     log_y += linked_kernel.log_likelihood_func()
             elif linked_kernel.type=='likelihood': 
@@ -199,8 +232,11 @@ class imputer:
                 else:
                     linked_kernel.input[:,linked_kernel.input_dim==k]=fp[linked_kernel.rep].reshape(-1,1)
                 if linked_kernel.type=='gp':
+                    linked_kernel.invalidate()
                     if linked_kernel.vecch:
                         log_yp += linked_kernel.log_likelihood_func_vecch()
+                    elif linked_kernel.inducing:
+                        log_yp += linked_kernel.log_likelihood_func_inducing()
                     else:
                         log_yp += linked_kernel.log_likelihood_func()
                 elif linked_kernel.type=='likelihood': 
@@ -219,14 +255,15 @@ class imputer:
                 theta = uniform(theta_min, theta_max)
     
     def key_stats(self):
-        """Compute and store key statistics used in predictions
+        """Compute and store key statistics used in predictions. The statistics that do not depend on the imputed latent 
+        variables (e.g., **Rinv** of the GPs in the first layer) are kept from the previous call.
         """
         n_layer=len(self.all_layer)
         for l in range(n_layer):
             layer=self.all_layer[l]
             for kernel in layer:
                 if kernel.type == 'gp':
-                    kernel.compute_stats()
+                    kernel.compute_stats(reuse=True)
     
     def update_ord_nn(self):
         """Update order and KNN in each GP node for Vecchia approximation
@@ -236,7 +273,7 @@ class imputer:
             layer=self.all_layer[l]
             for k, kernel in enumerate(layer):
                 if kernel.type == 'gp':
-                    compute_pointer = False if kernel.imp_pointer_row is None else True
+                    compute_pointer = False if kernel.imp_pattern is None else True
                     if k == 0:
                         kernel.ord_nn(pointer=compute_pointer)
                     else:
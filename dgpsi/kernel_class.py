@@ -1,10 +1,17 @@
 import numpy as np
 from numpy.linalg import LinAlgError, lstsq, matrix_rank
 from scipy.optimize import minimize, Bounds
-from scipy.linalg import cho_solve, pinvh, cholesky
-from scipy.spatial.distance import pdist, squareform
-from .functions import Pmatrix, gp, link_gp, pdist_matern_one, pdist_matern_multi, pdist_matern_coef, fod_exp, logdet_nb, trace_nb, g
-from .vecchia import nn, vecchia_llik, vecchia_nllik, get_pred_nn, gp_vecch, imp_pointers, link_gp_vecch
+from scipy.linalg import cho_solve, pinvh, cholesky, solve_triangular
+from scipy.spatial.distance import pdist, squareform, cdist
+import multiprocess.context as ctx
+import platform
+from pathos.multiprocessing import ProcessingPool as Pool
+import psutil
+from numba import set_num_threads
+from threadpoolctl import threadpool_limits
+from .functions import gp, link_gp, link_H, link_group, pdist_matern_one, pdist_matern_multi, pdist_matern_coef, fod_exp, fod_exp_sum, fod_matern_sum, fod_exp_cross_sum, fod_matern_cross_sum, logdet_nb, trace_nb, g, k_one_vec, kron_mv, kron_contract, gp_kron, link_gp_kron
+from .utils import trace
+from .vecchia import nn, maxmin_ord, vecchia_llik, vecchia_nllik, get_pred_nn, pred_nn_index, gp_vecch, imp_pattern, nn_levels, use_levels, L_matrix, forward_solve_sp, forward_solve_sp_lv, link_gp_vecch
 class kernel:
     """
     Class that defines the GPs in the DGP hierarchy.
@@ -60,6 +67,8 @@ class kernel:
         para_path (ndarray): a numpy 2d-array that contains the trace of model parameters. Each row is a 
             parameter estimate produced by one SEM iteration. The model parameters in each row are ordered as 
             follow: ``np.array([scale estimate, lengthscale estimate (whose length>=1), nugget estimate])``.
+            It is a view of the rows stored in **para_trace**.
+        para_trace (class): a :class:`.trace` class that stores the rows of **para_path** in chunks. Defaults to `None`.
         global_input (ndarray): a numpy 2d-array that contains the connect global input dimensions determined 
             by the argument **connect**. The value of the attribute is assigned during the initialisation of 
             :class:`.dgp` class. If **connect** is set to `None`, this attribute is also `None`. 
@@ -79,10 +88,48 @@ class kernel:
         rev_ord (ndarray): a 1d-array that reconstructs the ordering of input from the ordered one for the Vecchia approximation. Defaults to `None`.
         m (int): the number of conditioning points in Vecchia approximation. Defaults to `None`.
         NNarray (ndarray): a 2d-array that gives the m NN for each data point after ordering for the Vecchia approximation. Defaults to `None`.
-        R2 (ndarray): a 2d-array that stores the R2 of the linear regression between **global_input** and **input**. Defaults to `None`.
+        NN_levels (tuple): the dependency levels of **NNarray** given by :func:`.nn_levels` for the level-scheduled forward solves 
+            in the Vecchia sampling (see :func:`.use_levels`). Defaults to `None`.
+        R2 (ndarray): a 2d-array that stores the R2 of the linear regression between **global_input** and **input**. It is a view of the rows 
+            stored in **R2_trace**. Defaults to `None`.
+        R2_trace (class): a :class:`.trace` class that stores the rows of **R2** in chunks. Defaults to `None`.
+        version (int): a counter that is increased whenever **input**, **global_input**, **length** or **nugget** is re-assigned
+            or :meth:`.invalidate` is called. Defaults to `0`.
+        chol_cache (tuple): a tuple that contains the **version** and the lower Cholesky factor of the correlation matrix computed 
+            at that version. It is not saved with the kernel. Defaults to `None`.
+        opt_state (dict): a dictionary that holds the state of the warm-started optimiser (see :meth:`.warm_optim`) kept across SEM iterations: 
+            the number of parameters, the inverse Hessian approximation, the recent numbers of function evaluations, the current evaluation budget, the total number of
+            used evaluations and the total of the default ``maxfun`` caps of the calls. Defaults to `None`.
+        precision (str): either `double` or `single`. If `single`, the input data gathered for the Vecchia conditioning blocks and the 
+            correlations in the blocks are computed in float32, while the Cholesky factorisations and likelihood accumulations stay in float64. 
+            Defaults to `double`.
+        stats_version (int): the **version** at which **Rinv**, **Rinv_y** and **R2sexp** were last computed. Defaults to `None`.
+        inducing (bool): indicates whether the inducing-point (FITC) approximation is used. Defaults to `False`.
+        r (int): the number of inducing points for the FITC approximation. Defaults to `None`.
+        ind_idx (ndarray): a 1d-array that gives the indices of the rows of **input** (and **global_input**) used as inducing points. 
+            Defaults to `None`.
+        fitc_cache (tuple): a tuple that contains the **version** and the factors of the FITC approximation (see :meth:`.fitc`) computed 
+            at that version. It is not saved with the kernel. Defaults to `None`.
+        grid (list): a list of numpy 1d-arrays that give the sorted values of each input dimension (of **input** followed by **global_input**) 
+            if the input forms a full grid and the Kronecker-structured GP is used. Otherwise, it is `None`. Defaults to `None`.
+        grid_ord (ndarray): a 1d-array that orders the rows of the input into the (row-major) grid order. Defaults to `None`.
+        kron_cache (tuple): a tuple that contains the **version** and the per-dimension eigendecompositions (see :meth:`.kron_eig`) computed 
+            at that version. It is not saved with the kernel. Defaults to `None`.
+        nn_cache (tuple): a tuple that contains the **version** and a dictionary of the neighbour indices (see :meth:`.pred_nn`) over the 
+            scaled training input built at that version, keyed by the number of input columns. Defaults to `None`.
+        vecch_cache (tuple): a tuple that contains the **version** and the Vecchia factor (see :meth:`.vecch_factor`) computed at that version 
+            under the current ordering. It is not saved with the kernel. Defaults to `None`.
+        input_version (int): a counter that is increased whenever **input** or **global_input** is re-assigned, or the cached factors are 
+            invalidated explicitly after an in-place modification of them (see :meth:`.invalidate`). Defaults to `0`.
+        ord_cache (tuple): a tuple that contains the **input_version**, the ordering **ord**, the **precision** and the input (followed by the 
+            global input) in that ordering cast to that precision (see :meth:`.ordered_input`). It is not saved with the kernel. Defaults to `None`.
     """
 
     def __init__(self, length, scale=1., nugget=1e-6, name='sexp', prior_name='ga', prior_coef=None, bds=None, nugget_est=False, scale_est=False, input_dim=None, connect=None):
+        self.version=0
+        self.input_version=0
+        self.ord_cache=None
+        self.chol_cache=None
         self.type='gp'
         self.length=length
         self.scale=np.atleast_1d(scale)
@@ -111,7 +158,7 @@ class kernel:
         self.scale_est=scale_est
         self.input_dim=input_dim
         self.connect=connect
-        self.para_path=None
+        self.para_trace=None
         self.global_input=None
         self.input=None
         self.output=None
@@ -120,7 +167,6 @@ class kernel:
         self.Rinv=None
         self.Rinv_y=None
         self.R2sexp=None
-        self.Psexp=None
         self.vecch=None
         self.D=None
         self.ord=None
@@ -128,18 +174,30 @@ class kernel:
         self.m=None
         self.pred_m=None
         self.NNarray=None
+        self.NN_levels=None
         self.imp_NNarray=None
         #self.pointer_row=None
         #self.pointer_col=None
-        self.imp_pointer_row=None
-        self.imp_pointer_col=None
+        self.imp_pattern=None
         self.nn_method='exact'
         self.ord_fun=None
         self.iter_count=0
         self.target='dgp'
         self.bds=bds
-        self.R2=None
+        self.R2_trace=None
         self.loo_state=False
+        self.opt_state=None
+        self.precision='double'
+        self.stats_version=None
+        self.inducing=False
+        self.r=None
+        self.ind_idx=None
+        self.fitc_cache=None
+        self.grid=None
+        self.grid_ord=None
+        self.kron_cache=None
+        self.nn_cache=None
+        self.vecch_cache=None
 
     def __setstate__(self, state):
         if 'g' in state:
@@ -170,12 +228,15 @@ class kernel:
             state['pred_m'] = None
         if 'NNarray' not in state:
             state['NNarray'] = None
+        if 'NN_levels' not in state:
+            state['NN_levels'] = None if state['NNarray'] is None else nn_levels(state['NNarray'])
         if 'imp_NNarray' not in state:
             state['imp_NNarray'] = None
-        if 'imp_pointer_row' not in state:
-            state['imp_pointer_row'] = None
-        if 'imp_pointer_col' not in state:
-            state['imp_pointer_col'] = None
+        if 'imp_pattern' not in state:
+            state['imp_pattern'] = None if state.get('imp_pointer_row') is None else imp_pattern(state['imp_NNarray'])
+        state.pop('imp_pointer_row', None)
+        state.pop('imp_pointer_col', None)
+        state.pop('Psexp', None)
         if 'nn_method' not in state:
             state['nn_method'] = 'exact'
         if 'ord_fun' not in state:
@@ -185,15 +246,276 @@ class kernel:
         if 'target' not in state:
             state['target'] = 'dgp'
         new_R2_added = False
-        if 'R2' not in state:
+        if 'R2' not in state and 'R2_trace' not in state:
             state['R2'] = None
             new_R2_added = True
+        for key in ['para_path', 'R2']:
+            if key in state:
+                value = state.pop(key)
+                state[key.split('_')[0]+'_trace'] = None if value is None else trace(value)
         if 'loo_state' not in state:
             state['loo_state'] = False
+        for key in ['input', 'global_input', 'length', 'nugget']:
+            if key in state:
+                state['_'+key] = state.pop(key)
+        if 'version' not in state:
+            state['version'] = 0
+        if 'opt_state' not in state:
+            state['opt_state'] = None
+        if 'precision' not in state:
+            state['precision'] = 'double'
+        if 'stats_version' not in state:
+            state['stats_version'] = None
+        if 'inducing' not in state:
+            state['inducing'] = False
+        if 'r' not in state:
+            state['r'] = None
+        if 'ind_idx' not in state:
+            state['ind_idx'] = None
+        if 'grid' not in state:
+            state['grid'] = None
+        if 'grid_ord' not in state:
+            state['grid_ord'] = None
+        if 'nn_cache' not in state:
+            state['nn_cache'] = None
+        if 'vecch_cache' not in state:
+            state['vecch_cache'] = None
+        if 'input_version' not in state:
+            state['input_version'] = 0
+        state['ord_cache'] = None
+        state['chol_cache'] = None
+        state['fitc_cache'] = None
+        state['kron_cache'] = None
         self.__dict__.update(state)
         if new_R2_added:
             self.r2(overwritten=True)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['chol_cache'] = None
+        state['fitc_cache'] = None
+        state['kron_cache'] = None
+        state['vecch_cache'] = None
+        state['ord_cache'] = None
+        return state
+
+    @property
+    def para_path(self):
+        return None if self.para_trace is None else self.para_trace.values()
+
+    @para_path.setter
+    def para_path(self, value):
+        if value is None:
+            self.para_trace = None
+        elif self.para_trace is not None and self.para_trace.path is not None:
+            self.para_trace.reset(value)
+        else:
+            self.para_trace = trace(value)
+
+    @property
+    def R2(self):
+        return None if self.R2_trace is None else self.R2_trace.values()
+
+    @R2.setter
+    def R2(self, value):
+        if value is None:
+            self.R2_trace = None
+        elif self.R2_trace is not None and self.R2_trace.path is not None:
+            self.R2_trace.reset(value)
+        else:
+            self.R2_trace = trace(value)
+
+    @property
+    def input(self):
+        return self._input
+
+    @input.setter
+    def input(self, value):
+        self._input = value
+        self.invalidate()
+
+    @property
+    def global_input(self):
+        return self._global_input
+
+    @global_input.setter
+    def global_input(self, value):
+        self._global_input = value
+        self.invalidate()
+
+    @property
+    def length(self):
+        return self._length
+
+    @length.setter
+    def length(self, value):
+        self._length = value
+        self.invalidate(input=False)
+
+    @property
+    def nugget(self):
+        return self._nugget
+
+    @nugget.setter
+    def nugget(self, value):
+        self._nugget = value
+        self.invalidate(input=False)
+
+    def invalidate(self, input=True):
+        """Mark the correlation matrix of the GP as changed so that the cached Cholesky (FITC, Kronecker or Vecchia) factors and neighbour indices are recomputed on their next use. 
+        This is done automatically when **input**, **global_input**, **length** or **nugget** is re-assigned, but must be called 
+        explicitly after **input** or **global_input** is modified in place.
+
+        Args:
+            input (bool, optional): whether the input data may have changed, in which case the cached ordered input (see :meth:`.ordered_input`) 
+                is also recomputed. Defaults to `True`.
+        """
+        self.version+=1
+        if input:
+            self.input_version+=1
+        self.chol_cache=None
+        self.fitc_cache=None
+        self.kron_cache=None
+        self.nn_cache=None
+        self.vecch_cache=None
+
+    def pred_nn(self, x, w):
+        """Find the nearest neighbours of the testing positions among the training positions for the Vecchia predictions. The neighbour 
+        index over the scaled training positions is built on its first use and reused until the input or the lengthscales change.
+
+        Args:
+            x (ndarray): a numpy 2d-array of the testing positions.
+            w (ndarray): a numpy 2d-array of the training positions (with the same number of columns as **x**).
+
+        Returns:
+            ndarray: a numpy 2d-array that contains the indices of the **pred_m** nearest training positions of each testing position.
+        """
+        if self.nn_cache is None or self.nn_cache[0]!=self.version:
+            self.nn_cache=(self.version, {})
+        D=np.shape(w)[1]
+        if D not in self.nn_cache[1]:
+            self.nn_cache[1][D]=pred_nn_index(w/self.length, method = self.nn_method)
+        return self.nn_cache[1][D].query(x/self.length, self.pred_m)
+
+    def chol(self):
+        """Compute the lower Cholesky factor of the correlation matrix, reusing the cached factor if neither the input nor 
+        the lengthscales and nugget have changed since it was computed.
+
+        Returns:
+            ndarray: a numpy 2d-array giving the lower Cholesky factor of the correlation matrix.
+        """
+        if self.chol_cache is None or self.chol_cache[0]!=self.version:
+            L=cholesky(self.k_matrix(),lower=True,check_finite=False)
+            self.chol_cache=(self.version, L)
+        return self.chol_cache[1]
+
+    def vecch_factor(self):
+        """Compute the Vecchia factor of the inverse correlation matrix under the current ordering, reusing the cached factor if neither 
+        the input nor the lengthscales and nugget have changed since it was computed.
+
+        Returns:
+            ndarray: a numpy 2d-array giving the rows of the Vecchia factor (see :func:`.L_matrix`).
+        """
+        if self.vecch_cache is None or self.vecch_cache[0]!=self.version:
+            L=L_matrix(self.ordered_input(), self.NNarray, self.length, self.nugget[0], self.name)
+            self.vecch_cache=(self.version, L)
+        return self.vecch_cache[1]
+
+    def fitc(self):
+        """Compute the factors of the FITC approximation ``Q+diag(lam)`` to the correlation matrix, where ``Q=V^T V`` is the Nystrom approximation 
+        through the inducing points given by **ind_idx**. The factors are cached and reused if neither the input nor the lengthscales and 
+        nugget have changed since they were computed.
+
+        Returns:
+            tuple: a tuple of four numpy arrays: the *r* x *n* cross-correlation matrix Kuf between the inducing points and the input, the lower 
+            Cholesky factor Lu of the correlation matrix of the inducing points, ``V=Lu^{-1}Kuf``, and the 1d-array lam of the diagonal correction.
+        """
+        if self.fitc_cache is None or self.fitc_cache[0]!=self.version:
+            n=len(self.input)
+            if self.ind_idx is None or len(self.ind_idx)!=min(self.r,n) or np.max(self.ind_idx)>=n:
+                self.inducing_set()
+            if self.global_input is not None:
+                X=np.concatenate((self.input, self.global_input),1)
+            else:
+                X=self.input
+            Z=X[self.ind_idx]
+            Kuu=self.k_cross(Z,Z)
+            np.fill_diagonal(Kuu, 1+1e-6)
+            Lu=cholesky(Kuu,lower=True,check_finite=False)
+            Kuf=self.k_cross(Z,X)
+            V=solve_triangular(Lu, Kuf, lower=True, check_finite=False)
+            lam=np.maximum(1-np.sum(V**2,axis=0),0)+self.nugget[0]
+            self.fitc_cache=(self.version, (Kuf, Lu, V, lam))
+        return self.fitc_cache[1]
+
+    def fitc_solve(self):
+        """Compute the quantities of the FITC approximation shared by the likelihood, its gradient and the prediction statistics, 
+        in O(n r^2) by the Woodbury identity.
+
+        Returns:
+            tuple: a tuple of four elements: the lower Cholesky factor La of ``I+V diag(1/lam) V^T``, ``M=La^{-1}V diag(1/lam)`` so that 
+            the inverse of the approximated correlation matrix is ``diag(1/lam)-M^T M``, the product of that inverse and **output** as a 
+            1d-array, and the log-determinant of the approximated correlation matrix.
+        """
+        _, _, V, lam=self.fitc()
+        y=self.output.flatten()
+        V_lam=V/lam
+        La=cholesky(np.eye(len(V))+V_lam@V.T,lower=True,check_finite=False)
+        M=solve_triangular(La, V_lam, lower=True, check_finite=False)
+        alpha=y/lam-M.T@(M@y)
+        logdet=logdet_nb(La)+np.sum(np.log(lam))
+        return La, M, alpha, logdet
+
+    def grid_set(self):
+        """Check whether the input (including the global input) forms a full grid, i.e., the Cartesian product of the distinct values of 
+        each input dimension. If so, set **grid** and **grid_ord** so that the Kronecker-structured GP is used. Otherwise, set **grid** to `None`.
+
+        Returns:
+            bool: whether the input forms a grid.
+        """
+        if self.global_input is not None:
+            X=np.concatenate((self.input, self.global_input),1)
+        else:
+            X=self.input
+        n, D=X.shape
+        self.grid, self.grid_ord, self.kron_cache=None, None, None
+        if D<2:
+            return False
+        axes=[np.unique(X[:,d]) for d in range(D)]
+        shape=[len(axis) for axis in axes]
+        if np.prod(shape)!=n or max(shape)==n:
+            return False
+        idx=np.ravel_multi_index([np.searchsorted(axes[d], X[:,d]) for d in range(D)], shape)
+        if len(np.unique(idx))!=n:
+            return False
+        self.grid, self.grid_ord=axes, np.argsort(idx)
+        return True
+
+    def kron_eig(self):
+        """Compute the eigendecompositions of the per-dimension correlation matrices of a GP whose input forms a grid (see :meth:`.grid_set`). 
+        The correlation matrix (without nugget) is the Kronecker product of the per-dimension matrices. The decompositions are cached and reused 
+        if the lengthscales have not changed since they were computed.
+
+        Returns:
+            tuple: a tuple of four elements: the list of per-dimension correlation matrices, the list of their eigenvectors, the list of their 
+            eigenvalues, and the 1d-array of the eigenvalues of the Kronecker product (in grid order).
+        """
+        if self.kron_cache is None or self.kron_cache[0]!=self.version:
+            D=len(self.grid)
+            length=np.full(D, self.length[0]) if len(self.length)==1 else self.length
+            Ks, Qs, lams=[], [], []
+            for d in range(D):
+                K=k_one_vec(self.grid[d][:,None], self.grid[d][:,None], length[[d]], self.name)
+                lam, Q=np.linalg.eigh(K)
+                Ks.append(K)
+                Qs.append(Q)
+                lams.append(np.maximum(lam,0))
+            lam=lams[0]
+            for d in range(1,D):
+                lam=np.kron(lam,lams[d])
+            self.kron_cache=(self.version, (Ks, Qs, lams, lam))
+        return self.kron_cache[1]
+
     def compute_cl(self):
         if len(self.length)==1:
             if self.global_input is not None:
@@ -226,7 +548,7 @@ class kernel:
             if overwritten:
                 self.R2 = rsq
             else:
-                self.R2 = np.vstack((self.R2,rsq))
+                self.R2_trace.append(rsq)
 
     def ord_nn(self, ord = None, NNarray = None, pointer=False):
         """Specify the ordering and NN for the Vecchia approximation
@@ -239,7 +561,14 @@ class kernel:
                     X = np.concatenate((self.input, self.global_input),1)/self.length
                 else:
                     X = self.input/self.length
-                self.ord = self.ord_fun(X)
+                if self.ord_fun=='maxmin':
+                    self.ord = maxmin_ord(X, exact = True, method = self.nn_method)
+                elif self.ord_fun=='approx_maxmin':
+                    self.ord = maxmin_ord(X, exact = False, method = self.nn_method)
+                elif callable(self.ord_fun):
+                    self.ord = self.ord_fun(X)
+                else:
+                    raise Exception('ord_fun can only be a function, maxmin or approx_maxmin.')
         else:
             self.ord = ord
         self.rev_ord = np.argsort(self.ord)
@@ -251,15 +580,66 @@ class kernel:
             self.NNarray = nn(X[self.ord], self.m, method = self.nn_method)
         else:
             self.NNarray = NNarray
+        self.NN_levels = nn_levels(self.NNarray)
+        self.vecch_cache = None
         if pointer:
             NNs = get_pred_nn(X[self.ord], X[self.ord], self.m)[:,1::]
             n = X.shape[0]
             prev = NNs < np.tile(np.arange(n), (self.m-1, 1)).T
             NNs[prev] = NNs[prev] + n
             self.imp_NNarray = np.hstack((np.arange(n).reshape(-1,1) + n, np.arange(n).reshape(-1,1), NNs))
-            self.imp_pointer_row, self.imp_pointer_col = imp_pointers(self.imp_NNarray)
+            self.imp_pattern = imp_pattern(self.imp_NNarray)
             #self.pointer_row, self.pointer_col = pointers(self.NNarray)
 
+    def inducing_set(self):
+        """Select the inducing points for the FITC approximation as **r** rows of the (lengthscale-scaled) input by a farthest-point 
+        traversal from a random starting row.
+        """
+        if self.global_input is not None:
+            X = np.concatenate((self.input, self.global_input),1)/self.length
+        else:
+            X = self.input/self.length
+        n = X.shape[0]
+        r = min(self.r, n)
+        idx = np.empty(r, dtype=np.int64)
+        idx[0] = np.random.randint(n)
+        dists = np.sum((X-X[idx[0]])**2, axis=1)
+        for i in range(1, r):
+            idx[i] = np.argmax(dists)
+            dists = np.minimum(dists, np.sum((X-X[idx[i]])**2, axis=1))
+        self.ind_idx = idx
+        self.invalidate(input=False)
+
+    def cast(self, X):
+        """Cast input data to the precision (set by **precision**) used to build the Vecchia conditioning blocks.
+
+        Args:
+            X (ndarray): a numpy 2d-array of input data.
+
+        Returns:
+            ndarray: **X** in float32 if **precision** = `single`, and **X** itself otherwise.
+        """
+        if self.precision=='single':
+            return X.astype(np.float32)
+        else:
+            return X
+
+    def ordered_input(self):
+        """Gather the input (followed by the global input) in the Vecchia ordering **ord** and cast it by :meth:`.cast`, reusing the cached 
+        array if neither the input, the ordering nor the precision has changed since it was built, so that the likelihood evaluations 
+        during the optimisation do not copy the input.
+
+        Returns:
+            ndarray: a numpy 2d-array of the ordered (and cast) input.
+        """
+        if self.ord_cache is None or self.ord_cache[0]!=self.input_version or self.ord_cache[1] is not self.ord or self.ord_cache[2]!=self.precision:
+            if self.global_input is not None:
+                X=np.concatenate((self.input, self.global_input),1)
+            else:
+                X=self.input
+            self.ord_cache=(self.input_version, self.ord, self.precision, self.cast(X[self.ord]))
+        return self.ord_cache[3]
+
     def log_t(self):
         """Log transform the model parameters (lengthscales and nugget).
 
@@ -336,6 +716,33 @@ class kernel:
         else:
             return K
         
+    def k_fod_sum(self,K,W):
+        """Compute the sums of elementwise products between a symmetric matrix and the first order derivatives of the correlation matrix 
+           wrt log-transformed lengthscales and nugget. The derivative matrices are accumulated one input dimension at a time and never stored.
+
+        Args:
+            K (ndarray): a numpy 2d-array giving the correlation matrix.
+            W (ndarray): a numpy 2d-array (with the same shape as **K**) to be multiplied elementwise with the derivative matrices.
+
+        Returns:
+            ndarray: a numpy 1d-array whose length equals to the total number of lengthscales and nugget.
+        """
+        if self.global_input is not None:
+            X=np.concatenate((self.input, self.global_input),1)
+        else:
+            X=self.input
+        X_l=X/self.length
+        KW=K*W
+        if self.name=='sexp':
+            fod=fod_exp_sum(X_l,KW)
+        elif self.name=='matern2.5':
+            fod=fod_matern_sum(X_l,KW)
+        if len(self.length)==1:
+            fod=np.array([np.sum(fod)])
+        if self.nugget_est:
+            fod=np.concatenate((fod,[self.nugget[0]*np.trace(W)]))
+        return fod
+
     def gfod(self, x):
         if self.prior_name=='ga':
             return self.prior_coef[0]-self.prior_coef[1]*x
@@ -391,25 +798,20 @@ class kernel:
         """
         self.update(x)
         n=len(self.output)
-        K,Kt=self.k_matrix(fod_eval=True)
+        K=self.k_matrix()
         L=cholesky(K,lower=True,check_finite=False)
-        KinvKt=np.array([cho_solve((L, True), Kt_i, check_finite=False) for Kt_i in Kt])
-        #tr_KinvKt=np.trace(KinvKt, axis1=1, axis2=2)
-        #logdet=2*np.sum(np.log(np.abs(np.diag(L))))
-        tr_KinvKt=trace_nb(KinvKt)
+        self.chol_cache=(self.version, L)
+        Kinv=cho_solve((L, True), np.eye(n), check_finite=False)
         logdet=logdet_nb(L)
         KinvY=cho_solve((L, True), self.output, check_finite=False)
-        YKinvKtKinvY=((self.output).T@KinvKt@KinvY).flatten()
         YKinvY=(self.output).T@KinvY
-        P1=-0.5*tr_KinvKt
-        P2=0.5*YKinvKtKinvY
         if self.scale_est:
             self.scale=(YKinvY/n).flatten()
             neg_llik=0.5*(logdet+n*np.log(self.scale))
-            neg_St=-P1-P2/self.scale
         else:
             neg_llik=0.5*(logdet+YKinvY/self.scale) 
-            neg_St=-P1-P2/self.scale
+        W=Kinv-(KinvY@KinvY.T)/self.scale
+        neg_St=0.5*self.k_fod_sum(K,W)
         neg_llik=neg_llik.flatten()
         if self.prior_name is not None:
             neg_llik=neg_llik-self.log_prior()
@@ -428,23 +830,124 @@ class kernel:
             contains first order derivatives of the negative log-likelihood function wrt log-transformed lengthscales and nugget.
         """
         self.update(x)
-        if self.connect is not None:
-            X = np.concatenate((self.input,self.global_input),1)
+        neg_llik, neg_St, self.scale = vecchia_nllik(self.ordered_input(), self.output[self.ord], self.NNarray, self.scale[0], self.length, self.nugget[0], self.name, self.scale_est, self.nugget_est)
+        if self.prior_name is not None:
+            neg_llik=neg_llik-self.log_prior()
+            neg_St=neg_St-self.log_prior_fod()
+        return neg_llik, neg_St
+
+    def llik_inducing(self,x):
+        """Compute the negative log-likelihood function of the GP under the FITC approximation and its first order derivatives.
+
+        Args:
+            x (ndarray): a numpy 1d-array that contains the values of log-transformed model parameters: 
+                log-transformed lengthscales followed by the log-transformed nugget. 
+
+        Returns:
+            tuple: a tuple is returned. The tuple contains two numpy 1d-arrays. The first one gives the negative log-likelihood. The second one (whose length equal to the total number of lengthscales and nugget)
+            contains first order derivatives of the negative log-likelihood function wrt log-transformed lengthscales and nugget.
+        """
+        self.update(x)
+        n=len(self.output)
+        Kuf, Lu, V, lam=self.fitc()
+        _, M, alpha, logdet=self.fitc_solve()
+        YKinvY=self.output.flatten()@alpha
+        if self.scale_est:
+            self.scale=np.atleast_1d(YKinvY/n)
+            neg_llik=0.5*(logdet+n*np.log(self.scale))
+        else:
+            neg_llik=0.5*(logdet+YKinvY/self.scale)
+        B=solve_triangular(Lu.T, V, lower=False, check_finite=False)
+        w=1/lam-np.sum(M**2,axis=0)-alpha**2/self.scale
+        G=B.T/lam[:,None]-M.T@(M@B.T)-np.outer(alpha,B@alpha)/self.scale-w[:,None]*B.T
+        if self.global_input is not None:
+            X=np.concatenate((self.input, self.global_input),1)
         else:
-            X = self.input
-        neg_llik, neg_St, self.scale = vecchia_nllik(X[self.ord], self.output[self.ord], self.NNarray, self.scale[0], self.length, self.nugget[0], self.name, self.scale_est, self.nugget_est)
+            X=self.input
+        X_l=X/self.length
+        Z_l=X_l[self.ind_idx]
+        KGu=self.k_cross(X[self.ind_idx],X[self.ind_idx])*(B@G)
+        if self.name=='sexp':
+            fod=2*fod_exp_cross_sum(X_l,Z_l,Kuf.T*G)-fod_exp_cross_sum(Z_l,Z_l,KGu)
+        elif self.name=='matern2.5':
+            fod=2*fod_matern_cross_sum(X_l,Z_l,Kuf.T*G)-fod_matern_cross_sum(Z_l,Z_l,KGu)
+        if len(self.length)==1:
+            fod=np.array([np.sum(fod)])
+        if self.nugget_est:
+            fod=np.concatenate((fod,[self.nugget[0]*np.sum(w)]))
+        neg_St=0.5*fod
         if self.prior_name is not None:
             neg_llik=neg_llik-self.log_prior()
             neg_St=neg_St-self.log_prior_fod()
         return neg_llik, neg_St
 
+    def llik_kron(self,x):
+        """Compute the negative log-likelihood function of the GP whose input forms a grid and its first order derivatives, 
+        through the per-dimension eigendecompositions (see :meth:`.kron_eig`).
+
+        Args:
+            x (ndarray): a numpy 1d-array that contains the values of log-transformed model parameters: 
+                log-transformed lengthscales followed by the log-transformed nugget. 
+
+        Returns:
+            tuple: a tuple is returned. The tuple contains two numpy 1d-arrays. The first one gives the negative log-likelihood. The second one (whose length equal to the total number of lengthscales and nugget)
+            contains first order derivatives of the negative log-likelihood function wrt log-transformed lengthscales and nugget.
+        """
+        self.update(x)
+        n=len(self.output)
+        Ks, Qs, lams, lam=self.kron_eig()
+        e=lam+self.nugget[0]
+        y=self.output[self.grid_ord].flatten()
+        y_t=kron_mv([Q.T for Q in Qs], y)
+        alpha=kron_mv(Qs, y_t/e)
+        YKinvY=y_t@(y_t/e)
+        logdet=np.sum(np.log(e))
+        if self.scale_est:
+            self.scale=np.atleast_1d(YKinvY/n)
+            neg_llik=0.5*(logdet+n*np.log(self.scale))
+        else:
+            neg_llik=0.5*(logdet+YKinvY/self.scale)
+        D=len(self.grid)
+        length=np.full(D, self.length[0]) if len(self.length)==1 else self.length
+        fod=np.zeros(D)
+        for d in range(D):
+            dis=np.abs(self.grid[d][:,None]-self.grid[d][None,:])/length[d]
+            if self.name=='sexp':
+                dK=2*dis**2*Ks[d]
+            elif self.name=='matern2.5':
+                dK=(5/3)*(dis**2)*(1+np.sqrt(5)*dis)/(1+np.sqrt(5)*dis+5/3*dis**2)*Ks[d]
+            diag=[lams[j][None,:] for j in range(D)]
+            diag[d]=np.sum(Qs[d]*(dK@Qs[d]),axis=0)[None,:]
+            mats=Ks.copy()
+            mats[d]=dK
+            fod[d]=kron_contract(1/e, diag)[0]-alpha@kron_mv(mats, alpha)/self.scale[0]
+        if len(self.length)==1:
+            fod=np.array([np.sum(fod)])
+        if self.nugget_est:
+            fod=np.concatenate((fod,[self.nugget[0]*(np.sum(1/e)-alpha@alpha/self.scale[0])]))
+        neg_St=0.5*fod
+        if self.prior_name is not None:
+            neg_llik=neg_llik-self.log_prior()
+            neg_St=neg_St-self.log_prior_fod()
+        return neg_llik, neg_St
+
+    def kron_sample(self):
+        """Draw a realisation from the zero-mean GP whose input forms a grid.
+
+        Returns:
+            ndarray: a numpy 1d-array of the realisation at the input positions.
+        """
+        _, Qs, _, lam=self.kron_eig()
+        f=np.empty(len(lam))
+        f[self.grid_ord]=np.sqrt(self.scale)*kron_mv(Qs, np.sqrt(lam+self.nugget[0])*np.random.standard_normal(len(lam)))
+        return f
+
     def log_likelihood_func(self):
-        cov=self.scale*self.k_matrix()
-        L=cholesky(cov, lower=True, check_finite=False)
+        L=self.chol()
         #L=np.linalg.cholesky(cov)
         #logdet=2*np.sum(np.log(np.abs(np.diag(L))))
-        logdet=logdet_nb(L)
-        quad=(self.output).T@cho_solve((L, True), self.output, check_finite=False)
+        logdet=logdet_nb(L)+len(L)*np.log(self.scale)
+        quad=(self.output).T@cho_solve((L, True), self.output, check_finite=False)/self.scale
         llik=-0.5*(logdet+quad)
         if self.prior_name=='ref':
             self.compute_cl()
@@ -454,93 +957,286 @@ class kernel:
     def log_likelihood_func_vecch(self):
         """Compute Gaussian log-likelihood function using the Vecchia approximation.
         """
-        if self.connect is not None:
-            X=np.concatenate((self.input,self.global_input),1)
-        else:
-            X=self.input
-        llik = vecchia_llik(X[self.ord], self.output[self.ord], self.NNarray, self.scale[0], self.length, self.nugget[0], self.name)
+        llik = vecchia_llik(self.ordered_input(), self.output[self.ord], self.NNarray, self.scale[0], self.length, self.nugget[0], self.name)
         if self.prior_name=='ref':
             self.compute_cl()
             llik+=self.log_prior()
         return llik
     
+    def log_likelihood_func_inducing(self):
+        """Compute Gaussian log-likelihood function using the FITC approximation.
+        """
+        _, _, alpha, logdet=self.fitc_solve()
+        n=len(self.output)
+        llik=-0.5*(logdet+n*np.log(self.scale)+self.output.flatten()@alpha/self.scale)
+        if self.prior_name=='ref':
+            self.compute_cl()
+            llik+=self.log_prior()
+        return llik
+
+    def vecch_sample(self, N=1):
+        """Draw independent realisations from the zero-mean GP with the Vecchia approximated covariance.
+
+        Args:
+            N (int): the number of realisations. Defaults to `1`.
+
+        Returns:
+            ndarray: a numpy 2d-array whose **N** columns are the realisations at the input positions.
+        """
+        L=self.vecch_factor()
+        lvl_ptr, lvl_rows=self.NN_levels
+        sn=np.random.standard_normal((len(L), N))
+        f=np.empty((len(L), N))
+        if use_levels(lvl_ptr):
+            f[self.ord]=np.sqrt(self.scale)*forward_solve_sp_lv(L, self.NNarray, sn, lvl_ptr, lvl_rows)
+        else:
+            for i in range(N):
+                f[self.ord,i]=np.sqrt(self.scale)*forward_solve_sp(L, self.NNarray, sn[:,i])
+        return f
+
+    def fitc_sample(self):
+        """Draw a realisation from the zero-mean GP with the FITC approximated covariance.
+
+        Returns:
+            ndarray: a numpy 1d-array of the realisation at the input positions.
+        """
+        _, _, V, lam=self.fitc()
+        return np.sqrt(self.scale)*(V.T@np.random.standard_normal(len(V))+np.sqrt(lam)*np.random.standard_normal(len(lam)))
+
     def callback(self, xk):
         self.iter_count += 1
         if self.iter_count & (self.iter_count-1) == 0:
             self.ord_nn()
 
-    def maximise(self, method='L-BFGS-B'):
-        """Optimise and update model parameters by minimising the negative log-likelihood function.
+    def opt_bounds(self):
+        """Compute the bounds of the log-transformed lengthscales and nugget used in the optimisation.
 
-        Args:
-            method (str, optional): optimisation algorithm. Defaults to `L-BFGS-B`.
+        Returns:
+            Bounds: a scipy `Bounds` object, or `None` if the optimisation is unconstrained.
         """
-        initial_theta_trans=self.log_t()
+        n_para=len(self.length)+1 if self.nugget_est else len(self.length)
         if self.nugget_est:
             if self.bds is None:
-                lb=np.concatenate((-np.inf*np.ones(len(initial_theta_trans)-1),np.log([1e-8])))
+                lb=np.concatenate((-np.inf*np.ones(n_para-1),np.log([1e-8])))
                 if self.prior_name=='ref':
-                    ub=np.concatenate((13.*np.ones(len(initial_theta_trans)-1), [np.inf]))
+                    ub=np.concatenate((13.*np.ones(n_para-1), [np.inf]))
                 else:
-                    ub=np.inf*np.ones(len(initial_theta_trans))
+                    ub=np.inf*np.ones(n_para)
             else:
                 with np.errstate(divide='ignore'):
-                    lb=np.concatenate((np.log(self.bds[0])*np.ones(len(initial_theta_trans)-1),np.log([1e-8])))
-                ub=np.concatenate((np.log(self.bds[1])*np.ones(len(initial_theta_trans)-1),[np.inf]))
-            bd=Bounds(lb, ub)
-            if self.vecch:
-                if self.target=='gp' and len(self.length)!=1:
-                    _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, bounds=bd, callback=self.callback, options={'maxfun': np.max((50,20+5*self.D))})
-                    self.iter_count = 0
-                else:
-                    _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
-            else:
-                _ = minimize(self.llik, initial_theta_trans, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+                    lb=np.concatenate((np.log(self.bds[0])*np.ones(n_para-1),np.log([1e-8])))
+                ub=np.concatenate((np.log(self.bds[1])*np.ones(n_para-1),[np.inf]))
         else:
             if self.bds is None:
                 if self.prior_name=='ref':
-                    lb=-np.inf*np.ones(len(initial_theta_trans))
-                    ub=13.*np.ones(len(initial_theta_trans))
-                    bd=Bounds(lb, ub)
-                    if self.vecch:
-                        if self.target=='gp' and len(self.length)!=1:
-                            _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, bounds=bd, callback=self.callback, options={'maxfun': np.max((50,20+5*self.D))})
-                            self.iter_count = 0
-                        else:
-                            _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
-                    else:
-                        _ = minimize(self.llik, initial_theta_trans, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+                    lb=-np.inf*np.ones(n_para)
+                    ub=13.*np.ones(n_para)
                 else:
-                    if self.vecch:
-                        if self.target=='gp' and len(self.length)!=1:
-                            _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, callback=self.callback, options={'maxfun': np.max((50,20+5*self.D))})
-                            self.iter_count = 0                       
-                        else:
-                            _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
-                    else:
-                        _ = minimize(self.llik, initial_theta_trans, method=method, jac=True, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+                    return None
             else:
                 with np.errstate(divide='ignore'):
-                    lb=np.log(self.bds[0])*np.ones(len(initial_theta_trans))
-                ub=np.log(self.bds[1])*np.ones(len(initial_theta_trans))
-                bd=Bounds(lb, ub)
-                if self.vecch:
-                    if self.target=='gp' and len(self.length)!=1:
-                        _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, bounds=bd, callback=self.callback, options={'maxfun': np.max((50,20+5*self.D))})
-                        self.iter_count = 0
-                    else:
-                        _ = minimize(self.llik_vecch, initial_theta_trans, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
-                else:
-                    _ = minimize(self.llik, initial_theta_trans, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+                    lb=np.log(self.bds[0])*np.ones(n_para)
+                ub=np.log(self.bds[1])*np.ones(n_para)
+        return Bounds(lb, ub)
+
+    def optim(self, x0, bd=None, method='L-BFGS-B'):
+        """Minimise the negative log-likelihood function from a given starting point.
+
+        Args:
+            x0 (ndarray): a numpy 1d-array of the starting log-transformed lengthscales and nugget.
+            bd (Bounds, optional): the bounds of the log-transformed lengthscales and nugget. Defaults to `None`.
+            method (str, optional): optimisation algorithm. Defaults to `L-BFGS-B`.
+
+        Returns:
+            OptimizeResult: the optimisation result returned by `scipy.optimize.minimize`.
+        """
+        if self.vecch:
+            if self.target=='gp' and len(self.length)!=1:
+                res = minimize(self.llik_vecch, x0, method=method, jac=True, bounds=bd, callback=self.callback, options={'maxfun': np.max((50,20+5*self.D))})
+                self.iter_count = 0
+            else:
+                res = minimize(self.llik_vecch, x0, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+        elif self.inducing:
+            res = minimize(self.llik_inducing, x0, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+        elif self.grid is not None:
+            res = minimize(self.llik_kron, x0, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+        else:
+            res = minimize(self.llik, x0, method=method, jac=True, bounds=bd, options={'maxiter': 100, 'maxfun': np.max((30,20+5*self.D))})
+        return res
+
+    def warm_optim(self, x0, bd=None):
+        """Minimise the negative log-likelihood function by a projected BFGS whose inverse Hessian approximation and evaluation
+           budget are kept in **opt_state** across calls, so that consecutive SEM iterations reuse the curvature information.
+
+        Args:
+            x0 (ndarray): a numpy 1d-array of the starting log-transformed lengthscales and nugget.
+            bd (Bounds, optional): the bounds of the log-transformed lengthscales and nugget. Defaults to `None`.
+
+        Returns:
+            int: the number of function evaluations used.
+        """
+        if self.vecch:
+            fun=self.llik_vecch
+        elif self.inducing:
+            fun=self.llik_inducing
+        elif self.grid is not None:
+            fun=self.llik_kron
+        else:
+            fun=self.llik
+        n_para, maxfun_default=len(x0), int(np.max((30,20+5*self.D)))
+        if self.opt_state is None or self.opt_state.get('n_para')!=n_para:
+            self.opt_state={'n_para':n_para, 'H':None, 'nfev':[], 'maxfun':maxfun_default, 'n_eval':0, 'n_budget':0}
+        state=self.opt_state
+        H, maxfun=state['H'], state['maxfun']
+        if bd is None:
+            lb, ub=-np.inf*np.ones(n_para), np.inf*np.ones(n_para)
+        else:
+            lb, ub=bd.lb, bd.ub
+        x=np.clip(x0,lb,ub)
+        f,grad=fun(x)
+        f=float(np.squeeze(f))
+        nfev=1
+        while nfev<maxfun:
+            if np.max(np.abs(x-np.clip(x-grad,lb,ub)))<1e-5:
+                break
+            active=((x<=lb) & (grad>0)) | ((x>=ub) & (grad<0))
+            d=-grad if H is None else -H@grad
+            d[active]=0
+            if grad@d>=0:
+                H=None
+                d=-grad
+                d[active]=0
+            if H is None:
+                d=d/max(np.max(np.abs(d)),1.)
+            step, accept=1., False
+            while nfev<maxfun:
+                x_new=np.clip(x+step*d,lb,ub)
+                try:
+                    f_new,grad_new=fun(x_new)
+                    f_new=float(np.squeeze(f_new))
+                except LinAlgError:
+                    f_new=np.inf
+                nfev+=1
+                if f_new<=f+1e-4*grad@(x_new-x):
+                    accept=True
+                    break
+                step*=0.5
+            if not accept:
+                fun(x)
+                nfev+=1
+                break
+            sk, yk=x_new-x, grad_new-grad
+            sy=sk@yk
+            if sy>1e-10:
+                if H is None:
+                    H=(sy/(yk@yk))*np.eye(n_para)
+                rho=1/sy
+                V=np.eye(n_para)-rho*np.outer(sk,yk)
+                H=V@H@V.T+rho*np.outer(sk,sk)
+            converged=(f-f_new)<=2.22e-9*max(abs(f),abs(f_new),1.)
+            x, f, grad=x_new, f_new, grad_new
+            if converged:
+                break
+        state['H']=H
+        state['nfev']=(state['nfev']+[nfev])[-10:]
+        state['maxfun']=int(min(maxfun_default,max(5,2*np.median(state['nfev']))))
+        state['n_eval']+=nfev
+        state['n_budget']+=maxfun_default
+        return nfev
+
+    def init_points(self, n_starts, start='prior'):
+        """Draw starting points of the log-transformed lengthscales and nugget for multi-start optimisation.
+
+        Args:
+            n_starts (int): the number of starting points. The first starting point is always the current parameter values.
+            start (str, optional): either `prior` to draw the remaining starting points from the gamma or inverse gamma priors, or `lhs`
+                to draw them from a Latin hypercube (on the log scale) inside **bds**. Under `lhs` the nugget stays at its current value. 
+                Defaults to `prior`.
+
+        Returns:
+            ndarray: a numpy 2d-array whose rows are the starting points.
+        """
+        x0=self.log_t()
+        n_new, n_length=n_starts-1, len(self.length)
+        if start=='prior':
+            if self.prior_name=='ga':
+                theta=np.random.gamma(self.prior_coef[0]+1, 1/self.prior_coef[1], size=(n_new,len(x0)))
+            elif self.prior_name=='inv_ga':
+                theta=self.prior_coef[1]/np.random.gamma(self.prior_coef[0]-1, 1., size=(n_new,len(x0)))
+            else:
+                raise Exception('Starting points can only be drawn from the gamma or inverse gamma priors. Set start to lhs instead.')
+            with np.errstate(divide='ignore'):
+                new=np.log(theta)
+        elif start=='lhs':
+            if self.bds is None or self.bds[0]<=0:
+                raise Exception('Starting points from the Latin hypercube require bds with a positive lower bound.')
+            lhs=(np.argsort(np.random.rand(n_new,n_length),axis=0)+np.random.rand(n_new,n_length))/n_new
+            new=np.log(self.bds[0])+lhs*(np.log(self.bds[1])-np.log(self.bds[0]))
+            if self.nugget_est:
+                new=np.hstack((new,np.tile(x0[-1],(n_new,1))))
+        else:
+            raise Exception('start can only be either prior or lhs.')
+        bd=self.opt_bounds()
+        if bd is not None:
+            new=np.clip(new,bd.lb,bd.ub)
+        return np.vstack((x0,new))
+
+    def maximise(self, method='L-BFGS-B', n_starts=1, start='prior', core_num=None, warm_start=False):
+        """Optimise and update model parameters by minimising the negative log-likelihood function.
+
+        Args:
+            method (str, optional): optimisation algorithm. Defaults to `L-BFGS-B`.
+            n_starts (int, optional): the number of starting points. If greater than one, the optimisations from different starting points
+                (see :meth:`.init_points`) are run in parallel and the one with the lowest negative log-likelihood is kept. Defaults to `1`.
+            start (str, optional): either `prior` or `lhs`, giving how the additional starting points are drawn. Defaults to `prior`.
+            core_num (int, optional): the number of workers used for the multi-start optimisation. The available cores are split evenly 
+                among the workers. Defaults to `None`, in which case it is set to ``min(n_starts, max physical cores available)``.
+            warm_start (bool, optional): whether to use :meth:`.warm_optim`, which keeps the optimiser state across calls, instead of 
+                **method**. Only used when **n_starts** = `1`. Defaults to `False`.
+        """
+        bd=self.opt_bounds()
+        if n_starts==1 and warm_start:
+            _ = self.warm_optim(self.log_t(), bd)
+        elif n_starts==1:
+            _ = self.optim(self.log_t(), bd, method)
+        else:
+            x0=self.init_points(n_starts, start)
+            os_type = platform.system()
+            if os_type in ['Darwin', 'Linux']:
+                ctx._force_start_method('forkserver')
+            total_cores = psutil.cpu_count(logical = False)
+            if core_num is None:
+                core_num = min(n_starts, total_cores)
+            num_thread = max(total_cores // core_num, 1)
+            def pmin(x):
+                set_num_threads(num_thread)
+                try:
+                    with threadpool_limits(limits=num_thread, user_api='blas'):
+                        res = self.optim(x, bd, method)
+                except LinAlgError:
+                    return np.inf, None
+                return float(np.squeeze(res.fun)), self
+            pool = Pool(core_num)
+            res = pool.map(pmin, list(x0))
+            pool.close()
+            pool.join()
+            pool.clear()
+            best = int(np.argmin([r[0] for r in res]))
+            if res[best][1] is None:
+                raise Exception('The optimisation fails from all starting points.')
+            best = res[best][1]
+            self.scale, self.length, self.nugget = best.scale, best.length, best.nugget
+            if self.vecch:
+                self.ord, self.rev_ord, self.NNarray, self.NN_levels = best.ord, best.rev_ord, best.NNarray, best.NN_levels
         self.add_to_path()
         
     def add_to_path(self):
         """Add updated model parameter estimates to the class attribute **para_path**.
         """
         para=np.concatenate((self.scale,self.length,self.nugget))
-        self.para_path=np.vstack((self.para_path,para))
+        self.para_trace.append(para)
 
-    def gp_prediction(self,x,z):
+    def gp_prediction(self,x,z,kernels=None):
         """Make GP predictions. 
 
         Args:
@@ -550,56 +1246,109 @@ class kernel:
             z (ndarray): a numpy 2d-array that contains additional input testing data (with the same number of 
                 columns of the **global_input** attribute) from the global testing input if the argument **connect** 
                 is not `None`. Set to None if the argument **connect** is `None`. 
+            kernels (list, optional): a list of GPs that share the input, global input and hyperparameters of this GP but differ 
+                in **output** (e.g., the copies of a GP in the first layer across the imputations of an emulator). If given, the
+                predictions are made for all of them at once: the cross-correlations (or the conditioning blocks under the Vecchia 
+                approximation) and the variances are computed once and the means are obtained by one matrix product. Defaults to `None`.
 
         Returns:
-            tuple: a tuple of two 1d-arrays giving the means and variances at the testing input data positions. 
+            tuple: a tuple of two 1d-arrays giving the means and variances at the testing input data positions. If **kernels** is
+            given, a tuple of two 2d-arrays whose columns give the means and variances of the GPs in **kernels**.
         """
+        if kernels is not None and (self.inducing or self.grid is not None):
+            res=[kernel.gp_prediction(x,z) for kernel in kernels]
+            return np.stack([m for m,_ in res],1), np.stack([v for _,v in res],1)
+        group=[self] if kernels is None else kernels
         if self.vecch:
             if z is not None:
                 x=np.concatenate((x, z),1)
                 w=np.concatenate((self.input, self.global_input),1)
             else:
                 w = self.input
-            NNarray = get_pred_nn(x/self.length, w/self.length, self.pred_m, method = self.nn_method)
+            NNarray = self.pred_nn(x, w)
             if self.loo_state:
                 NNarray = NNarray[:,1:]
-            m,v = gp_vecch(x,w,NNarray,self.output,self.scale[0],self.length,self.nugget[0],self.name)
+            m,v = gp_vecch(self.cast(x),self.cast(w),NNarray,np.hstack([kernel.output for kernel in group]),self.scale[0],self.length,self.nugget[0],self.name)
+        elif self.inducing:
+            m,v=gp(x,z,self.input[self.ind_idx],None if self.global_input is None else self.global_input[self.ind_idx],self.Rinv,self.Rinv_y.reshape(-1,1),self.scale,self.length,self.nugget,self.name)
+        elif self.grid is not None:
+            if z is not None:
+                x=np.concatenate((x, z),1)
+            _, Qs, _, lam=self.kron_eig()
+            return gp_kron(x,self.grid,Qs,1/(lam+self.nugget[0]),self.Rinv_y[self.grid_ord],self.scale[0],self.length,self.nugget[0],self.name)
         else:
-            m,v=gp(x,z,self.input,self.global_input,self.Rinv,self.Rinv_y,self.scale,self.length,self.nugget,self.name)
-        return m,v
+            m,v=gp(x,z,self.input,self.global_input,self.Rinv,np.stack([kernel.Rinv_y for kernel in group],1),self.scale,self.length,self.nugget,self.name)
+        if kernels is None:
+            return m[:,0],v
+        return m,np.repeat(v.reshape(-1,1),len(kernels),1)
 
-    def linkgp_prediction(self,m,v,z):
+    def linkgp_prediction(self,m,v,z,kernels=None):
         """Make linked GP predictions. 
 
         Args:
             m (ndarray): a numpy 2d-array that contains predictive means of testing outputs from the GPs in the last 
                 layer. The number of rows equals to the number of testing positions and the number of columns equals to the 
                 length of the argument **input_dim**. If the argument **input_dim** is `None`, then the number of columns equals 
-                to the number of GPs in the last layer.
-            v (ndarray): a numpy 2d-array that contains predictive variances of testing outputs from the GPs in the last 
-                layer. It has the same shape of **m**.
+                to the number of GPs in the last layer. If **kernels** is given, a numpy 3d-array that stacks such 2d-arrays, one 
+                for each GP in **kernels**.
+            v (ndarray): a numpy 2d-array (or 3d-array if **kernels** is given) that contains predictive variances of testing outputs 
+                from the GPs in the last layer. It has the same shape of **m**.
             z (ndarray): a numpy 2d-array that contains additional input testing data (with the same number of 
                 columns of the **global_input** attribute) from the global testing input if the argument **connect** 
                 is not `None`. Set to `None` if the argument **connect** is `None`. 
+            kernels (list, optional): a list of GPs that share the global input and hyperparameters of this GP but differ in **input** 
+                and **output** (e.g., the copies of a GP in a layer after the first across the imputations of an emulator). If given, the
+                predictions of all of them are made by one parallel loop over all (GP, testing position) pairs. Defaults to `None`.
 
         Returns:
             tuple: a tuple of two 1d-arrays giving the means and variances at the testing input data positions (that are 
-            represented by predictive means and variances).
+            represented by predictive means and variances). If **kernels** is given, a tuple of two 2d-arrays whose columns give the 
+            means and variances of the GPs in **kernels**.
         """
-        if self.vecch:
+        if kernels is not None and (self.inducing or self.grid is not None):
+            res=[kernel.linkgp_prediction(m[i],v[i],z) for i, kernel in enumerate(kernels)]
+            return np.stack([m for m,_ in res],1), np.stack([v for _,v in res],1)
+        if self.inducing:
+            H=np.empty((1,)+self.Rinv.shape)
+            link_H(self.Rinv,self.Rinv_y,self.R2sexp if self.name=='sexp' else None,self.scale[0],H[0])
+            return link_gp(m,v,z,self.input[self.ind_idx][None],None if self.global_input is None else self.global_input[self.ind_idx],H,self.Rinv_y[None],self.scale[0],self.length,self.nugget[0],self.name)
+        elif self.grid is not None:
             if z is not None:
-                x = np.concatenate((m, z),1)
-                w = np.concatenate((self.input, self.global_input),1)
-            else:
-                x = m
-                w = self.input
-            NNarray = get_pred_nn(x/self.length, w/self.length, self.pred_m, method = self.nn_method)
-            if self.loo_state:
-                NNarray = NNarray[:,1:]
-            m,v = link_gp_vecch(m, v, z, self.input, self.global_input, NNarray, self.output, self.scale[0], self.length, self.nugget[0], self.name)
+                m=np.concatenate((m, z),1)
+                v=np.concatenate((v, np.zeros_like(z)),1)
+            _, Qs, _, lam=self.kron_eig()
+            return link_gp_kron(m,v,self.grid,Qs,1/(lam+self.nugget[0]),self.Rinv_y[self.grid_ord],self.scale[0],self.length,self.nugget[0],self.name)
+        group=[self] if kernels is None else kernels
+        if kernels is None:
+            m, v=m[None], v[None]
+        N, M, D=m.shape
+        if self.vecch:
+            NNarray=[]
+            for i, kernel in enumerate(group):
+                if z is not None:
+                    x = np.concatenate((m[i], z),1)
+                    w = np.concatenate((kernel.input, kernel.global_input),1)
+                else:
+                    x = m[i]
+                    w = kernel.input
+                NNarray_i = kernel.pred_nn(x, w)
+                NNarray.append(NNarray_i[:,1:] if kernel.loo_state else NNarray_i)
+            m_new,v_new = link_gp_vecch(m.reshape(-1,D), v.reshape(-1,D), z, np.stack([self.cast(kernel.input) for kernel in group]), None if self.global_input is None else self.cast(self.global_input), np.concatenate(NNarray), np.hstack([kernel.output for kernel in group]), self.scale[0], self.length, self.nugget[0], self.name)
         else:
-            m,v=link_gp(m,v,z,self.input,self.global_input,self.Rinv,self.Rinv_y,self.R2sexp,self.Psexp,self.scale[0],self.length,self.nugget[0],self.name)
-        return m,v
+            n=len(self.input)
+            G=min(N, link_group(n))
+            H=np.empty((G,n,n))
+            m_new,v_new=np.empty(N*M),np.empty(N*M)
+            for start in range(0,N,G):
+                sub=group[start:start+G]
+                for i, kernel in enumerate(sub):
+                    link_H(kernel.Rinv,kernel.Rinv_y,kernel.R2sexp if self.name=='sexp' else None,self.scale[0],H[i])
+                rows=slice(start*M,(start+len(sub))*M)
+                m_new[rows],v_new[rows]=link_gp(m[start:start+len(sub)].reshape(-1,D),v[start:start+len(sub)].reshape(-1,D),z,np.stack([kernel.input for kernel in sub]),self.global_input,H[:len(sub)],np.stack([kernel.Rinv_y for kernel in sub]),self.scale[0],self.length,self.nugget[0],self.name)
+        m_new,v_new=m_new.reshape(N,M).T,v_new.reshape(N,M).T
+        if kernels is None:
+            return m_new[:,0],v_new[:,0]
+        return m_new,v_new
 
     def linkgp_prediction_full(self,m,v,m_z,v_z,z):
         """Make linked GP predictions with additional input also generated by GPs/DGPs. 
@@ -632,56 +1381,176 @@ class kernel:
             else:
                 x = m
                 w = overall_input
-            NNarray = get_pred_nn(x/self.length, w/self.length, self.pred_m, method = self.nn_method)
-            m,v = link_gp_vecch(m, v, z, overall_input, self.global_input[:,idx2], NNarray, self.output, self.scale[0], self.length, self.nugget[0], self.name)
+            NNarray = self.pred_nn(x, w)
+            m,v = link_gp_vecch(m, v, z, self.cast(overall_input)[None], self.cast(self.global_input[:,idx2]), NNarray, self.output, self.scale[0], self.length, self.nugget[0], self.name)
+        elif self.grid is not None:
+            if z is not None:
+                m=np.concatenate((m, z),1)
+                v=np.concatenate((v, np.zeros_like(z)),1)
+            _, Qs, _, lam=self.kron_eig()
+            m,v=link_gp_kron(m,v,self.grid,Qs,1/(lam+self.nugget[0]),self.Rinv_y[self.grid_ord],self.scale[0],self.length,self.nugget[0],self.name)
         else:
+            if self.inducing:
+                overall_input, global_input=overall_input[self.ind_idx], self.global_input[self.ind_idx]
+            else:
+                global_input=self.global_input
             if self.name=='sexp':
                 if len(self.length)==1:
-                    global_input_l=self.global_input[:,idx1]/self.length
+                    global_input_l=global_input[:,idx1]/self.length
                 else:
                     D=np.shape(self.input)[1]
-                    global_input_l=self.global_input[:,idx1]/(self.length[D::][idx1])
+                    global_input_l=global_input[:,idx1]/(self.length[D::][idx1])
                 dists = pdist(global_input_l, metric="sqeuclidean")
                 R2sexp_global = squareform(np.exp(-dists/2))
                 np.fill_diagonal(R2sexp_global, 1)
                 R2sexp = self.R2sexp*R2sexp_global
-                Psexp_global = Pmatrix(global_input_l)
-                Psexp = np.concatenate((self.Psexp,Psexp_global),axis=0)
             else:
-                R2sexp, Psexp = self.R2sexp, self.Psexp
-            m,v=link_gp(m,v,z,overall_input,self.global_input[:,idx2],self.Rinv,self.Rinv_y,R2sexp,Psexp,self.scale[0],self.length,self.nugget[0],self.name)
+                R2sexp = self.R2sexp
+            H=np.empty((1,)+self.Rinv.shape)
+            link_H(self.Rinv,self.Rinv_y,R2sexp,self.scale[0],H[0])
+            m,v=link_gp(m,v,z,overall_input[None],global_input[:,idx2],H,self.Rinv_y[None],self.scale[0],self.length,self.nugget[0],self.name)
         return m,v
 
-    def compute_stats(self):
-        """Compute and store key statistics for the GP predictions
+    def compute_stats(self, reuse=False):
+        """Compute and store key statistics for the GP predictions. Under the FITC approximation (**inducing** = `True`), **Rinv**, 
+        **Rinv_y** and **R2sexp** are computed against the inducing points, so that the GP and linked GP predictions cost 
+        O(r^2) per testing position. If the input forms a grid (**grid** is not `None`), only **Rinv_y** is computed, through the 
+        per-dimension eigendecompositions, and the predictions are made by :func:`.gp_kron` and :func:`.link_gp_kron`.
+
+        Args:
+            reuse (bool, optional): whether to keep **Rinv** and **R2sexp** (without the FITC approximation or a grid) if they were 
+                computed at the current **version**, so that only **Rinv_y** is recomputed. The kept arrays are the same objects, which 
+                lets copies of the kernel made across imputations share them (see :func:`.shared_memo`). Defaults to `False`.
         """
-        R=self.k_matrix()
         #U, s, Vh = np.linalg.svd(R)
         #self.Rinv=Vh.T@np.diag(s**-1)@U.T
         #L=np.linalg.cholesky(R)
         #self.Rinv_y=cho_solve((L, True), self.output, check_finite=False)
         #self.Rinv=pinvh(R,check_finite=False)
         #self.Rinv_y=np.dot(self.Rinv,self.output).flatten()
-        try:
-            L=np.linalg.cholesky(R)
-            self.Rinv=cho_solve((L, True), np.eye(len(R)), check_finite=False)
-            self.Rinv_y=cho_solve((L, True), self.output, check_finite=False).flatten()
-        except LinAlgError:
-            self.Rinv=pinvh(R,check_finite=False)
-            self.Rinv_y=np.dot(self.Rinv,self.output).flatten()
+        if self.inducing:
+            _, Lu, _, _=self.fitc()
+            La, M, _, _=self.fitc_solve()
+            Luinv=solve_triangular(Lu, np.eye(len(Lu)), lower=True, check_finite=False)
+            T=solve_triangular(La, Luinv, lower=True, check_finite=False)
+            self.Rinv=Luinv.T@Luinv-T.T@T
+            self.Rinv_y=(T.T@(M@self.output)).flatten()
+            w1=self.input[self.ind_idx]
+        elif self.grid is not None:
+            _, Qs, _, lam=self.kron_eig()
+            self.Rinv_y=np.empty(len(lam))
+            self.Rinv_y[self.grid_ord]=kron_mv(Qs, kron_mv([Q.T for Q in Qs], self.output[self.grid_ord].flatten())/(lam+self.nugget[0]))
+            self.Rinv, self.R2sexp=None, None
+            self.stats_version=self.version
+            return
+        else:
+            w1=self.input
+            keep=reuse and self.stats_version==self.version and self.Rinv is not None and len(self.Rinv)==len(w1)
+            try:
+                L=self.chol()
+                if not keep:
+                    self.Rinv=cho_solve((L, True), np.eye(len(L)), check_finite=False)
+                self.Rinv_y=cho_solve((L, True), self.output, check_finite=False).flatten()
+            except LinAlgError:
+                if not keep:
+                    R=self.k_matrix()
+                    self.Rinv=pinvh(R,check_finite=False)
+                self.Rinv_y=np.dot(self.Rinv,self.output).flatten()
+            if keep:
+                return
         if self.name=='sexp':
             if self.global_input is None:
-                X_l=self.input/self.length
+                X_l=w1/self.length
             else:
                 if len(self.length)==1:
-                    X_l=self.input/self.length
+                    X_l=w1/self.length
                 else:
-                    D=np.shape(self.input)[1]
-                    X_l=self.input/self.length[:D]
+                    D=np.shape(w1)[1]
+                    X_l=w1/self.length[:D]
             dists = pdist(X_l, metric="sqeuclidean")
             self.R2sexp = squareform(np.exp(-dists/2))
             np.fill_diagonal(self.R2sexp, 1)
-            self.Psexp = Pmatrix(X_l)
+        self.stats_version=self.version
+
+    def k_cross(self, X1, X2):
+        """Compute the cross-correlation matrix (without nugget) between two sets of input positions.
+
+        Args:
+            X1 (ndarray): a numpy 2d-array of input positions (including the global input dimensions if any).
+            X2 (ndarray): a numpy 2d-array of input positions with the same number of columns as **X1**.
+
+        Returns:
+            ndarray: a numpy 2d-array whose (i,j)-th element is the correlation between the i-th row of **X1** and the j-th row of **X2**.
+        """
+        X1_l, X2_l=X1/self.length, X2/self.length
+        if self.name=='sexp':
+            K=np.exp(-cdist(X1_l, X2_l, metric="sqeuclidean"))
+        elif self.name=='matern2.5':
+            coef1, coef2=np.ones((len(X1_l),len(X2_l))), np.zeros((len(X1_l),len(X2_l)))
+            for d in range(X1_l.shape[1]):
+                dis=np.abs(X1_l[:,[d]]-X2_l[:,d])
+                coef1*=1+np.sqrt(5)*dis+(5/3)*dis**2
+                coef2+=dis
+            K=coef1*np.exp(-np.sqrt(5)*coef2)
+        return K
+
+    def extend_stats(self, n_old, L_old=None):
+        """Update the statistics for the GP predictions after rows are appended to **input** (and **global_input**), 
+        given that the statistics were up to date for the first **n_old** rows. The Cholesky factor is extended by a block 
+        factorisation, **Rinv** by the block inversion formula, and **R2sexp** by its new rows and columns, 
+        all in O(n^2 k) for k appended rows. Falls back to :meth:`.compute_stats` if **L_old** is not given or the new 
+        block is numerically singular.
+
+        Args:
+            n_old (int): the number of rows of **input** for which the stored statistics were computed.
+            L_old (ndarray, optional): the lower Cholesky factor of the correlation matrix of the first **n_old** rows. Defaults to `None`.
+        """
+        if L_old is None:
+            self.compute_stats()
+            return
+        if self.global_input is not None:
+            X=np.concatenate((self.input, self.global_input),1)
+        else:
+            X=self.input
+        K12=self.k_cross(X[:n_old], X[n_old:])
+        K22=self.k_cross(X[n_old:], X[n_old:])
+        np.fill_diagonal(K22, 1+self.nugget)
+        B=solve_triangular(L_old, K12, lower=True, check_finite=False)
+        try:
+            C=cholesky(K22-B.T@B, lower=True, check_finite=False)
+        except LinAlgError:
+            self.compute_stats()
+            return
+        A=solve_triangular(L_old.T, B, lower=False, check_finite=False)
+        n=len(X)
+        Sinv=cho_solve((C, True), np.eye(n-n_old), check_finite=False)
+        ASinv=A@Sinv
+        Rinv=np.empty((n,n))
+        Rinv[:n_old,:n_old]=self.Rinv+ASinv@A.T
+        Rinv[:n_old,n_old:]=-ASinv
+        Rinv[n_old:,:n_old]=-ASinv.T
+        Rinv[n_old:,n_old:]=Sinv
+        self.Rinv=Rinv
+        self.Rinv_y=(self.Rinv@self.output).flatten()
+        L=np.zeros((n,n))
+        L[:n_old,:n_old]=L_old
+        L[n_old:,:n_old]=B.T
+        L[n_old:,n_old:]=C
+        self.chol_cache=(self.version, L)
+        if self.name=='sexp':
+            if self.global_input is None or len(self.length)==1:
+                X_l=self.input/self.length
+            else:
+                D=np.shape(self.input)[1]
+                X_l=self.input/self.length[:D]
+            R2sexp=np.empty((n,n))
+            R2sexp[:n_old,:n_old]=self.R2sexp
+            R2sexp[:n_old,n_old:]=np.exp(-cdist(X_l[:n_old], X_l[n_old:], metric="sqeuclidean")/2)
+            R2sexp[n_old:,:n_old]=R2sexp[:n_old,n_old:].T
+            R2sexp[n_old:,n_old:]=np.exp(-cdist(X_l[n_old:], X_l[n_old:], metric="sqeuclidean")/2)
+            np.fill_diagonal(R2sexp, 1)
+            self.R2sexp=R2sexp
+        self.stats_version=self.version
 
 def combine(*layers):
     """Combine layers into one list as a DGP or linked (D)GP structure.
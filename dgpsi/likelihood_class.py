@@ -1,9 +1,8 @@
 import numpy as np
 from scipy.special import loggamma
 from scipy.linalg import cholesky, cho_solve
-from scipy.sparse import diags_array
 from .functions import fmvn_mu
-from .vecchia import backward_substitute, forward_substitute
+from .vecchia import backward_substitute, forward_substitute, backward_substitute_lv, forward_substitute_lv, use_levels
 
 class Poisson:
     """Class to implement Poisson likelihood. It can only be added as the final layer of a DGP model.
@@ -157,7 +156,7 @@ class Hetero:
         """
         if idx==0:
             #if self.rep is None:
-            invGamma = diags_array(np.exp(-self.input[:,1])[ord], format = 'csc')
+            invGamma = np.exp(-self.input[:,1])[ord]
             f_mu = self.post_het1_vecch(U_sp, invGamma, self.output[ord,0])[rev_ord]
             #else:
             #    invGamma = diags_array(np.exp(-self.input[:,1]), format = 'csc')
@@ -174,16 +173,25 @@ class Hetero:
            of the heteroskedastic Gaussian likelihood when there are no repetitions
            in the training data under the Vecchia approximation.
         """
-        invGammay = invGamma.dot(y_mask)
+        invGammay = invGamma*y_mask
         sd = np.random.rand(len(y_mask))
-        L_sp = U_sp.transpose().tocsr()
+        (U_data, U_indices, U_indptr, U_lvl_ptr, U_lvl_rows), (L_data, L_indices, L_indptr, L_lvl_ptr, L_lvl_rows) = U_sp
         # to be changed to spsolve_triangular when scipy updates with newer robust version
         #samp = spsolve(L_sp, sd)
         #intermediate = spsolve(U_sp, invGammay)
         #mu = spsolve(L_sp, intermediate)
-        samp = forward_substitute(L_sp.data, L_sp.indices, L_sp.indptr, sd)
-        intermediate = backward_substitute(U_sp.data, U_sp.indices, U_sp.indptr, invGammay)
-        mu = forward_substitute(L_sp.data, L_sp.indices, L_sp.indptr, intermediate)
+        if use_levels(L_lvl_ptr):
+            samp = forward_substitute_lv(L_data, L_indices, L_indptr, L_lvl_ptr, L_lvl_rows, sd)
+        else:
+            samp = forward_substitute(L_data, L_indices, L_indptr, sd)
+        if use_levels(U_lvl_ptr):
+            intermediate = backward_substitute_lv(U_data, U_indices, U_indptr, U_lvl_ptr, U_lvl_rows, invGammay)
+        else:
+            intermediate = backward_substitute(U_data, U_indices, U_indptr, invGammay)
+        if use_levels(L_lvl_ptr):
+            mu = forward_substitute_lv(L_data, L_indices, L_indptr, L_lvl_ptr, L_lvl_rows, intermediate)
+        else:
+            mu = forward_substitute(L_data, L_indices, L_indptr, intermediate)
         f = mu + samp
         return f
     
@@ -6,7 +6,7 @@ import psutil
 from .imputation import imputer
 import copy
 from numba import set_num_threads
-from .utils import have_same_shape
+from .utils import have_same_shape, shared_memo, batch_input, shared_arrays
 from contextlib import contextmanager
 
 class container:
@@ -43,6 +43,7 @@ class container:
                 self.vecch=True
             else:
                 self.vecch=False
+            self.inducing=self.structure.inducing
         else:
             self.type='dgp'
             self.structure=structure
@@ -50,6 +51,7 @@ class container:
                 self.vecch=True
             else:
                 self.vecch=False
+            self.inducing=self.structure[0][0].inducing
             self.imp=imputer(self.structure, block)
             if self.vecch:
                 (self.imp).update_ord_nn()
@@ -59,6 +61,8 @@ class container:
     def __setstate__(self, state):
         if 'vecch' not in state:
             state['vecch'] = False
+        if 'inducing' not in state:
+            state['inducing'] = False
         self.__dict__.update(state)
 
     def to_vecchia(self):
@@ -88,6 +92,41 @@ class container:
                         if kernel.type == 'gp':
                             kernel.vecch = self.vecch
 
+    def to_inducing(self, r=100):
+        """Convert the container to the inducing-point (FITC) mode.
+
+        Args:
+            r (int): an integer that gives the number of inducing points of each GP node. Defaults to `100`. 
+        """
+        if not self.inducing and not self.vecch:
+            self.inducing=True
+            if self.type == 'gp':
+                self.structure.inducing, self.structure.r = self.inducing, r
+                self.structure.inducing_set()
+                self.structure.compute_stats()
+            elif self.type == 'dgp':
+                for layer in self.structure:
+                    for kernel in layer:
+                        if kernel.type == 'gp':
+                            kernel.inducing, kernel.r = self.inducing, r
+                            kernel.inducing_set()
+                            kernel.compute_stats()
+
+    def remove_inducing(self):
+        """Remove the inducing-point (FITC) mode from the container.
+        """
+        if self.inducing:
+            self.inducing = False
+            if self.type == 'gp':
+                self.structure.inducing = self.inducing
+                self.structure.compute_stats()
+            elif self.type == 'dgp':
+                for layer in self.structure:
+                    for kernel in layer:
+                        if kernel.type == 'gp':
+                            kernel.inducing = self.inducing
+                            kernel.compute_stats()
+
     def set_local_input(self, idx, new = False):
         """Set the **local_input_idx** argument and optionally output a copy of the container with a different **local_input_idx**.
 
@@ -119,6 +158,7 @@ class container:
         new_inst.type = self.type
         new_inst.structure = self.structure
         new_inst.vecch = self.vecch
+        new_inst.inducing = self.inducing
         if self.type=='dgp':
             new_inst.imp = self.imp
         new_inst.local_input_idx = copy.copy(self.local_input_idx)
@@ -153,14 +193,14 @@ class lgp:
                     layer=[]
                     for cont in temp_all_layer[l]:
                         if cont.type=='gp':
-                            layer.append(copy.deepcopy(cont))
+                            layer.append(copy.deepcopy(cont, shared_memo([[cont.structure]])))
                         elif cont.type=='dgp':
                             if cont.vecch:
                                 (cont.imp).update_ord_nn()
                             (cont.imp).sample()
                             if not cont.vecch:
                                 (cont.imp).key_stats()
-                            layer.append(copy.deepcopy(cont))
+                            layer.append(copy.deepcopy(cont, shared_memo(cont.structure)))
                     one_imputation.append(layer)
                 self.all_layer_set.append(one_imputation)
 
@@ -257,7 +297,7 @@ class lgp:
                         z=[i+[j] for i,j in zip(z,z_m)]
         elif not isinstance(x, list):
             z=np.array_split(x,chunk_num)
-        with Pool(core_num) as pool:
+        with shared_arrays(self), Pool(core_num) as pool:
             res = pool.map(f, [[x, method, full_layer, sample_size, m] for x in z])
         if method == 'mean_var':
             if full_layer:
@@ -282,6 +322,27 @@ class lgp:
             else:
                 return list(np.concatenate(worker,axis=1) for worker in zip(*res))
 
+    def predict_iter(self,x,batch_size=10000,method='mean_var',full_layer=False,sample_size=50,m=50):
+        """Implement predictions from the linked (D)GP model batch by batch, so that only the predictions (and, if
+        **method** = '`sampling`', the samples) of one batch of global testing positions are held in memory at a time.
+
+        Args:
+            x, method, full_layer, sample_size, m: see descriptions of the method :meth:`.lgp.predict`. If **x** is a list, all of its
+                numpy 2d-arrays are split into batches along their rows.
+            batch_size (int, optional): the maximum number of global testing positions in a batch. Defaults to `10000`.
+
+        Returns:
+            generator: a generator of tuples, each of which contains a slice that gives the rows of the global testing positions in a
+            batch and the output of the method :meth:`.lgp.predict` for these rows. The input is checked when the method is called.
+            The slice indexes axis 0 of the 2d-arrays returned when **method** = '`mean_var`', and axis 1 of the 3d-arrays returned
+            when **method** = '`sampling`'.
+        """
+        if isinstance(x, list) and len(x)!=self.L:
+            raise Exception('When test input is given as a list, it must contain global inputs to the all layers (even with no global inputs to internal layers). Set None as the global input to the internal models if they have no global inputs.')
+        elif not isinstance(x, list) and x.ndim==1:
+            raise Exception('The testing input has to be a numpy 2d-array.')
+        return ((idx, self.predict(x_batch,method,full_layer,sample_size,m)) for idx, x_batch in batch_input(x, batch_size))
+
     def predict(self,x,method='mean_var',full_layer=False,sample_size=50,m=50):
         """Implement predictions from the linked (D)GP model.
 
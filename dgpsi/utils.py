@@ -1,11 +1,13 @@
 from dill import dump, load
+import os
 from tabulate import tabulate
 from numba import njit, set_num_threads, get_num_threads
 import numpy as np
 from scipy.linalg import svd
 from sklearn.metrics.pairwise import pairwise_kernels
+from multiprocess import shared_memory
+from contextlib import contextmanager
 #import copy
-#from contextlib import contextmanager
 
 ######Save and Load Emulators#######
 def write(emu, pkl_file):
@@ -193,6 +195,126 @@ def have_same_shape(list1, list2):
             return False
     return True
 
+def batch_input(x, batch_size):
+    """Split the testing input into consecutive batches of at most **batch_size** testing positions.
+
+    Args:
+        x (ndarray_or_list): a numpy 2d-array, or a list in the format of the testing input of :meth:`.lgp.predict`, whose
+            arrays are split along their rows.
+        batch_size (int): the maximum number of testing positions in a batch.
+
+    Returns:
+        generator: a generator of tuples, each of which contains a slice that gives the rows of the testing positions in a batch and the batch itself.
+    """
+    if batch_size<1:
+        raise Exception('batch_size must be a positive integer.')
+    M=len(x[0]) if isinstance(x, list) else len(x)
+    def take(idx):
+        if isinstance(x, list):
+            return [x[0][idx]]+[[None if z is None else z[idx] for z in x_l] for x_l in x[1:]]
+        return x[idx]
+    return ((idx, take(idx)) for idx in (slice(start, min(start+batch_size, M)) for start in range(0, M, batch_size)))
+
+def shared_memo(all_layer):
+    """Build a memo for :func:`copy.deepcopy` so that the copies of a (D)GP structure made across imputations share, 
+    instead of duplicating, the objects that the imputations do not change: the global inputs, the parameter and R2 traces, 
+    the inputs and the statistics **Rinv** and **R2sexp** of the GP nodes in the first layer, and the outputs of the nodes 
+    in the last layer. The shared objects must not be modified in place.
+
+    Args:
+        all_layer (list): a list of layers, each of which is a list of GP or likelihood nodes.
+
+    Returns:
+        dict: a dictionary that maps the ids of the shared objects to themselves.
+    """
+    shared = []
+    for l, layer in enumerate(all_layer):
+        for node in layer:
+            if node.type == 'gp':
+                shared += [node.global_input, node.para_trace, node.R2_trace]
+                if l == 0:
+                    shared += [node.input, node.Rinv, node.R2sexp]
+            if l == len(all_layer)-1:
+                shared.append(node.output)
+    return {id(obj): obj for obj in shared if obj is not None}
+
+class shared_array(np.ndarray):
+    """A numpy array whose data live in a shared memory block and whose pickle is a handle (the name, shape and dtype of the block) 
+    instead of the data, so that worker processes attach to the block (see :func:`.attach_shared`) rather than receive a copy. Views 
+    of the array pickle their data as usual.
+    """
+    shm_name = None
+
+    def __reduce__(self):
+        if self.shm_name is None:
+            return np.asarray(self).__reduce__()
+        return attach_shared, (self.shm_name, self.shape, self.dtype.str)
+
+attached_blocks = {}
+
+def attach_shared(name, shape, dtype):
+    """Attach to the shared memory block **name** and return a numpy array backed by it without copying. The block stays attached 
+    for the lifetime of the process and is never unlinked from here: it is owned by the process that created it (see :func:`.shared_arrays`).
+    """
+    if name not in attached_blocks:
+        attached_blocks[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=attached_blocks[name].buf)
+
+def large_arrays(obj, min_size, visited, found):
+    """Collect the (owner, attribute name, array) triples of the numpy arrays of at least **min_size** bytes held as attributes by **obj** 
+    and by the dgpsi objects (including those in lists and tuples) reachable from it.
+    """
+    if id(obj) in visited:
+        return
+    visited.add(id(obj))
+    if isinstance(obj, (list, tuple)):
+        for item in obj:
+            large_arrays(item, min_size, visited, found)
+    elif type(obj).__module__.startswith('dgpsi') and hasattr(obj, '__dict__'):
+        for key, value in vars(obj).items():
+            if isinstance(value, np.ndarray):
+                if value.nbytes >= min_size and not value.dtype.hasobject:
+                    found.append((obj, key, value))
+            else:
+                large_arrays(value, min_size, visited, found)
+
+@contextmanager
+def shared_arrays(obj, min_size=2**20):
+    """Temporarily move the large arrays of a model (e.g., the inputs, **Rinv** and **R2sexp** of its GP nodes) to shared memory, so 
+    that pickling the model for the worker processes of the parallel methods (e.g., :meth:`.emulator.ppredict`) ships lightweight 
+    handles and the workers attach to the arrays without copying them (see :class:`.shared_array`). Each distinct array is placed 
+    once, so the arrays shared across imputations (see :func:`.shared_memo`) stay shared. The original arrays are put back and the 
+    shared memory is released on exit. The arrays must not be modified in place while shared.
+
+    Args:
+        obj (class): a :class:`.gp`, :class:`.emulator` or :class:`.lgp` class.
+        min_size (int, optional): the size in bytes from which an array is moved to shared memory. Defaults to `2**20`.
+    """
+    found = []
+    large_arrays(obj, min_size, set(), found)
+    blocks = {}
+    try:
+        for owner, key, value in found:
+            if id(value) not in blocks:
+                shm = shared_memory.SharedMemory(create=True, size=value.nbytes)
+                array = np.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf).view(shared_array)
+                array[...] = value
+                array.shm_name = shm.name
+                blocks[id(value)] = [shm, array]
+            setattr(owner, key, blocks[id(value)][1])
+        yield
+    finally:
+        for owner, key, value in found:
+            setattr(owner, key, value)
+        for block in blocks.values():
+            shm, block[1] = block[0], None
+            attached_blocks.pop(shm.name, None)
+            try:
+                shm.close()
+            except BufferError:
+                pass
+            shm.unlink()
+
 class NystromKPCA():
     def __init__(self, n_components, m = 200):
         self.m = m 
@@ -260,4 +382,150 @@ class NystromKPCA():
         flip_matrix = np.diag(1 - 2 * flip)
         scores_flipped = scores @ flip_matrix
         return scores_flipped
-    
\ No newline at end of file
+    
+class trace:
+    """
+    Class that stores a growing sequence of equal-length numpy 1d-arrays, e.g., the traces of model parameters 
+    and R2 of a GP node over the SEM iterations. The rows are kept in a preallocated buffer that is extended in chunks, 
+    so appending a row does not copy the existing rows, and the buffer can be spilled to a memory-mapped file.
+
+    Args:
+        value (ndarray): a numpy 1d-array or 2d-array that gives the initial row(s) of the trace.
+        chunk (int, optional): the minimum number of rows by which the buffer is extended. Defaults to `100`.
+        path (str, optional): the path to the file that backs the buffer as a memory-mapped array. Defaults to `None`,
+            in which case the buffer is kept in memory.
+
+    Remark:
+        When pickled, an in-memory trace only stores its filled rows, while a memory-mapped trace only stores the path 
+        to its file. A deep copy of a trace is always kept in memory.
+    """
+
+    def __init__(self, value, chunk=100, path=None):
+        self.chunk=chunk
+        self.path=path
+        self.buffer=None
+        self.reset(value)
+
+    def __getstate__(self):
+        state=self.__dict__.copy()
+        if self.path is None:
+            state['buffer']=self.buffer[:self.n].copy()
+        else:
+            self.buffer.flush()
+            state['buffer']=None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.path is not None:
+            if not os.path.exists(self.path):
+                raise Exception('The memory-mapped file %s of the trace cannot be found.' % self.path)
+            self.buffer=np.memmap(self.path, dtype=np.float64, mode='r+')
+            self.buffer=self.buffer.reshape(-1, self.p)
+
+    def __deepcopy__(self, memo):
+        return trace(self.values(), chunk=self.chunk)
+
+    def __len__(self):
+        return self.n
+
+    def reset(self, value):
+        """Discard the stored rows and restart the trace from the given row(s).
+
+        Args:
+            value (ndarray): a numpy 1d-array or 2d-array that gives the initial row(s) of the trace.
+        """
+        value=np.atleast_2d(value)
+        if self.buffer is not None and self.p!=value.shape[1]:
+            self.buffer=None
+        self.n, self.p=0, value.shape[1]
+        self.reserve(len(value))
+        self.buffer[:len(value)]=value
+        self.n=len(value)
+
+    def reserve(self, n_rows):
+        """Extend the buffer (by at least **chunk** rows and at least doubling it) if it cannot hold **n_rows** rows.
+
+        Args:
+            n_rows (int): the number of rows to be held.
+        """
+        capacity=0 if self.buffer is None else len(self.buffer)
+        if n_rows<=capacity:
+            return
+        capacity=max(n_rows, capacity+max(self.chunk, capacity))
+        if self.path is None:
+            buffer=np.empty((capacity, self.p))
+            if self.n>0:
+                buffer[:self.n]=self.buffer[:self.n]
+            self.buffer=buffer
+        else:
+            if self.buffer is None:
+                self.buffer=np.memmap(self.path, dtype=np.float64, mode='w+', shape=(capacity, self.p))
+            else:
+                self.buffer.flush()
+                self.buffer=None
+                with open(self.path, 'r+b') as f:
+                    f.truncate(capacity*self.p*8)
+                self.buffer=np.memmap(self.path, dtype=np.float64, mode='r+', shape=(capacity, self.p))
+
+    def append(self, row):
+        """Append a row to the trace.
+
+        Args:
+            row (ndarray): a numpy 1d-array with the same length as the stored rows.
+        """
+        self.reserve(self.n+1)
+        self.buffer[self.n]=row
+        self.n+=1
+
+    def values(self):
+        """Return the stored rows.
+
+        Returns:
+            ndarray: a numpy 2d-array (a view of the buffer) whose rows are the stored rows.
+        """
+        return self.buffer[:self.n]
+
+    def to_memmap(self, path):
+        """Move the buffer to a memory-mapped file.
+
+        Args:
+            path (str): the path to the file that backs the buffer.
+        """
+        value=np.array(self.values())
+        self.path, self.buffer=path, None
+        self.reset(value)
+
+    def to_memory(self):
+        """Move the buffer of a memory-mapped trace back into memory.
+        """
+        value=np.array(self.values())
+        self.path, self.buffer=None, None
+        self.reset(value)
+
+    def mean(self, start=0):
+        """Compute the column means of the stored rows from row **start** onwards, streaming over the rows in chunks.
+
+        Args:
+            start (int, optional): the index of the first row used. Defaults to `0`.
+
+        Returns:
+            ndarray: a numpy 1d-array of the column means.
+        """
+        start=range(self.n)[start:].start
+        total=np.zeros(self.p)
+        for i in range(start, self.n, self.chunk):
+            total+=np.sum(self.buffer[i:min(i+self.chunk, self.n)], axis=0)
+        return total/(self.n-start)
+
+    def median(self, start=0):
+        """Compute the column medians of the stored rows from row **start** onwards, one column at a time.
+
+        Args:
+            start (int, optional): the index of the first row used. Defaults to `0`.
+
+        Returns:
+            ndarray: a numpy 1d-array of the column medians.
+        """
+        start=range(self.n)[start:].start
+        return np.array([np.median(self.buffer[start:self.n, j]) for j in range(self.p)])
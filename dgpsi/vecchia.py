@@ -1,8 +1,8 @@
-from numba import njit, prange, config, vectorize, float64, set_num_threads
+from numba import njit, prange, config, vectorize, float64, set_num_threads, get_num_threads
 import numpy as np
+import heapq
 from numpy.random import randn
 from math import erf, sqrt, pi, exp
-from scipy.sparse import csr_matrix
 try:
     import faiss
     FAISS_AVAILABLE = True
@@ -14,6 +14,58 @@ from psutil import cpu_count
 core_num = cpu_count(logical = False)
 config.THREADING_LAYER = 'workqueue'
 set_num_threads(core_num)
+# level-scheduled triangular solves are opt-in: they only pay off with several threads and levels of at least min_level_size rows
+level_solves = False
+min_level_size = 512
+
+class pred_nn_index:
+    """Nearest-neighbour index over a fixed set of positions that can be queried repeatedly and pickled.
+
+    Args:
+        x (ndarray): a numpy 2d-array of the positions to be indexed.
+        method (str): either `exact` or `approx` (only used when faiss is available). Defaults to `exact`.
+        size (int): the number of neighbours per node of the HNSW graph when **method** = `approx`. Defaults to `40`.
+        efSearch (int): the search depth of the HNSW graph when **method** = `approx`. Defaults to `100`.
+        n_jobs (int): the number of jobs used by the sklearn KD-tree when faiss is not available. Defaults to `-1`.
+    """
+
+    def __init__(self, x, method = 'exact', size = 40, efSearch = 100, n_jobs = -1):
+        self.n, d = x.shape
+        if FAISS_AVAILABLE:
+            if method == 'exact':
+                self.neigh = faiss.IndexFlatL2(d)
+            elif method == 'approx':
+                self.neigh = faiss.IndexHNSWFlat(d, size)
+                self.neigh.hnsw.efSearch = efSearch
+            self.neigh.add(x)
+        else:
+            self.neigh = NearestNeighbors(algorithm='kd_tree', n_jobs=n_jobs)
+            self.neigh.fit(x)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if FAISS_AVAILABLE:
+            state['neigh'] = faiss.serialize_index(self.neigh)
+        return state
+
+    def __setstate__(self, state):
+        if FAISS_AVAILABLE:
+            state['neigh'] = faiss.deserialize_index(state['neigh'])
+        self.__dict__.update(state)
+
+    def query(self, query, m = 50):
+        """Find the indices of the **m** nearest indexed positions of each row of **query**.
+        """
+        m = min(m, self.n)
+        if m==self.n:
+            k = query.shape[0]
+            NN = np.arange(m) + np.arange(k)[:, np.newaxis]
+            NN %= m
+        elif FAISS_AVAILABLE:
+            _, NN = self.neigh.search(query, k=int(m))
+        else:
+            NN = self.neigh.kneighbors(query, n_neighbors=m, return_distance=False)
+        return NN
 
 def get_pred_nn(query, x, m = 50, method = 'exact', size = 40, efSearch = 100, n_jobs = -1):
     n, d = x.shape
@@ -23,20 +75,88 @@ def get_pred_nn(query, x, m = 50, method = 'exact', size = 40, efSearch = 100, n
         NN = np.arange(m) + np.arange(k)[:, np.newaxis]
         NN %= m
     else:
-        if FAISS_AVAILABLE:
-            if method == 'exact':
-                neigh = faiss.IndexFlatL2(d)
-            elif method == 'approx':
-                neigh = faiss.IndexHNSWFlat(d, size)
-                neigh.hnsw.efSearch = efSearch
-            neigh.add(x)
-            _, NN = neigh.search(query, k=int(m))
-        else:
-            neigh = NearestNeighbors(algorithm='kd_tree', n_jobs=n_jobs)
-            neigh.fit(x)
-            NN = neigh.kneighbors(query, n_neighbors=m, return_distance=False)
+        NN = pred_nn_index(x, method = method, size = size, efSearch = efSearch, n_jobs = n_jobs).query(query, m)
     return NN
 
+def maxmin_ord(x, exact = True, k = 30, method = 'exact'):
+    """Compute the max-min distance ordering of the rows of **x**, in which each row is the one farthest from all rows ordered before it.
+
+    Args:
+        x (ndarray): a numpy 2d-array of the (scaled) positions to be ordered.
+        exact (bool): whether the exact max-min ordering is computed. If `False`, the distances of each row to the ordered rows are only 
+            tracked through its **k** nearest neighbours, which gives an approximate max-min ordering. Defaults to `True`.
+        k (int): the number of nearest neighbours used to track the distances. Defaults to `30`.
+        method (str): the neighbour search method (see :func:`.get_pred_nn`). Defaults to `exact`.
+
+    Returns:
+        ndarray: a numpy 1d-array that gives the ordering of the rows of **x**.
+    """
+    n = x.shape[0]
+    perm = np.random.permutation(n)
+    x = x[perm]
+    NN = pred_nn_index(x, method = method).query(x, min(k, n))
+    first = np.argmin(np.sum((x - np.mean(x, axis=0))**2, axis=1))
+    return perm[maxmin_nb(x, NN, first, exact)]
+
+@njit(cache=True)
+def maxmin_nb(x, NN, first, exact):
+    """Order the rows of **x** greedily by their distances to the ordered rows using a lazy max-heap, starting from the row **first**.
+       The distances are updated through the nearest neighbours **NN** of each row. If **exact** is `True`, the distance of a row 
+       that has no ordered row among its neighbours is checked against all ordered rows before the row is ordered.
+    """
+    n, d = x.shape
+    k = NN.shape[1]
+    dist = np.full(n, np.inf)
+    checked = np.zeros(n, dtype=np.int64)
+    selected = np.zeros(n, dtype=np.bool_)
+    ord = np.empty(n, dtype=np.int64)
+    heap = [(-np.inf, np.int64(i)) for i in range(n)]
+    ord[0], selected[first], count = first, True, 1
+    i = first
+    while True:
+        for r in range(k):
+            j = NN[i, r]
+            if j>=0 and not selected[j]:
+                dd = 0.
+                for l in range(d):
+                    dd += (x[i,l] - x[j,l])**2
+                if dd < dist[j]:
+                    dist[j] = dd
+                    heapq.heappush(heap, (-dd, np.int64(j)))
+        if count == n:
+            break
+        while True:
+            key, i = heapq.heappop(heap)
+            if selected[i] or -key > dist[i]:
+                continue
+            if exact:
+                has_selected = False
+                for r in range(k):
+                    j = NN[i, r]
+                    if j>=0 and selected[j]:
+                        has_selected = True
+                        dd = 0.
+                        for l in range(d):
+                            dd += (x[i,l] - x[j,l])**2
+                        if dd < dist[i]:
+                            dist[i] = dd
+                if not has_selected:
+                    for s in range(checked[i], count):
+                        j = ord[s]
+                        dd = 0.
+                        for l in range(d):
+                            dd += (x[i,l] - x[j,l])**2
+                        if dd < dist[i]:
+                            dist[i] = dd
+                    checked[i] = count
+                if dist[i] < -key:
+                    heapq.heappush(heap, (-dist[i], np.int64(i)))
+                    continue
+            break
+        ord[count], selected[i] = i, True
+        count += 1
+    return ord
+
 @njit(cache=True)
 def nn_brute(x, m):
     n = x.shape[0]
@@ -57,6 +177,10 @@ def extract_NN_m(NN_mask, less_than_k_mask, m):
     return NN_m
 
 def nn(x, m, method = 'exact', size = 40, efSearch = 100, n_jobs = -1):
+    """Find the conditioning sets, i.e., the **m** nearest preceding rows (and the row itself) of each row of the ordered **x**.
+       The rows are inserted into a single growing index in blocks of doubling size, and the rows of each block are queried 
+       against the index that holds all rows up to the end of the block.
+    """
     n, d = x.shape
     m, mult = min(m, n-1), 2
 
@@ -65,44 +189,38 @@ def nn(x, m, method = 'exact', size = 40, efSearch = 100, n_jobs = -1):
     maxval = min(mult * m + 1, n)
     NNarray[:maxval] = nn_brute(x[:maxval], m)
 
-    query_inds, msearch = np.arange(maxval, n), m
-
     if FAISS_AVAILABLE:
-        while len(query_inds) > 0:
-            max_query_inds = np.max(query_inds) + 1
-            msearch = min(max_query_inds, 2*msearch)
-            data_inds = np.arange(min(max_query_inds, n))
-            if method == 'exact':
-                neigh = faiss.IndexFlatL2(d)
-            elif method == 'approx':
-                neigh = faiss.IndexHNSWFlat(d, size)
-                neigh.hnsw.efSearch = efSearch
-            neigh.add(x[data_inds,:])
-            _, NN = neigh.search(x[query_inds,:], k=int(msearch))
-            less_than_k = NN <= query_inds[:, np.newaxis]
-            less_than_k_valid = NN >= 0
-            less_than_k = np.logical_and(less_than_k, less_than_k_valid)
-            sum_less_than_k = np.sum(less_than_k, axis=1)
-            ind_less_than_k = sum_less_than_k >= m+1
-            NN_mask, less_than_k_mask, query_inds_mask = NN[ind_less_than_k,:], less_than_k[ind_less_than_k,:], query_inds[ind_less_than_k]
-            NN_m = extract_NN_m(NN_mask, less_than_k_mask, m+1)
-            NNarray[query_inds_mask,:] = NN_m
-            query_inds = query_inds[~ind_less_than_k]
+        if method == 'exact':
+            neigh = faiss.IndexFlatL2(d)
+        elif method == 'approx':
+            neigh = faiss.IndexHNSWFlat(d, size)
+            neigh.hnsw.efSearch = efSearch
+        neigh.add(x[:maxval])
     else:
         neigh = NearestNeighbors(algorithm='kd_tree', n_jobs=n_jobs)
+
+    start = maxval
+    while start < n:
+        end = min(mult * start, n)
+        if FAISS_AVAILABLE:
+            neigh.add(x[start:end])
+        else:
+            neigh.fit(x[:end])
+        query_inds, msearch = np.arange(start, end), m
         while len(query_inds) > 0:
-            max_query_inds = np.max(query_inds) + 1
-            msearch = min(max_query_inds, 2*msearch)
-            data_inds = np.arange(min(max_query_inds, n))
-            neigh.fit(x[data_inds,:])
-            NN = neigh.kneighbors(x[query_inds,:], n_neighbors=msearch, return_distance=False)
-            less_than_k = NN <= query_inds[:, np.newaxis]
+            msearch = min(end, 2*msearch)
+            if FAISS_AVAILABLE:
+                _, NN = neigh.search(x[query_inds,:], k=int(msearch))
+            else:
+                NN = neigh.kneighbors(x[query_inds,:], n_neighbors=msearch, return_distance=False)
+            less_than_k = np.logical_and(NN <= query_inds[:, np.newaxis], NN >= 0)
             sum_less_than_k = np.sum(less_than_k, axis=1)
             ind_less_than_k = sum_less_than_k >= m+1
             NN_mask, less_than_k_mask, query_inds_mask = NN[ind_less_than_k,:], less_than_k[ind_less_than_k,:], query_inds[ind_less_than_k]
             NN_m = extract_NN_m(NN_mask, less_than_k_mask, m+1)
             NNarray[query_inds_mask,:] = NN_m
             query_inds = query_inds[~ind_less_than_k]
+        start = end
     NNarray = np.fliplr(np.sort(NNarray))
     return(NNarray)
 
@@ -117,6 +235,101 @@ def forward_solve_sp(L, NNarray, b):
         x[i] = (b[i] - sumj) / L[i,0]
     return x
 
+@njit(cache=True)
+def level_sets(level):
+    """Group the rows of a triangular factor by their dependency levels.
+
+    Args:
+        level (ndarray): a numpy 1d-array giving the dependency level of each row.
+
+    Returns:
+        tuple: a tuple of two numpy 1d-arrays. The first gives the pointers to the start of each level in the second, 
+        which contains the row indices sorted by level.
+    """
+    n_level = np.max(level) + 1 if len(level)>0 else 0
+    lvl_ptr = np.zeros(n_level+1, dtype=np.int64)
+    for i in range(len(level)):
+        lvl_ptr[level[i]+1] += 1
+    lvl_ptr = np.cumsum(lvl_ptr)
+    fill = lvl_ptr[:-1].copy()
+    lvl_rows = np.empty(len(level), dtype=np.int64)
+    for i in range(len(level)):
+        lvl_rows[fill[level[i]]] = i
+        fill[level[i]] += 1
+    return lvl_ptr, lvl_rows
+
+@njit(cache=True)
+def csr_levels(indptr, indices, lower):
+    """Compute the dependency levels of a triangular matrix in CSR format for :func:`.forward_substitute_lv` (**lower** = `True`) 
+       or :func:`.backward_substitute_lv` (**lower** = `False`).
+
+    Args:
+        indptr (ndarray): the index pointers of the matrix.
+        indices (ndarray): the column indices of the matrix.
+
+    Returns:
+        tuple: the two numpy 1d-arrays given by :func:`.level_sets`.
+    """
+    n = len(indptr) - 1
+    level = np.zeros(n, dtype=np.int64)
+    for k in range(n):
+        i = k if lower else n-1-k
+        for j in range(indptr[i], indptr[i+1]):
+            c = indices[j]
+            if (lower and c<i) or (not lower and c>i):
+                level[i] = max(level[i], level[c]+1)
+    return level_sets(level)
+
+@njit(cache=True)
+def nn_levels(NNarray):
+    """Compute the dependency levels of the Vecchia factor given by :func:`.L_matrix` for the forward solve in :func:`.forward_solve_sp_lv`.
+       Rows in the same level only depend on rows in earlier levels and can be solved concurrently.
+
+    Returns:
+        tuple: the two numpy 1d-arrays given by :func:`.level_sets`.
+    """
+    n, m = NNarray.shape
+    level = np.zeros(n, dtype=np.int64)
+    for i in range(n):
+        for j in range(1, min(i+1, m)):
+            if NNarray[i, j]>=0:
+                level[i] = max(level[i], level[NNarray[i, j]]+1)
+    return level_sets(level)
+
+def use_levels(lvl_ptr):
+    """Decide whether a triangular solve with the dependency levels **lvl_ptr** (see :func:`.level_sets`) is level-scheduled. 
+       This is the case only if **level_solves** is set, numba runs with more than one thread and at least one level has 
+       **min_level_size** rows; otherwise the serial solves are faster.
+    """
+    return level_solves and get_num_threads()>1 and len(lvl_ptr)>1 and np.max(np.diff(lvl_ptr))>=min_level_size
+
+@njit(cache=True)
+def forward_row_sp(L, NNarray, B, X, i):
+    for c in range(B.shape[1]):
+        X[i, c] = 0.0
+    for j in range(1, min(i+1, L.shape[1])):
+        Lij, nb = L[i, j], NNarray[i, j]
+        for c in range(B.shape[1]):
+            X[i, c] += Lij * X[nb, c]
+    for c in range(B.shape[1]):
+        X[i, c] = (B[i, c] - X[i, c]) / L[i,0]
+
+@njit(cache=True, parallel=True)
+def forward_solve_sp_lv(L, NNarray, B, lvl_ptr, lvl_rows):
+    """Level-scheduled parallel version of :func:`.forward_solve_sp` for the columns of the numpy 2d-array **B**, with the 
+       dependency levels given by :func:`.nn_levels`.
+    """
+    X = np.empty(B.shape)
+    for l in range(len(lvl_ptr)-1):
+        start, end = lvl_ptr[l], lvl_ptr[l+1]
+        if end-start<min_level_size:
+            for k in range(start, end):
+                forward_row_sp(L, NNarray, B, X, lvl_rows[k])
+        else:
+            for k in prange(start, end):
+                forward_row_sp(L, NNarray, B, X, lvl_rows[k])
+    return X
+
 #@njit(cache=True)
 def fmvn_mu_sp(X, NNarray, scale, length, nugget, name, mu):
     """Generate multivariate Gaussian random samples with means.
@@ -159,99 +372,259 @@ def backward_solve(U, b):
         x[i] = (b[i] - sumj) / U[i, i]
     return x
 
+@njit(cache=True)
+def n_chunks(n):
+    """Return the number of contiguous chunks, each processed with its own workspaces, that **n** rows are split into in parallel loops.
+    """
+    return min(n, 256)
+
+@njit(cache=True)
+def chunk_bounds(n, n_chunk, c):
+    """Return the range of rows processed by the chunk **c** when **n** rows are split into **n_chunk** contiguous chunks.
+    """
+    return c*n//n_chunk, (c+1)*n//n_chunk
+
+@njit(cache=True)
+def gather_block(X, nn_row, rev, length, xi, ids):
+    """Gather the scaled rows of **X** indexed by the valid (non-negative) entries of **nn_row** (in reversed order if **rev** is `True`) 
+       into the workspace **xi**, and their indices into the workspace **ids**. Return the block size.
+    """
+    d = X.shape[1]
+    b = 0
+    for j in range(len(nn_row)):
+        if nn_row[j]>=0:
+            ids[b] = nn_row[j]
+            b += 1
+    if rev:
+        for j in range(b//2):
+            ids[j], ids[b-1-j] = ids[b-1-j], ids[j]
+    for j in range(b):
+        for k in range(d):
+            xi[j,k] = X[ids[j],k]/xi.dtype.type(length[0] if len(length)==1 else length[k])
+    return b
+
+@njit(cache=True)
+def K_block_nb(xi, b, nugget, name, K):
+    """Fill the lower triangle of the leading **b** x **b** block of the workspace **K** with the correlation matrix of the scaled 
+       rows **xi[:b]**. The correlations are computed in the precision of **xi**.
+    """
+    d = xi.shape[1]
+    zero, one = xi.dtype.type(0), xi.dtype.type(1)
+    s5, c53 = xi.dtype.type(np.sqrt(5)), xi.dtype.type(5/3)
+    if name == 'sexp':
+        for i in range(b):
+            K[i,i] = 1 + nugget
+            for j in range(i):
+                dist = zero
+                for k in range(d):
+                    dist += (xi[i,k] - xi[j,k])**2
+                K[i,j] = np.exp(-dist)
+    elif name == 'matern2.5':
+        for i in range(b):
+            K[i,i] = 1 + nugget
+            for j in range(i):
+                coef1, coef2 = one, zero
+                for k in range(d):
+                    distk = np.abs(xi[i,k] - xi[j,k])
+                    coef1 *= one+s5*distk+c53*distk**2
+                    coef2 += distk
+                K[i,j] = coef1 * np.exp(-s5 * coef2)
+
+@njit(cache=True)
+def dK_block_nb(xi, b, n_length, nugget, name, nugget_est, K, dK):
+    """Fill the leading **b** x **b** blocks of the workspaces **K** (lower triangle) and **dK** (full) with the correlation matrix of 
+       the scaled rows **xi[:b]** and its derivatives wrt the log-transformed lengthscales (and nugget if **nugget_est** is `True`).
+    """
+    d = xi.shape[1]
+    p = dK.shape[0]
+    zero, one = xi.dtype.type(0), xi.dtype.type(1)
+    s5, c53 = xi.dtype.type(np.sqrt(5)), xi.dtype.type(5/3)
+    for k in range(p):
+        for i in range(b):
+            for j in range(b):
+                dK[k,i,j] = 0.
+    if nugget_est:
+        for i in range(b):
+            dK[p-1,i,i] = nugget
+    if name == 'sexp':
+        for i in range(b):
+            K[i,i] = 1 + nugget
+            for j in range(i):
+                dist = zero
+                for k in range(d):
+                    dist += (xi[i,k] - xi[j,k])**2
+                K[i,j] = np.exp(-dist)
+                if n_length==1:
+                    dK[0,i,j] = 2*dist*K[i,j]
+                else:
+                    for k in range(d):
+                        dK[k,i,j] = 2*(xi[i,k] - xi[j,k])**2*K[i,j]
+    elif name == 'matern2.5':
+        for i in range(b):
+            K[i,i] = 1 + nugget
+            for j in range(i):
+                coef1, coef2, coef3 = one, zero, zero
+                for k in range(d):
+                    distk = np.abs(xi[i,k] - xi[j,k])
+                    el1, el2 = one+s5*distk, c53*distk**2
+                    coef = el1 + el2
+                    coef1 *= coef
+                    coef2 += distk
+                    coef3 += el2*el1/coef
+                K[i,j] = coef1 * np.exp(-s5 * coef2)
+                if n_length==1:
+                    dK[0,i,j] = coef3*K[i,j]
+                else:
+                    for k in range(d):
+                        distk = np.abs(xi[i,k] - xi[j,k])
+                        el1, el2 = one+s5*distk, c53*distk**2
+                        dK[k,i,j] = el2*el1/(el1 + el2)*K[i,j]
+    for k in range(p):
+        for i in range(b):
+            for j in range(i):
+                dK[k,j,i] = dK[k,i,j]
+
+@njit(cache=True, fastmath=True)
+def chol_block(K, b):
+    """Overwrite the lower triangle of the leading **b** x **b** block of the workspace **K** with its Cholesky factor.
+    """
+    for j in range(b):
+        s = K[j,j]
+        for k in range(j):
+            s -= K[j,k]*K[j,k]
+        if s <= 0:
+            raise np.linalg.LinAlgError('Matrix is not positive definite.')
+        djj = np.sqrt(s)
+        K[j,j] = djj
+        for i in range(j+1, b):
+            s = K[i,j]
+            for k in range(j):
+                s -= K[i,k]*K[j,k]
+            K[i,j] = s/djj
+
+@njit(cache=True, fastmath=True)
+def forward_block(L, b, rhs, x):
+    """Solve L x = rhs in the workspace **x** for the leading **b** x **b** block of the lower triangular **L**.
+    """
+    for i in range(b):
+        s = rhs[i]
+        for j in range(i):
+            s -= L[i,j]*x[j]
+        x[i] = s/L[i,i]
+
+@njit(cache=True, fastmath=True)
+def backward_last_block(L, b, x):
+    """Solve L^T x = e_b (the last unit vector) in the workspace **x** for the leading **b** x **b** block of the lower triangular **L**.
+    """
+    for i in range(b-1, -1, -1):
+        s = 1.0 if i==b-1 else 0.0
+        for j in range(i+1, b):
+            s -= L[j,i]*x[j]
+        x[i] = s/L[i,i]
+
 @njit(cache=True, parallel=True, fastmath=True)
 def vecchia_llik(X, y, NNarray, scale, length, nugget, name):
-    n = X.shape[0]
-    quad, logdet = np.array([0.]), np.array([0.])
-    for i in prange(n):
-        idx = NNarray[i]
-        idx = idx[idx>=0][::-1]
-        xi, yi= X[idx,:], y[idx,:]
-        Ki = K_matrix_nb(xi, length, nugget, name)
-        Li = np.linalg.cholesky(Ki)  
-        Liyi = forward_solve(Li, yi)
-        quad += Liyi[-1]**2
-        logdet += 2*np.log(np.abs(Li[-1,-1]))
-    llik = -0.5*(logdet + quad/scale) 
-    return llik
+    n, mb = NNarray.shape
+    n_chunk = n_chunks(n)
+    quad, logdet = np.zeros(n_chunk), np.zeros(n_chunk)
+    for c in prange(n_chunk):
+        K, xi = np.empty((mb, mb)), np.empty((mb, X.shape[1]), dtype=X.dtype)
+        ids, yi, Liyi = np.empty(mb, dtype=NNarray.dtype), np.empty(mb), np.empty(mb)
+        start, end = chunk_bounds(n, n_chunk, c)
+        for i in range(start, end):
+            bsize = gather_block(X, NNarray[i], True, length, xi, ids)
+            K_block_nb(xi, bsize, nugget, name, K)
+            chol_block(K, bsize)
+            for j in range(bsize):
+                yi[j] = y[ids[j],0]
+            forward_block(K, bsize, yi, Liyi)
+            quad[c] += Liyi[bsize-1]**2
+            logdet[c] += 2*np.log(np.abs(K[bsize-1,bsize-1]))
+    llik = -0.5*(np.sum(logdet) + np.sum(quad)/scale) 
+    return np.full(1, llik)
 
 @njit(cache=True, parallel=True, fastmath=True)
 def vecchia_nllik(X, y, NNarray, scale, length, nugget, name, scale_est, nugget_est):
-    n = X.shape[0]
+    n, mb = NNarray.shape
     p = len(length)
     if nugget_est:
         p += 1
-    #quad, logdet = np.array([0.]), np.array([0.])
-    dquad, dlogdet = np.zeros(p), np.zeros(p)
-
-    idx = NNarray[0]
-    idx = idx[idx>=0][::-1]
-    xi, yi = X[idx,:], y[idx,:]
-    Ki, dKi = dK_matrix_nb(xi, length, nugget, name, nugget_est)
-    #dquadi, dlogdeti = np.zeros(p), np.zeros(p)
-    for k in range(p):
-        dquad[k], dlogdet[k] = ((yi/Ki)**2*dKi[k])[0,0], (dKi[k]/Ki)[0,0]
-    quad = yi[0]**2/Ki[0]
-    logdet = np.log(Ki[0])
-    #dquad += dquadi
-    #dlogdet += dlogdeti
-
-    for i in prange(1,n):
-        idx = NNarray[i]
-        idx = idx[idx>=0][::-1]
-        bsize = len(idx)
-        xi, yi = X[idx,:], y[idx,:]
-        Ki, dKi = dK_matrix_nb(xi, length, nugget, name, nugget_est)
-        dquadi, dlogdeti = np.zeros(p), np.zeros(p)
-        Li = np.linalg.cholesky(Ki)  # Perform Cholesky decomposition
-        Liyi = forward_solve(Li, yi)
-        Ii = np.zeros(bsize)
-        Ii[-1] = 1.0
-        LiIi = backward_solve(Li.T, Ii)
-        for k in range(p):
-            LidKi = forward_solve(Li, dKi[k]@LiIi)
-            si = (Liyi.T@LidKi)[0]
-            dquadi[k], dlogdeti[k] = (2*si*Liyi[-1]-LidKi[-1]*Liyi[-1]**2)[0], (LidKi[-1])[0]
-        quad += Liyi[-1]**2
-        logdet += 2*np.log(np.abs(Li[-1,-1]))
-        dquad += dquadi
-        dlogdet += dlogdeti
+    n_chunk = n_chunks(n)
+    quad, logdet = np.zeros(n_chunk), np.zeros(n_chunk)
+    dquad, dlogdet = np.zeros((n_chunk, p)), np.zeros((n_chunk, p))
+    for c in prange(n_chunk):
+        K, dK, xi = np.empty((mb, mb)), np.empty((p, mb, mb)), np.empty((mb, X.shape[1]), dtype=X.dtype)
+        ids, yi, Liyi = np.empty(mb, dtype=NNarray.dtype), np.empty(mb), np.empty(mb)
+        LiIi, dKLiIi, LidKi = np.empty(mb), np.empty(mb), np.empty(mb)
+        start, end = chunk_bounds(n, n_chunk, c)
+        for i in range(start, end):
+            bsize = gather_block(X, NNarray[i], True, length, xi, ids)
+            dK_block_nb(xi, bsize, len(length), nugget, name, nugget_est, K, dK)
+            chol_block(K, bsize)
+            for j in range(bsize):
+                yi[j] = y[ids[j],0]
+            forward_block(K, bsize, yi, Liyi)
+            backward_last_block(K, bsize, LiIi)
+            for k in range(p):
+                for r in range(bsize):
+                    s = 0.
+                    for j in range(bsize):
+                        s += dK[k,r,j]*LiIi[j]
+                    dKLiIi[r] = s
+                forward_block(K, bsize, dKLiIi, LidKi)
+                si = 0.
+                for j in range(bsize):
+                    si += Liyi[j]*LidKi[j]
+                dquad[c,k] += 2*si*Liyi[bsize-1]-LidKi[bsize-1]*Liyi[bsize-1]**2
+                dlogdet[c,k] += LidKi[bsize-1]
+            quad[c] += Liyi[bsize-1]**2
+            logdet[c] += 2*np.log(np.abs(K[bsize-1,bsize-1]))
+    quad, logdet = np.sum(quad), np.sum(logdet)
+    dquad, dlogdet = np.sum(dquad, axis=0), np.sum(dlogdet, axis=0)
     if scale_est:
-        scale = quad[0]/n
+        scale = quad/n
         nllik = 0.5*(logdet + n*np.log(scale))
         ndllik = 0.5*(dlogdet - dquad/scale)
     else:
         nllik = 0.5*(logdet + quad/scale) 
         ndllik = 0.5*(dlogdet - dquad/scale)
-    return nllik, ndllik, np.array([scale])
+    return np.full(1, nllik), ndllik, np.full(1, scale)
 
 @njit(cache=True,fastmath=True)
 def K_vec_nb(X, z, length, name):
     """Compute cross-correlation matrix between the testing and training input data.
+       The correlations are computed in the precision of X and returned in float64.
     """
     n1, d = X.shape
-    X_l, z_l = X/length, z/length
+    X_l, z_l = X/length.astype(X.dtype), z/length.astype(X.dtype)
+    zero, one = X_l.dtype.type(0), X_l.dtype.type(1)
+    s5, c53 = X_l.dtype.type(np.sqrt(5)), X_l.dtype.type(5/3)
     K_vec = np.zeros(n1)
     if name == 'sexp':
         for i in range(n1):
-            dist = 0
+            dist = zero
             for k in range(d):
                 dist += (X_l[i,k] - z_l[k])**2
             K_vec[i] = np.exp(-dist)
     elif name=='matern2.5':
         for i in range(n1):
-            coef1, coef2 = 1, 0
+            coef1, coef2 = one, zero
             for k in range(d):
                 distk = np.abs(X_l[i,k] - z_l[k])
-                coef1 *= 1+np.sqrt(5)*distk+(5/3)*distk**2
+                coef1 *= one+s5*distk+c53*distk**2
                 coef2 += distk
-            K_vec[i] = coef1 * np.exp(-np.sqrt(5) * coef2)
+            K_vec[i] = coef1 * np.exp(-s5 * coef2)
     return K_vec
 
 @njit(cache=True)
 def K_matrix_nb(xi, length, nugget, name):
+    """Compute the correlation matrix of a conditioning block. The off-diagonal correlations are computed 
+       in the precision of xi while the returned matrix (including the diagonal) is float64.
+    """
     n, d = xi.shape
-    xi_l=xi/length
+    xi_l=xi/length.astype(xi.dtype)
+    zero, one = xi_l.dtype.type(0), xi_l.dtype.type(1)
+    s5, c53 = xi_l.dtype.type(np.sqrt(5)), xi_l.dtype.type(5/3)
     K = np.zeros((n,n))
     if name == 'sexp':
         for i in range(n):
@@ -259,7 +632,7 @@ def K_matrix_nb(xi, length, nugget, name):
                 if i==j:
                     K[i,j] = 1 + nugget
                 else:
-                    dist = 0
+                    dist = zero
                     for k in range(d):
                         dist += (xi_l[i,k] - xi_l[j,k])**2
                     K[i,j] = np.exp(-dist)
@@ -270,136 +643,58 @@ def K_matrix_nb(xi, length, nugget, name):
                 if i==j:
                     K[i,j] = 1 + nugget
                 else:
-                    coef1, coef2 = 1, 0
+                    coef1, coef2 = one, zero
                     for k in range(d):
                         distk = np.abs(xi_l[i,k] - xi_l[j,k])
-                        coef1 *= 1+np.sqrt(5)*distk+(5/3)*distk**2
+                        coef1 *= one+s5*distk+c53*distk**2
                         coef2 += distk
-                    K[i,j] = coef1 * np.exp(-np.sqrt(5) * coef2)
+                    K[i,j] = coef1 * np.exp(-s5 * coef2)
                     K[j,i] = K[i,j]
     return K
 
-@njit(cache=True)
-def dK_matrix_nb(xi, length, nugget, name, nugget_est):
-    n, d = xi.shape
-    xi_l=xi/length
-    K = np.zeros((n,n))
-    if len(length)==1:
-        if nugget_est:
-            dK = np.zeros((2,n,n))
-            for i in range(n):
-                dK[1,i,i] = nugget
-        else:
-            dK = np.zeros((1,n,n))
-        if name == 'sexp':
-            for i in range(n):
-                for j in range(i + 1):
-                    if i==j:
-                        K[i,j] = 1 + nugget
-                    else:
-                        dist = 0
-                        for k in range(d):
-                            dist += (xi_l[i,k] - xi_l[j,k])**2
-                        K[i,j] = np.exp(-dist)
-                        dK[0,i,j] = 2*dist*K[i,j]
-                        K[j,i], dK[0,j,i] = K[i,j], dK[0,i,j]
-        elif name == 'matern2.5':
-            for i in range(n):
-                for j in range(i + 1):
-                    if i==j:
-                        K[i,j] = 1 + nugget
-                    else:
-                        coef1, coef2, coef3 = 1, 0, 0
-                        for k in range(d):
-                            distk = np.abs(xi_l[i,k] - xi_l[j,k])
-                            el1, el2 = 1+np.sqrt(5)*distk, (5/3)*distk**2
-                            coef = el1 + el2
-                            coef1 *= coef
-                            coef2 += distk
-                            coef3 += el2*el1/coef
-                        K[i,j] = coef1 * np.exp(-np.sqrt(5) * coef2)
-                        dK[0,i,j] = coef3*K[i,j]
-                        K[j,i], dK[0,j,i] = K[i,j], dK[0,i,j]
-    else:
-        if nugget_est:
-            dK = np.zeros((d+1,n,n))
-            for i in range(n):
-                dK[d,i,i] = nugget
-        else:
-            dK = np.zeros((d,n,n))
-        if name == 'sexp':
-            for i in range(n):
-                for j in range(i + 1):
-                    if i==j:
-                        K[i,j] = 1 + nugget
-                    else:
-                        dist = 0
-                        coef = np.zeros(d)
-                        for k in range(d):
-                            el = (xi_l[i,k] - xi_l[j,k])**2
-                            dist += el
-                            coef[k] = 2*el
-                        K[i,j] = np.exp(-dist)
-                        K[j,i] = K[i,j]
-                        for k in range(d):
-                            dK[k,i,j] = coef[k]*K[i,j]
-                            dK[k,j,i] = dK[k,i,j]
-        elif name == 'matern2.5':
-            for i in range(n):
-                for j in range(i + 1):
-                    if i==j:
-                        K[i,j] = 1 + nugget
-                    else:
-                        coef1, coef2, coef3 = 1, 0, np.zeros(d)
-                        for k in range(d):
-                            distk = np.abs(xi_l[i,k] - xi_l[j,k])
-                            el1, el2 = 1+np.sqrt(5)*distk, (5/3)*distk**2
-                            coef = el1 + el2
-                            coef1 *= coef
-                            coef2 += distk
-                            coef3[k] = el2*el1/coef
-                        K[i,j] = coef1 * np.exp(-np.sqrt(5) * coef2)
-                        K[j,i] = K[i,j]
-                        for k in range(d):
-                            dK[k,i,j] = coef3[k]*K[i,j]
-                            dK[k,j,i] = dK[k,i,j]
-    return K, dK
-    
 @njit(cache=True, parallel=True)
 def L_matrix(X, NNarray, length, nugget, name):
     n, m = NNarray.shape
     L_matrix = np.zeros((n, m))
-    for i in prange(n):
-        idx = NNarray[i]
-        idx = idx[idx>=0][::-1]
-        bsize = len(idx)
-        Ii = np.zeros(bsize)
-        Ii[-1] = 1.0
-        xi = X[idx,:]
-        Ki = K_matrix_nb(xi, length, nugget, name)
-        Li = np.linalg.cholesky(Ki)
-        LiIi = backward_solve(Li.T, Ii)
-        L_matrix[i, :bsize] = LiIi.T[0][::-1]
+    n_chunk = n_chunks(n)
+    for c in prange(n_chunk):
+        K, xi = np.empty((m, m)), np.empty((m, X.shape[1]), dtype=X.dtype)
+        ids, LiIi = np.empty(m, dtype=NNarray.dtype), np.empty(m)
+        start, end = chunk_bounds(n, n_chunk, c)
+        for i in range(start, end):
+            bsize = gather_block(X, NNarray[i], True, length, xi, ids)
+            K_block_nb(xi, bsize, nugget, name, K)
+            chol_block(K, bsize)
+            backward_last_block(K, bsize, LiIi)
+            for j in range(bsize):
+                L_matrix[i, j] = LiIi[bsize-1-j]
     return L_matrix
 
 @njit(cache=True, parallel=True)
 def U_matrix(X, revNNarray, revCond, length, nugget, scale, gamma, name):
     n, m = revNNarray.shape
     U_matrix = np.zeros((n, m))
-    for i in prange(n):
-        idx = revNNarray[i]
-        cond = revCond[i]
-        idx = idx[idx>=0]
-        cond = cond[idx>=0]
-        bsize = len(idx)
-        Ii = np.zeros(bsize)
-        Ii[-1] = 1.0
-        xi = X[idx,:]
-        gammai = gamma[idx] * ~cond
-        Ki = scale * K_matrix_nb(xi, length, nugget, name) + np.diag(gammai)
-        Li = np.linalg.cholesky(Ki)
-        LiIi = backward_solve(Li.T, Ii)
-        U_matrix[i, :bsize] = LiIi.T[0]
+    n_chunk = n_chunks(n)
+    for c in prange(n_chunk):
+        K, xi = np.empty((m, m)), np.empty((m, X.shape[1]), dtype=X.dtype)
+        ids, LiIi = np.empty(m, dtype=revNNarray.dtype), np.empty(m)
+        start, end = chunk_bounds(n, n_chunk, c)
+        for i in range(start, end):
+            bsize = gather_block(X, revNNarray[i], False, length, xi, ids)
+            K_block_nb(xi, bsize, nugget, name, K)
+            for j in range(bsize):
+                for l in range(j+1):
+                    K[j, l] *= scale
+            j = 0
+            for r in range(m):
+                if revNNarray[i, r]>=0:
+                    if not revCond[i, r]:
+                        K[j, j] += gamma[ids[j]]
+                    j += 1
+            chol_block(K, bsize)
+            backward_last_block(K, bsize, LiIi)
+            for j in range(bsize):
+                U_matrix[i, j] = LiIi[j]
     return U_matrix
 
 #@njit(cache=True)
@@ -417,27 +712,45 @@ def U_matrix(X, revNNarray, revCond, length, nugget, scale, gamma, name):
 #    return rows, cols
 
 @njit(cache=True)
-def imp_pointers(NNarray):
-    n = NNarray.shape[0]
-    Cond = NNarray > n-1
-    revNNarray = NNarray[:,::-1]
-    revCond = Cond[:,::-1]
-    nentries = revNNarray.size
-    rowpointers, colindices = np.zeros(nentries), np.zeros(nentries)
-    cur = 0
+def imp_pattern(NNarray):
+    """Build the CSR structures of the upper triangular factor returned by :func:`.U_matrix_sp` and of its transpose. The structures 
+       only depend on the imputation neighbour array **NNarray** and are reused for every imputation under the same ordering.
+
+    Returns:
+        tuple: a tuple of two tuples, for the factor and for its transpose, each containing the index pointers, the column indices 
+        and the flat positions in the output of :func:`.U_matrix` that give the data, followed by the dependency levels given by 
+        :func:`.csr_levels` of the backward solve with the factor and the forward solve with its transpose.
+    """
+    n, m = NNarray.shape
+    U_indptr, L_indptr = np.zeros(n+1, dtype=np.int64), np.zeros(n+1, dtype=np.int64)
+    for i in range(n):
+        for j in range(m):
+            c = NNarray[i, m-1-j]
+            if c > n-1:
+                U_indptr[c-n+1] += 1
+                L_indptr[i+1] += 1
+    U_indptr, L_indptr = np.cumsum(U_indptr), np.cumsum(L_indptr)
+    nnz = U_indptr[-1]
+    U_indices, U_src = np.empty(nnz, dtype=np.int64), np.empty(nnz, dtype=np.int64)
+    L_indices, L_src = np.empty(nnz, dtype=np.int64), np.empty(nnz, dtype=np.int64)
+    fill = U_indptr[:-1].copy()
     for i in range(n):
-        idx = revNNarray[i]
-        exist_n = idx>=0
-        idx = idx[exist_n]
-        n0 = len(idx)
-        revCond0 = revCond[i, exist_n]
-        cur_cols = np.zeros(n0)
-        cur_cols[revCond0] = idx[revCond0]
-        cur_cols[~revCond0] = idx[~revCond0]
-        rowpointers[cur + np.arange(n0)] = np.repeat(i, n0)
-        colindices[cur + np.arange(n0)] = cur_cols
-        cur = cur + n0
-    return rowpointers, colindices
+        jv = 0
+        start = L_indptr[i]
+        for j in range(m):
+            c = NNarray[i, m-1-j]
+            if c >= 0:
+                if c > n-1:
+                    r = c-n
+                    U_indices[fill[r]], U_src[fill[r]] = i, i*m+jv
+                    fill[r] += 1
+                    L_indices[start], L_src[start] = r, i*m+jv
+                    start += 1
+                jv += 1
+        row_ord = np.argsort(L_indices[L_indptr[i]:start])
+        L_indices[L_indptr[i]:start] = L_indices[L_indptr[i]:start][row_ord]
+        L_src[L_indptr[i]:start] = L_src[L_indptr[i]:start][row_ord]
+    return (U_indptr, U_indices, U_src) + csr_levels(U_indptr, U_indices, False), (L_indptr, L_indices, L_src) + csr_levels(L_indptr, L_indices, True)
 
 #def L_matrix_sp(X, NNarray, scale, length, nugget, name, rows, cols):
 #    n = X.shape[0]
@@ -446,15 +759,21 @@ def imp_pointers(NNarray):
 #    L = csr_matrix((data, (rows, cols)), shape=(n, n))
 #    return L
 
-def U_matrix_sp(X, NNarray, scale, length, nugget, name, gamma, rows, cols):
+def U_matrix_sp(X, NNarray, scale, length, nugget, name, gamma, pattern):
+    """Compute the upper triangular factor of the conditional posterior precision in the heteroskedastic Gaussian likelihood 
+       under the Vecchia approximation, together with its transpose, in CSR form with the structures **pattern** given by :func:`.imp_pattern`.
+
+    Returns:
+        tuple: a tuple of two tuples, for the factor and for its transpose, each containing the data, column indices and index 
+        pointers, followed by the dependency levels given by :func:`.csr_levels`.
+    """
     n = X.shape[0]
     Cond = NNarray > n-1
     revNNarray = NNarray[:,::-1]
     revCond = Cond[:,::-1]
-    U = U_matrix(np.vstack((X, X)), revNNarray, revCond, length, nugget, scale, gamma, name)
-    data = U.flatten()
-    U = csr_matrix((data, (cols, rows)), shape=(2*n, n))[n::,:]
-    return U
+    U = U_matrix(np.vstack((X, X)), revNNarray, revCond, length, nugget, scale, gamma, name).ravel()
+    (U_indptr, U_indices, U_src, U_lvl_ptr, U_lvl_rows), (L_indptr, L_indices, L_src, L_lvl_ptr, L_lvl_rows) = pattern
+    return (U[U_src], U_indices, U_indptr, U_lvl_ptr, U_lvl_rows), (U[L_src], L_indices, L_indptr, L_lvl_ptr, L_lvl_rows)
 
 def cond_mean_vecch(x, z, w1, global_w1, y, scale, length, nugget, name, m, nn_method):
     """Make GP mean predictions with Vecchia approximation in initialisation.
@@ -464,40 +783,62 @@ def cond_mean_vecch(x, z, w1, global_w1, y, scale, length, nugget, name, m, nn_m
         w1=np.concatenate((w1, global_w1),1)
     NNarray = get_pred_nn(x/length, w1/length, m, method = nn_method)
     m,_ = gp_vecch(x, w1, NNarray, y, scale[0], length, nugget[0], name)
-    return m
+    return m[:,0]
 
 @njit(cache=True, parallel=True)
 def gp_vecch(x,w,NNarray,y,scale,length,nugget,name):
-    """Make GP predictions with Vecchia approximation.
+    """Make GP predictions with Vecchia approximation. The columns of **y** are outputs that share the input and the hyperparameters 
+       (e.g., a GP across imputations): the conditioning blocks and the variances are computed once and the means of all columns are 
+       returned as the columns of a 2d-array.
     """
-    n_pred = x.shape[0]
-    m, v = np.zeros(n_pred), np.zeros(n_pred)
-    for i in prange(n_pred):
-        idx = NNarray[i]
-        idx = idx[idx>=0]
-        Xi = np.vstack((w[idx,:], x[i:i+1,:]))
-        Ki = K_matrix_nb(Xi, length, nugget, name)
-        Li = np.linalg.cholesky(Ki)
-        yi = y[idx,0]
-        m[i] = np.dot(Li[-1,:-1], forward_solve(Li[:-1, :-1], yi).flatten())
-        v[i] = scale * Li[-1,-1]**2
+    n_pred, mb = NNarray.shape
+    N = y.shape[1]
+    m, v = np.zeros((n_pred, N)), np.zeros(n_pred)
+    n_chunk = n_chunks(n_pred)
+    for c in prange(n_chunk):
+        K, xi = np.empty((mb+1, mb+1)), np.empty((mb+1, w.shape[1]), dtype=w.dtype)
+        ids, yi, Liyi = np.empty(mb+1, dtype=NNarray.dtype), np.empty(mb), np.empty(mb)
+        start, end = chunk_bounds(n_pred, n_chunk, c)
+        for i in range(start, end):
+            bsize = gather_block(w, NNarray[i], False, length, xi, ids)
+            for k in range(w.shape[1]):
+                xi[bsize,k] = x[i,k]/xi.dtype.type(length[0] if len(length)==1 else length[k])
+            K_block_nb(xi, bsize+1, nugget, name, K)
+            chol_block(K, bsize+1)
+            for t in range(N):
+                for j in range(bsize):
+                    yi[j] = y[ids[j],t]
+                forward_block(K, bsize, yi, Liyi)
+                mi = 0.
+                for j in range(bsize):
+                    mi += K[bsize,j]*Liyi[j]
+                m[i,t] = mi
+            v[i] = scale * K[bsize,bsize]**2
     return m, v
 
 @njit(cache=True, parallel=True)
 def loo_gp_vecch(x,NNarray,y,scale,length,nugget,name):
     """Compute LOO for GP with Vecchia approximation.
     """
-    n_pred = x.shape[0]
+    n_pred, mb = NNarray.shape
     m, v = np.zeros(n_pred), np.zeros(n_pred)
-    for i in prange(n_pred):
-        idx = NNarray[i]
-        idx = idx[idx>=0][::-1]
-        Xi = x[idx,:]
-        Ki = K_matrix_nb(Xi, length, nugget, name)
-        Li = np.linalg.cholesky(Ki)
-        yi = y[idx,0]
-        m[i] = np.dot(Li[-1,:-1], forward_solve(Li[:-1, :-1], yi[:-1]).flatten())
-        v[i] = scale * Li[-1,-1]**2
+    n_chunk = n_chunks(n_pred)
+    for c in prange(n_chunk):
+        K, xi = np.empty((mb, mb)), np.empty((mb, x.shape[1]), dtype=x.dtype)
+        ids, yi, Liyi = np.empty(mb, dtype=NNarray.dtype), np.empty(mb), np.empty(mb)
+        start, end = chunk_bounds(n_pred, n_chunk, c)
+        for i in range(start, end):
+            bsize = gather_block(x, NNarray[i], True, length, xi, ids)
+            K_block_nb(xi, bsize, nugget, name, K)
+            chol_block(K, bsize)
+            for j in range(bsize-1):
+                yi[j] = y[ids[j],0]
+            forward_block(K, bsize-1, yi, Liyi)
+            mi = 0.
+            for j in range(bsize-1):
+                mi += K[bsize-1,j]*Liyi[j]
+            m[i] = mi
+            v[i] = scale * K[bsize-1,bsize-1]**2
     return m, v
 
 @njit(cache=True)
@@ -547,6 +888,46 @@ def backward_substitute(U_data, U_indices, U_indptr, b):
             x[i] = (b[i] - sum_lx) / diag_val
     return x
 
+@njit(cache=True)
+def substitute_row(data, indices, indptr, b, x, i):
+    sum_lx, diag_val = 0., 1.
+    for j in range(indptr[i], indptr[i + 1]):
+        if indices[j] == i:
+            diag_val = data[j]
+        else:
+            sum_lx += data[j] * x[indices[j]]
+    x[i] = (b[i] - sum_lx) / diag_val
+
+@njit(cache=True, parallel=True)
+def forward_substitute_lv(L_data, L_indices, L_indptr, lvl_ptr, lvl_rows, b):
+    """Level-scheduled parallel version of :func:`.forward_substitute` with the dependency levels of L given by :func:`.csr_levels`.
+    """
+    x = np.zeros(len(L_indptr) - 1)
+    for l in range(len(lvl_ptr)-1):
+        start, end = lvl_ptr[l], lvl_ptr[l+1]
+        if end-start<min_level_size:
+            for k in range(start, end):
+                substitute_row(L_data, L_indices, L_indptr, b, x, lvl_rows[k])
+        else:
+            for k in prange(start, end):
+                substitute_row(L_data, L_indices, L_indptr, b, x, lvl_rows[k])
+    return x
+
+@njit(cache=True, parallel=True)
+def backward_substitute_lv(U_data, U_indices, U_indptr, lvl_ptr, lvl_rows, b):
+    """Level-scheduled parallel version of :func:`.backward_substitute` with the dependency levels of U given by :func:`.csr_levels`.
+    """
+    x = np.zeros(len(U_indptr) - 1)
+    for l in range(len(lvl_ptr)-1):
+        start, end = lvl_ptr[l], lvl_ptr[l+1]
+        if end-start<min_level_size:
+            for k in range(start, end):
+                substitute_row(U_data, U_indices, U_indptr, b, x, lvl_rows[k])
+        else:
+            for k in prange(start, end):
+                substitute_row(U_data, U_indices, U_indptr, b, x, lvl_rows[k])
+    return x
+
 #def rep_sp(indices):
 #    num_rows = len(indices)
 #    num_cols = np.max(indices) + 1
@@ -562,92 +943,171 @@ def backward_substitute(U_data, U_indices, U_indptr, b):
 #    M_csc = csc_matrix((data, (rows, cols)), shape=(num_rows, num_cols))
 #    return M_csc
     
-@njit(cache=True, parallel=True)
+@njit(cache=True, parallel=True, fastmath=True)
 def link_gp_vecch(m, v, z, w1, global_w1, NNarray, y, scale, length, nugget, name):
-    """Make linked GP predictions.
+    """Make linked GP predictions. For each testing position, the Cholesky factor of the conditioning block is inverted once 
+       and used both for ``R^{-1}y`` and for ``tr(R^{-1}J)``, the sum of the quadratic forms of J in the rows of the inverse factor.
+       The predictions are made for a stack of G GPs that share the global input and hyperparameters (e.g., the copies of a GP 
+       across imputations): **w1** has a leading axis of length G, the columns of **y** are the outputs of the G GPs, and the rows 
+       of **m**, **v** and **NNarray** are the testing positions of the first GP followed by those of the second, and so on.
     """
-    n_pred = m.shape[0]
+    n_pred, mb = NNarray.shape
     m_new, v_new = np.zeros(n_pred), np.zeros(n_pred)
-    if z is not None:
-        Dw=np.shape(w1)[1]
-        Dz=np.shape(z)[1]
-        if len(length)==1:
-            length=np.full(Dw+Dz, length[0])
-    else:
-        Dw=np.shape(w1)[1]
-        if len(length)==1:
-            length=np.full(Dw, length[0])
-    for i in prange(n_pred):
-        idx = NNarray[i]
-        idx = idx[idx>=0]
-        yi = y[idx,0]
-        if z is not None:
-            wi, global_wi = w1[idx,:], global_w1[idx,:]
-            Izi = K_vec_nb(global_wi, z[i], length[-Dz::], name)
-            Jzi = np.outer(Izi,Izi)
-            Ii,Ji = IJ_nb(wi, m[i], v[i], length[:-Dz], name)
-            Ii,Ji = Ii*Izi, Ji*Jzi
-            Ki = K_matrix_nb(np.concatenate((wi, global_wi),1), length, nugget, name)
-        else:
-            wi = w1[idx,:]
-            Ii,Ji = IJ_nb(wi, m[i], v[i], length, name)
-            Ki = K_matrix_nb(wi, length, nugget, name)
-        tr_RinvJ=np.trace(np.linalg.solve(Ki,Ji))
-        Li = np.linalg.cholesky(Ki)
-        Rinv_y = backward_solve(Li.T, forward_solve(Li, yi).flatten()).flatten()
-        IRinv_y = np.dot(Ii,Rinv_y)
-        m_new[i] = IRinv_y
-        v_new[i] = np.abs(quad(Ji,Rinv_y)-IRinv_y**2+scale*(1+nugget-tr_RinvJ))
+    G, _, Dw = w1.shape
+    M = n_pred//G
+    Dz = 0 if z is None else z.shape[1]
+    if len(length)==1:
+        length=np.full(Dw+Dz, length[0])
+    n_chunk = n_chunks(n_pred)
+    for c in prange(n_chunk):
+        K, Li, J = np.empty((mb, mb)), np.empty((mb, mb)), np.empty((mb, mb))
+        xi, wi = np.empty((mb, Dw+Dz), dtype=w1.dtype), np.empty((mb, Dw), dtype=w1.dtype)
+        ids, I, Iz = np.empty(mb, dtype=NNarray.dtype), np.empty(mb), np.empty(mb)
+        yi, Liyi, Rinv_y = np.empty(mb), np.empty(mb), np.empty(mb)
+        start, end = chunk_bounds(n_pred, n_chunk, c)
+        for p in range(start, end):
+            g, i = p//M, p%M
+            bsize = 0
+            for j in range(mb):
+                if NNarray[p,j]>=0:
+                    ids[bsize] = NNarray[p,j]
+                    bsize += 1
+            for j in range(bsize):
+                for k in range(Dw):
+                    wi[j,k] = w1[g,ids[j],k]
+                    xi[j,k] = w1[g,ids[j],k]/xi.dtype.type(length[k])
+                yi[j] = y[ids[j],g]
+            IJ_block_nb(wi, bsize, m[p], v[p], length[:Dw], name, I, J)
+            if z is not None:
+                for j in range(bsize):
+                    for k in range(Dz):
+                        xi[j,Dw+k] = global_w1[ids[j],k]/xi.dtype.type(length[Dw+k])
+                K_vec_block_nb(global_w1, ids, bsize, z[i], length[Dw:], name, Iz)
+                for j in range(bsize):
+                    I[j] *= Iz[j]
+                    for l in range(bsize):
+                        J[j,l] *= Iz[j]*Iz[l]
+            K_block_nb(xi, bsize, nugget, name, K)
+            chol_block(K, bsize)
+            inv_lower_block(K, bsize, Li)
+            for k in range(bsize):
+                s = 0.
+                for j in range(k+1):
+                    s += Li[k,j]*yi[j]
+                Liyi[k] = s
+            for j in range(bsize):
+                s = 0.
+                for k in range(j, bsize):
+                    s += Li[k,j]*Liyi[k]
+                Rinv_y[j] = s
+            tr_RinvJ, quad_J, IRinv_y = 0., 0., 0.
+            for k in range(bsize):
+                for j in range(k+1):
+                    s = 0.
+                    for l in range(j):
+                        s += J[j,l]*Li[k,l]
+                    tr_RinvJ += Li[k,j]*(J[j,j]*Li[k,j]+2*s)
+            for j in range(bsize):
+                s = 0.
+                for l in range(j):
+                    s += J[j,l]*Rinv_y[l]
+                quad_J += Rinv_y[j]*(J[j,j]*Rinv_y[j]+2*s)
+                IRinv_y += I[j]*Rinv_y[j]
+            m_new[p] = IRinv_y
+            v_new[p] = np.abs(quad_J-IRinv_y**2+scale*(1+nugget-tr_RinvJ))
     return m_new,v_new
 
+@njit(cache=True, fastmath=True)
+def inv_lower_block(L, b, Li):
+    """Compute in the workspace **Li** the inverse of the leading **b** x **b** block of the lower triangular **L**.
+    """
+    for j in range(b):
+        Li[j,j] = 1/L[j,j]
+        for i in range(j+1, b):
+            s = 0.
+            for k in range(j, i):
+                s -= L[i,k]*Li[k,j]
+            Li[i,j] = s/L[i,i]
+
+@njit(cache=True,fastmath=True)
+def K_vec_block_nb(X, ids, b, z, length, name, K_vec):
+    """Fill the leading **b** entries of the workspace **K_vec** with the correlations (see :func:`.K_vec_nb`) between the rows 
+       of **X** indexed by **ids[:b]** and the testing position **z**.
+    """
+    d = X.shape[1]
+    zero, one = X.dtype.type(0), X.dtype.type(1)
+    s5, c53 = X.dtype.type(np.sqrt(5)), X.dtype.type(5/3)
+    if name == 'sexp':
+        for i in range(b):
+            dist = zero
+            for k in range(d):
+                dist += (X[ids[i],k]/X.dtype.type(length[k]) - z[k]/X.dtype.type(length[k]))**2
+            K_vec[i] = np.exp(-dist)
+    elif name=='matern2.5':
+        for i in range(b):
+            coef1, coef2 = one, zero
+            for k in range(d):
+                distk = np.abs(X[ids[i],k]/X.dtype.type(length[k]) - z[k]/X.dtype.type(length[k]))
+                coef1 *= one+s5*distk+c53*distk**2
+                coef2 += distk
+            K_vec[i] = coef1 * np.exp(-s5 * coef2)
 
 @njit(cache=True)
 def IJ_nb(X, z_m, z_v, length, name):
     """Compute I and J involved in linked GP predictions.
     """
-    n, d = X.shape
+    n = X.shape[0]
     I = np.zeros(n)
     J = np.zeros((n,n))
+    IJ_block_nb(X, n, z_m, z_v, length, name, I, J)
+    return I,J
+
+@njit(cache=True)
+def IJ_block_nb(X, b, z_m, z_v, length, name, I, J):
+    """Fill the leading **b** entries of the workspace **I** and the leading **b** x **b** block of the workspace **J** 
+       with I and J (see :func:`.IJ_nb`) of the rows **X[:b]**.
+    """
+    d = X.shape[1]
     if name == 'sexp':
-        X_z = X-z_m
         I_coef1, J_coef1 = 1., 1.
         for k in range(d):
             div = 2*z_v[k]/length[k]**2
             I_coef1 *= 1 + div
             J_coef1 *= 1 + 2*div
         I_coef1, J_coef1 = 1/sqrt(I_coef1), 1/sqrt(J_coef1)
-        for i in range(n):
+        for i in range(b):
             I_coef2 = 0.
             for k in range(d):
-                I_coef2 += X_z[i,k]**2/(2*z_v[k]+length[k]**2)
+                I_coef2 += (X[i,k]-z_m[k])**2/(2*z_v[k]+length[k]**2)
             I[i] = I_coef1 * np.exp(-I_coef2)
             for j in range( i + 1 ):
                 if i==j:
                     J_coef2 = 0.
                     for k in range(d):
-                        J_coef2 += 2*X_z[i,k]**2/(4*z_v[k]+length[k]**2)
+                        J_coef2 += 2*(X[i,k]-z_m[k])**2/(4*z_v[k]+length[k]**2)
                     J[i,j] = J_coef1 * np.exp(-J_coef2)
                 else:
                     J_coef2 = 0.
                     for k in range(d):
-                        J_coef2 += (X_z[i,k] + X_z[j,k])**2/(8*z_v[k]+2*length[k]**2)+(X_z[i,k] - X_z[j,k])**2/(2*length[k]**2)
+                        X_zi, X_zj = X[i,k]-z_m[k], X[j,k]-z_m[k]
+                        J_coef2 += (X_zi + X_zj)**2/(8*z_v[k]+2*length[k]**2)+(X_zi - X_zj)**2/(2*length[k]**2)
                     J[i,j] = J_coef1 * np.exp(-J_coef2)
                     J[j,i] = J[i,j]
     elif name=='matern2.5':
-        zX = z_m-X
-        muA, muB = zX-sqrt(5)*z_v/length, zX+sqrt(5)*z_v/length
-        for i in range(n):
+        for i in range(b):
             Ii = 1.
             for k in range(d):
+                zX = z_m[k]-X[i,k]
                 if z_v[k]!=0:
-                    Ii *= np.exp((5*z_v[k]-2*sqrt(5)*length[k]*zX[i,k])/(2*length[k]**2))* \
-                        ((1+sqrt(5)*muA[i,k]/length[k]+5*(muA[i,k]**2+z_v[k])/(3*length[k]**2))*0.5*(1+erf(muA[i,k]/sqrt(2*z_v[k])))+ \
-                        (sqrt(5)+(5*muA[i,k])/(3*length[k]))*sqrt(0.5*z_v[k]/pi)/length[k]*np.exp(-0.5*muA[i,k]**2/z_v[k]))+ \
-                        np.exp((5*z_v[k]+2*sqrt(5)*length[k]*zX[i,k])/(2*length[k]**2))* \
-                        ((1-sqrt(5)*muB[i,k]/length[k]+5*(muB[i,k]**2+z_v[k])/(3*length[k]**2))*0.5*(1+erf(-muB[i,k]/sqrt(2*z_v[k])))+ \
-                        (sqrt(5)-(5*muB[i,k])/(3*length[k]))*sqrt(0.5*z_v[k]/pi)/length[k]*np.exp(-0.5*muB[i,k]**2/z_v[k]))
+                    muA, muB = zX-sqrt(5)*z_v[k]/length[k], zX+sqrt(5)*z_v[k]/length[k]
+                    Ii *= np.exp((5*z_v[k]-2*sqrt(5)*length[k]*zX)/(2*length[k]**2))* \
+                        ((1+sqrt(5)*muA/length[k]+5*(muA**2+z_v[k])/(3*length[k]**2))*0.5*(1+erf(muA/sqrt(2*z_v[k])))+ \
+                        (sqrt(5)+(5*muA)/(3*length[k]))*sqrt(0.5*z_v[k]/pi)/length[k]*np.exp(-0.5*muA**2/z_v[k]))+ \
+                        np.exp((5*z_v[k]+2*sqrt(5)*length[k]*zX)/(2*length[k]**2))* \
+                        ((1-sqrt(5)*muB/length[k]+5*(muB**2+z_v[k])/(3*length[k]**2))*0.5*(1+erf(-muB/sqrt(2*z_v[k])))+ \
+                        (sqrt(5)-(5*muB)/(3*length[k]))*sqrt(0.5*z_v[k]/pi)/length[k]*np.exp(-0.5*muB**2/z_v[k]))
                 else:
-                    Ii *= (1+sqrt(5)*np.abs(zX[i,k])/length[k]+5*zX[i,k]**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX[i,k])/length[k])  
+                    Ii *= (1+sqrt(5)*np.abs(zX)/length[k]+5*zX**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX)/length[k])  
             I[i] = Ii
             for j in range( i + 1 ):
                 if i==j:
@@ -656,7 +1116,8 @@ def IJ_nb(X, z_m, z_v, length, name):
                         if z_v[k]!=0:
                             Jii *= Jd0(X[i,k],z_m[k],z_v[k],length[k])
                         else:
-                            Iki = (1+sqrt(5)*np.abs(zX[i,k])/length[k]+5*zX[i,k]**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX[i,k])/length[k])
+                            zX = z_m[k]-X[i,k]
+                            Iki = (1+sqrt(5)*np.abs(zX)/length[k]+5*zX**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX)/length[k])
                             Jii *= Iki**2
                     J[i,j] = Jii
                 else:
@@ -665,12 +1126,12 @@ def IJ_nb(X, z_m, z_v, length, name):
                         if z_v[k]!=0:
                             Jij *= Jd(X[j,k],X[i,k],z_m[k],z_v[k],length[k])
                         else:
-                            Iki = (1+sqrt(5)*np.abs(zX[i,k])/length[k]+5*zX[i,k]**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX[i,k])/length[k])
-                            Ikj = (1+sqrt(5)*np.abs(zX[j,k])/length[k]+5*zX[j,k]**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zX[j,k])/length[k])
+                            zXi, zXj = z_m[k]-X[i,k], z_m[k]-X[j,k]
+                            Iki = (1+sqrt(5)*np.abs(zXi)/length[k]+5*zXi**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zXi)/length[k])
+                            Ikj = (1+sqrt(5)*np.abs(zXj)/length[k]+5*zXj**2/(3*length[k]**2))*np.exp(-sqrt(5)*np.abs(zXj)/length[k])
                             Jij *= (Iki*Ikj)
                     J[i,j] = Jij
                     J[j,i] = J[i,j]
-    return I,J
 
 @vectorize([float64(float64)],nopython=True,cache=True,fastmath=True)
 def pnorm(x):
@@ -25,6 +25,7 @@ INSTALL_REQUIRES = [
       'pathos==0.2.9',
       'multiprocess==0.70.13',
       'psutil>=5.8.0',
+      'threadpoolctl>=2.0.0',
       'cython>=0.29.30',
       'pybind11>=2.10.0',
       'pythran>=0.11.0',